@@ -9,10 +9,33 @@ from signal import signal, SIGINT, SIGTERM
 from typing import Any
 
 import uvicorn
+from uvicorn.middleware.wsgi import WSGIMiddleware
 
+from business.Admission import Admission
+from business.ChannelProvider import ChannelProvider
+from business.Encoder import Encoder
+from business.GrabBatcher import GrabBatcher
+from business.HttpPool import HttpPool
 from business.Logger import Logger
 from business.LoggerProxy import LoggerProxy
+from business.Refresher import Refresher
+from business.RenderPool import RenderPool
 from business.Router import Router
+from business.Subscriptions import Subscriptions
+from business.TwitchGrabber import TwitchGrabber
+from business.UpstreamGuard import UpstreamGuard
+from business.WidgetRenderer import WidgetRenderer
+from data.AvatarCache import AvatarCache
+from data.DiskCache import DiskCache
+from data.IMCache import IMCache
+from data.LayerCache import LayerCache
+from data.RedisBackend import RedisBackend
+from data.RenderCache import RenderCache
+from data.SharedMemoryBackend import SharedMemoryBackend
+from data.StaticAssets import StaticAssets
+from presentation.AdmissionControl import AdmissionControl
+from presentation.TwitchBatch import TwitchBatch
+from presentation.WidgetHeaders import WidgetHeaders
 
 signal(SIGINT, lambda x, y: (Logger.shutdown(), sys.exit(0)))
 signal(SIGTERM, lambda x, y: (Logger.shutdown(), sys.exit(0)))
@@ -45,7 +68,382 @@ parser.add_argument(
     version='Running {} on version {}'.format('%(prog)s', __version__),
     help="Show application version."
 )
+parser.add_argument(
+    '--log-level',
+    choices=tuple(severity.name for severity in Logger.Severity),
+    default=Logger.min_severity.name,
+    help="Minimum severity of logged messages (default: %(default)s)."
+)
+parser.add_argument(
+    '--log-async',
+    action='store_true',
+    help="Write log messages in batches from a background thread instead of within the calling thread."
+)
+parser.add_argument(
+    '--log-file',
+    help="Additionally write log messages to the given file (without .log extension)."
+)
+parser.add_argument(
+    '--log-format',
+    choices=tuple(output_format.name for output_format in Logger.Format),
+    default=Logger.output_format.name,
+    help="Output format of log messages, JSON writes one object per line (default: %(default)s)."
+)
+parser.add_argument(
+    '--log-max-size',
+    type=int,
+    default=Logger.max_bytes // (1024 * 1024),
+    help="Rotate the log file once it exceeds the given size in MiB, 0 disables size based rotation (default: %(default)s)."
+)
+parser.add_argument(
+    '--log-rotate-interval',
+    type=int,
+    default=Logger.rotate_interval,
+    help="Rotate the log file after the given number of seconds, 0 disables time based rotation (default: %(default)s)."
+)
+parser.add_argument(
+    '--log-backups',
+    type=int,
+    default=Logger.backup_count,
+    help="Number of rotated log files to keep (default: %(default)s)."
+)
+parser.add_argument(
+    '--log-compress',
+    action='store_true',
+    help="Compress rotated log files with gzip."
+)
+parser.add_argument(
+    '--interface',
+    choices=('wsgi', 'asgi'),
+    default='wsgi',
+    help="Server interface, asgi serves requests from an event loop with non-blocking upstream requests (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-size',
+    type=int,
+    default=IMCache.max_entries,
+    help="Maximum number of cached channels (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-ttl',
+    type=int,
+    default=IMCache.ttl,
+    help="Seconds until cached channel information gets refreshed (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-negative-ttl',
+    type=int,
+    default=IMCache.negative_ttl,
+    help="Seconds a non-existing channel is remembered (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-wait-timeout',
+    type=float,
+    default=ChannelProvider.wait_timeout,
+    help="Seconds a request waits for a concurrent upstream fetch of the same channel before serving stale data (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-stale-ttl',
+    type=int,
+    default=IMCache.stale_ttl,
+    help="Seconds after expiry during which outdated channel information is served while being refreshed in the background (default: %(default)s)."
+)
+parser.add_argument(
+    '--refresh-top',
+    type=int,
+    default=Refresher.top_n,
+    help="Number of most requested channels which get refreshed before they expire, 0 disables the background refresher (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-backend',
+    choices=('memory', 'shared', 'redis'),
+    default='memory',
+    help="Storage of the channel cache: within the process, in shared memory of this host or in a Redis server, the latter two also share upstream fetches between processes (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-shared-name',
+    type=str,
+    default='streamerinfo',
+    help="Name of the shared memory block used by the shared cache backend (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-shared-slots',
+    type=int,
+    default=4096,
+    help="Number of channels the shared cache backend can hold (default: %(default)s)."
+)
+parser.add_argument(
+    '--cache-redis-url',
+    type=str,
+    default='redis://127.0.0.1:6379/0',
+    help="Server used by the redis cache backend, keys are prefixed with streamerinfo: so the database can be shared (default: %(default)s)."
+)
+parser.add_argument(
+    '--batch-window',
+    type=float,
+    default=GrabBatcher.window,
+    help="Seconds during which channel requests are collected into one upstream query, 0 disables batching (default: %(default)s)."
+)
+parser.add_argument(
+    '--batch-size',
+    type=int,
+    default=TwitchGrabber.batch_size,
+    help="Maximum number of channels requested within one upstream query (default: %(default)s)."
+)
+parser.add_argument(
+    '--batch-max-channels',
+    type=int,
+    default=TwitchBatch.max_channels,
+    help="Maximum number of channels served by one request to the batch route /batch/{json,multipart,sprite} (default: %(default)s)."
+)
+parser.add_argument(
+    '--subscription-interval',
+    type=float,
+    default=Subscriptions.interval,
+    help="Seconds between two checks of a channel pushed to subscribers of /subscribe/{channels}, only served with --interface asgi (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-connect-timeout',
+    type=float,
+    default=HttpPool.connect_timeout,
+    help="Seconds to wait for a connection to Twitch to be established (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-read-timeout',
+    type=float,
+    default=HttpPool.read_timeout,
+    help="Seconds to wait for Twitch to answer (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-pool-size',
+    type=int,
+    default=HttpPool.pool_maxsize,
+    help="Number of kept-alive connections per upstream host (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-retries',
+    type=int,
+    default=HttpPool.retries,
+    help="Number of retries with exponential backoff on connection errors and 500, 502, 503 and 504 answers, Retry-After is not waited for (default: %(default)s)."
+)
+parser.add_argument(
+    '--rate-limit-client',
+    type=float,
+    default=Admission.client_rate,
+    help="Widgets per second a client address may request on average, 0 disables the limit (default: %(default)s)."
+)
+parser.add_argument(
+    '--rate-limit-client-burst',
+    type=float,
+    default=Admission.client_burst,
+    help="Widgets a client address may request at once (default: %(default)s)."
+)
+parser.add_argument(
+    '--rate-limit-channel',
+    type=float,
+    default=Admission.channel_rate,
+    help="Uncached requests per second a channel may cause on average, 0 disables the limit (default: %(default)s)."
+)
+parser.add_argument(
+    '--rate-limit-channel-burst',
+    type=float,
+    default=Admission.channel_burst,
+    help="Uncached requests a channel may cause at once (default: %(default)s)."
+)
+parser.add_argument(
+    '--rate-limit-forwarded',
+    action='store_true',
+    help="Identify clients by the X-Forwarded-For header, only if served behind a trusted proxy."
+)
+parser.add_argument(
+    '--admission-concurrency',
+    type=int,
+    default=Admission.concurrency,
+    help="Widget requests processed at once, further ones are queued with cached ones first, 0 disables queueing (default: %(default)s)."
+)
+parser.add_argument(
+    '--admission-queue',
+    type=int,
+    default=Admission.max_queue,
+    help="Maximum number of queued widget requests, further ones are answered with 503 (default: %(default)s)."
+)
+parser.add_argument(
+    '--admission-queue-target',
+    type=float,
+    default=Admission.queue_target,
+    help="Seconds a request may wait in the queue before it is answered with 503, uncached ones are rejected right away while the queue is older (default: %(default)s)."
+)
+parser.add_argument(
+    '--wsgi-threads',
+    type=int,
+    default=None,
+    help="Threads serving requests with --interface wsgi, requests beyond them wait unordered in front of the admission queue (default: --admission-concurrency plus --admission-queue, at least 10)."
+)
+parser.add_argument(
+    '--upstream-failure-threshold',
+    type=int,
+    default=UpstreamGuard.failure_threshold,
+    help="Consecutive failed requests after which an upstream host isn't called anymore and cached data is served (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-open-timeout',
+    type=float,
+    default=UpstreamGuard.open_timeout,
+    help="Seconds until a single probe request is sent to a failing upstream host (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-max-concurrency',
+    type=int,
+    default=UpstreamGuard.max_limit,
+    help="Upper bound of the adaptive number of concurrent requests per upstream host (default: %(default)s)."
+)
+parser.add_argument(
+    '--upstream-latency-target',
+    type=float,
+    default=UpstreamGuard.latency_target,
+    help="Seconds after which a successful upstream request lowers the concurrency limit like a failed one (default: %(default)s)."
+)
+parser.add_argument(
+    '--http-cache',
+    action='store_true',
+    help="Send ETags and cache headers aligned with the channel cache and answer conditional requests with 304."
+)
+parser.add_argument(
+    '--static-max-age',
+    type=int,
+    default=StaticAssets.max_age,
+    help="Seconds clients may reuse the overview page and icons without revalidation (default: %(default)s)."
+)
+parser.add_argument(
+    '--render-granularity',
+    type=int,
+    default=WidgetRenderer.granularity,
+    help="Granularity in seconds used for time-dependent widget texts (default: %(default)s)."
+)
+parser.add_argument(
+    '--render-workers',
+    type=int,
+    default=RenderPool.workers,
+    help="Number of processes rendering and encoding widgets, 0 renders within the serving process (default: %(default)s)."
+)
+parser.add_argument(
+    '--render-queue',
+    type=int,
+    default=RenderPool.max_queue,
+    help="Number of render jobs which may wait for a free render process before requests are rejected (default: %(default)s)."
+)
+parser.add_argument(
+    '--encode-profile',
+    choices=tuple(Encoder.profiles),
+    default=Encoder.default_profile,
+    help="Encoder profile used if a request specifies neither profile nor level, level 9 is used if omitted (default: %(default)s)."
+)
+parser.add_argument(
+    '--render-cache-size',
+    type=int,
+    default=RenderCache.max_bytes // (1024 * 1024),
+    help="Maximum size in MiB of the rendered image cache (default: %(default)s)."
+)
+parser.add_argument(
+    '--layer-cache-size',
+    type=int,
+    default=LayerCache.max_bytes // (1024 * 1024),
+    help="Maximum size in MiB of the pre-composited channel layers kept by every rendering process (default: %(default)s)."
+)
+parser.add_argument(
+    '--avatar-cache-ttl',
+    type=int,
+    default=AvatarCache.ttl,
+    help="Seconds until a cached avatar gets revalidated (default: %(default)s)."
+)
+parser.add_argument(
+    '--avatar-cache-size',
+    type=int,
+    default=AvatarCache.max_bytes // (1024 * 1024),
+    help="Maximum size in MiB of the decoded avatar cache (default: %(default)s)."
+)
+parser.add_argument(
+    '--disk-cache',
+    type=str,
+    default=DiskCache.path,
+    metavar='FILE',
+    help="SQLite file keeping channel information and avatars across restarts, disabled if omitted (default: %(default)s)."
+)
+parser.add_argument(
+    '--disk-cache-size',
+    type=int,
+    default=DiskCache.max_bytes // (1024 * 1024),
+    help="Maximum size in MiB of the entries kept on disk, the oldest ones are dropped first (default: %(default)s)."
+)
+parser.add_argument(
+    '--disk-cache-ttl',
+    type=int,
+    default=DiskCache.ttl,
+    help="Seconds after which entries kept on disk are dropped (default: %(default)s)."
+)
+parser.add_argument(
+    '--disk-cache-warm',
+    action='store_true',
+    help="Load the most recent entries kept on disk at startup instead of on first request."
+)
 args: Any = parser.parse_args()
+if args.cache_backend == 'shared' and not SharedMemoryBackend.supported:
+    parser.error("--cache-backend shared requires POSIX file locks, which aren't available on this platform, use memory or redis instead.")
+
+# apply configuration
+Logger.min_severity = Logger.Severity[args.log_level]
+Logger.output_format = Logger.Format[args.log_format]
+Logger.max_bytes = args.log_max_size * 1024 * 1024
+Logger.rotate_interval = args.log_rotate_interval
+Logger.backup_count = args.log_backups
+Logger.compress = args.log_compress
+if args.log_file:
+    Logger.mode = Logger.Mode.BOTH
+    Logger.change_logfile(name=args.log_file)
+IMCache.max_entries = args.cache_size
+IMCache.ttl = args.cache_ttl
+IMCache.negative_ttl = args.cache_negative_ttl
+ChannelProvider.wait_timeout = args.upstream_wait_timeout
+IMCache.stale_ttl = args.cache_stale_ttl
+Refresher.top_n = args.refresh_top
+if args.cache_backend == 'shared':
+    IMCache.backend = SharedMemoryBackend(name=args.cache_shared_name, slots=args.cache_shared_slots)
+elif args.cache_backend == 'redis':
+    IMCache.backend = RedisBackend(url=args.cache_redis_url)
+GrabBatcher.window = args.batch_window
+TwitchGrabber.batch_size = args.batch_size
+TwitchBatch.max_channels = args.batch_max_channels
+Subscriptions.interval = args.subscription_interval
+HttpPool.connect_timeout = args.upstream_connect_timeout
+HttpPool.read_timeout = args.upstream_read_timeout
+HttpPool.pool_maxsize = args.upstream_pool_size
+HttpPool.retries = args.upstream_retries
+Admission.client_rate = args.rate_limit_client
+Admission.client_burst = args.rate_limit_client_burst
+Admission.channel_rate = args.rate_limit_channel
+Admission.channel_burst = args.rate_limit_channel_burst
+Admission.concurrency = args.admission_concurrency
+Admission.max_queue = args.admission_queue
+Admission.queue_target = args.admission_queue_target
+AdmissionControl.forwarded = args.rate_limit_forwarded
+UpstreamGuard.failure_threshold = args.upstream_failure_threshold
+UpstreamGuard.open_timeout = args.upstream_open_timeout
+UpstreamGuard.max_limit = args.upstream_max_concurrency
+UpstreamGuard.initial_limit = min(UpstreamGuard.initial_limit, args.upstream_max_concurrency)
+UpstreamGuard.latency_target = args.upstream_latency_target
+WidgetRenderer.granularity = args.render_granularity
+WidgetHeaders.http_caching = args.http_cache
+StaticAssets.max_age = args.static_max_age
+RenderPool.workers = args.render_workers
+RenderPool.max_queue = args.render_queue
+Encoder.default_profile = args.encode_profile
+RenderCache.max_bytes = args.render_cache_size * 1024 * 1024
+LayerCache.max_bytes = args.layer_cache_size * 1024 * 1024
+AvatarCache.ttl = args.avatar_cache_ttl
+AvatarCache.max_bytes = args.avatar_cache_size * 1024 * 1024
+DiskCache.path = args.disk_cache
+DiskCache.max_bytes = args.disk_cache_size * 1024 * 1024
+DiskCache.ttl = args.disk_cache_ttl
 
 
 class StreamerInfo:
@@ -54,20 +452,38 @@ class StreamerInfo:
     __router = None
 
     def __init__(self: StreamerInfo):
-        self.__router = Router(version=__version__)
+        # render processes are forked by start(), before any other thread is running, the log writer included
+        RenderPool.start()
+        if args.log_async:
+            Logger.start_writer()
+        DiskCache.open()
+        if args.disk_cache_warm:
+            Logger.info(message="Loaded {} cached entries from disk.".format(DiskCache.warm()))
+        self.__router = Router(version=__version__, asynchronous=args.interface == 'asgi')
+        app: Any = self.__router.get_resources()
+        if args.interface != 'asgi':
+            # uvicorn would serve the WSGI app from a fixed pool of 10 threads, too few for the admission queue to engage
+            app = WSGIMiddleware(app=app, workers=args.wsgi_threads or Admission.threads(default=10))
         self.__ws_config = uvicorn.Config(
-            app=self.__router.get_resources(),
+            app=app,
             port=5005,
             log_level='debug',
-            interface='wsgi',
-            lifespan='off',
+            interface='asgi3',
+            lifespan='on' if args.interface == 'asgi' else 'off',
             use_colors=False,
             server_header=False
         )
         self.__ws = uvicorn.Server(self.__ws_config)
 
     def run(self: StreamerInfo):
+        if Refresher.top_n > 0:
+            Refresher.start(refresh=ChannelProvider.revalidate_many)
         self.__ws.run()
+        Refresher.stop()
+        RenderPool.stop()
+        HttpPool.close()
+        DiskCache.close()
+        IMCache.backend.close()
 
 
 # MAIN ROUTINE (entry point)
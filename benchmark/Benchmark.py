@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Callable
+
+from PIL import Image
+
+from business.Encoder import Encoder
+from business.WidgetRenderer import WidgetRenderer
+from data.AssetRegistry import AssetRegistry
+from data.IMCache import IMCache
+from data.LayerCache import LayerCache
+
+
+class Benchmark:
+    # metrics compared against a baseline, True if higher values are better
+    compared: dict[str, bool] = {
+        'mean_ms': False,
+        'p50_ms': False,
+        'p99_ms': False,
+        'throughput': True,
+        'peak_memory_kib': False,
+        'peak_rss_kib': False
+    }
+    formats: tuple[str, ...] = ('PNG', 'JPEG', 'WEBP')
+    levels: range = range(0, 10)
+
+    def __init__(self: Benchmark) -> None:
+        raise NotImplementedError("Instantiation of Benchmark not allowed.")
+
+    @staticmethod
+    def percentile(values: list[float], percent: float) -> float:
+        # nearest-rank percentile of an unsorted sample
+        if not values:
+            return 0.0
+        ordered: list[float] = sorted(values)
+        return ordered[min(len(ordered) - 1, max(0, int(round(percent / 100 * len(ordered))) - 1))]
+
+    @staticmethod
+    def summarize(durations: list[float]) -> dict[str, float]:
+        total: float = sum(durations)
+        return {
+            'iterations': len(durations),
+            'mean_ms': round(total / len(durations) * 1000, 4) if durations else 0.0,
+            'p50_ms': round(Benchmark.percentile(durations, 50) * 1000, 4),
+            'p99_ms': round(Benchmark.percentile(durations, 99) * 1000, 4),
+            'throughput': round(len(durations) / total, 2) if total else 0.0
+        }
+
+    @staticmethod
+    def measure(function: Callable[[], object], iterations: int, warmup: int = 3) -> dict[str, float]:
+        for _ in range(warmup):
+            function()
+        durations: list[float] = []
+        for _ in range(iterations):
+            started: float = perf_counter()
+            function()
+            durations.append(perf_counter() - started)
+        result: dict[str, float] = Benchmark.summarize(durations)
+        # allocations are traced in a separate run, tracing would distort the timings
+        tracemalloc.start()
+        function()
+        result['peak_memory_kib'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+        tracemalloc.stop()
+        return result
+
+    @staticmethod
+    def channel() -> IMCache.ChannelInformation:
+        return IMCache.ChannelInformation(
+            name='benchmark',
+            displayed_name='Benchmark',
+            is_partnered=True,
+            avatar_uri=None,
+            live_count=12345,
+            follower_count=6789012,
+            latest_stream=None,
+            timestamp=datetime.now()
+        )
+
+    @classmethod
+    def micro(cls: Benchmark, iterations: int) -> dict[str, dict]:
+        AssetRegistry.load()
+        information: IMCache.ChannelInformation = Benchmark.channel()
+        avatar: Image = Image.new('RGBA', (50, 50), (145, 70, 255, 255))
+        now: datetime = WidgetRenderer.timestamp()
+        results: dict[str, dict] = {
+            'render': Benchmark.measure(
+                function=lambda: WidgetRenderer.render(information=information, avatar=avatar, version='benchmark', now=now),
+                iterations=iterations
+            )
+        }
+        # rendering without the cached identity layer of the channel, e.g. after its avatar changed
+        results['render/uncached-layer'] = Benchmark.measure(
+            function=lambda: (LayerCache.clear(), WidgetRenderer.render(information=information, avatar=avatar, version='benchmark', now=now)),
+            iterations=iterations
+        )
+        image: Image = WidgetRenderer.render(information=information, avatar=avatar, version='benchmark', now=now)
+        # every format together with every level and profile selectable through the mode, level and profile parameters
+        for image_format in cls.formats:
+            for setting in tuple(cls.levels) + tuple(Encoder.profiles):
+                level, profile = (setting, None) if isinstance(setting, int) else (9, setting)
+                result: dict = Benchmark.measure(
+                    function=lambda: Encoder.encode(image=image, image_format=image_format, level=level, profile=profile),
+                    iterations=iterations
+                )
+                result['bytes'] = len(Encoder.encode(image=image, image_format=image_format, level=level, profile=profile))
+                results['encode/{}/{}'.format(image_format, setting)] = result
+        # cache lookups, measured in batches since a single lookup is too fast to time reliably
+        names: list[str] = ['channel{}'.format(index) for index in range(1000)]
+        for name in names:
+            IMCache.store(key=name, value=information)
+        results['imcache/get/1000'] = Benchmark.measure(function=lambda: [IMCache.get(name) for name in names], iterations=iterations)
+        return results
+
+    @staticmethod
+    def report(results: dict[str, dict]) -> None:
+        print('{:<24} {:>10} {:>10} {:>10} {:>12} {:>12} {:>10}'.format('case', 'mean ms', 'p50 ms', 'p99 ms', 'ops/s', 'memory KiB', 'bytes'))
+        for name, result in results.items():
+            print('{:<24} {:>10} {:>10} {:>10} {:>12} {:>12} {:>10}'.format(
+                name,
+                result.get('mean_ms', '-'),
+                result.get('p50_ms', '-'),
+                result.get('p99_ms', '-'),
+                result.get('throughput', '-'),
+                result.get('peak_memory_kib', result.get('peak_rss_kib', '-')),
+                result.get('bytes', '-')
+            ))
+
+    @staticmethod
+    def save(file: str, results: dict[str, dict]) -> None:
+        with open(file, 'w', encoding='UTF-8') as baseline:
+            json.dump({
+                'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results
+            }, baseline, indent=2)
+
+    @classmethod
+    def compare(cls: Benchmark, file: str, results: dict[str, dict], tolerance: float) -> bool:
+        # prints the relative change of every compared metric, returns False if any got worse than the tolerance
+        with open(file, 'r', encoding='UTF-8') as baseline:
+            previous: dict[str, dict] = json.load(baseline)['results']
+        passed: bool = True
+        for name, result in results.items():
+            for metric, higher_is_better in cls.compared.items():
+                if metric not in result or not previous.get(name, {}).get(metric):
+                    continue
+                change: float = (result[metric] - previous[name][metric]) / previous[name][metric] * 100
+                regressed: bool = (-change if higher_is_better else change) > tolerance
+                passed = passed and not regressed
+                print('{:<24} {:<16} {:>12} -> {:>12} {:>+8.1f}%{}'.format(
+                    name, metric, previous[name][metric], result[metric], change, '  REGRESSION' if regressed else ''
+                ))
+        return passed
+
+
+if __name__ == '__main__':
+    from benchmark.LoadTest import LoadTest
+
+    parser = argparse.ArgumentParser(description='Benchmarks the widget rendering and serves a load test against a local upstream stand-in.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    micro_parser = commands.add_parser('micro', help='time rendering, every encoder/level/profile combination and cache lookups')
+    micro_parser.add_argument('--iterations', type=int, default=50, help='timed runs per case')
+    load_parser = commands.add_parser('load', help='drive the served application against a local fake GQL and avatar server')
+    LoadTest.arguments(parser=load_parser)
+    for sub_parser in (micro_parser, load_parser):
+        sub_parser.add_argument('--save', metavar='FILE', help='store the results as baseline')
+        sub_parser.add_argument('--compare', metavar='FILE', help='compare the results with a stored baseline')
+        sub_parser.add_argument('--tolerance', type=float, default=10, help='accepted regression in percent before failing the comparison')
+    args = parser.parse_args()
+
+    results: dict[str, dict] = Benchmark.micro(iterations=args.iterations) if args.command == 'micro' else LoadTest.run(args=args)
+    Benchmark.report(results=results)
+    if args.save:
+        Benchmark.save(file=args.save, results=results)
+    if args.compare and not Benchmark.compare(file=args.compare, results=results, tolerance=args.tolerance):
+        sys.exit(1)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import fnmatch
+import socketserver
+from threading import Lock, Thread
+from time import monotonic
+
+
+class FakeRedis:
+    # local stand-in speaking the subset of the Redis protocol used by the cache backend
+    class Handler(socketserver.StreamRequestHandler):
+        server: FakeRedis.Server
+
+        def __read(self: FakeRedis.Handler) -> list[bytes] | None:
+            line: bytes = self.rfile.readline()
+            if not line:
+                return None
+            if not line.startswith(b'*'):
+                # inline command
+                return line.split()
+            arguments: list[bytes] = []
+            for _ in range(int(line[1:])):
+                length: int = int(self.rfile.readline()[1:])
+                arguments.append(self.rfile.read(length + 2)[:-2])
+            return arguments
+
+        @staticmethod
+        def __encode(reply: object) -> bytes:
+            if reply is None:
+                return b'$-1\r\n'
+            if isinstance(reply, Exception):
+                return b'-ERR %s\r\n' % str(reply).encode('UTF-8')
+            if isinstance(reply, str):
+                return b'+%s\r\n' % reply.encode('UTF-8')
+            if isinstance(reply, int):
+                return b':%d\r\n' % reply
+            if isinstance(reply, list):
+                return b'*%d\r\n' % len(reply) + b''.join(FakeRedis.Handler.__encode(item) for item in reply)
+            return b'$%d\r\n%s\r\n' % (len(reply), reply)
+
+        def handle(self: FakeRedis.Handler) -> None:
+            while True:
+                arguments: list[bytes] | None = self.__read()
+                if not arguments:
+                    return
+                try:
+                    reply: object = self.server.redis.execute(command=arguments[0].decode('UTF-8').upper(), arguments=arguments[1:])
+                except Exception as exc:
+                    reply = exc
+                self.wfile.write(self.__encode(reply))
+                if arguments[0].upper() == b'QUIT':
+                    return
+
+    class Server(socketserver.ThreadingTCPServer):
+        daemon_threads: bool = True
+        allow_reuse_address: bool = True
+        redis: FakeRedis = None
+
+    def __init__(self: FakeRedis) -> None:
+        self.__data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.__lock: Lock = Lock()
+        self.__server: FakeRedis.Server = None
+        self.__thread: Thread = None
+
+    @property
+    def url(self: FakeRedis) -> str:
+        host, port = self.__server.server_address[:2]
+        return 'redis://{}:{}/0'.format(host, port)
+
+    def __alive(self: FakeRedis, key: bytes) -> bool:
+        if key not in self.__data:
+            return False
+        expires: float | None = self.__data[key][1]
+        if expires is not None and expires <= monotonic():
+            del self.__data[key]
+            return False
+        return True
+
+    def execute(self: FakeRedis, command: str, arguments: list[bytes]) -> object:
+        with self.__lock:
+            if command in ('PING', 'QUIT', 'SELECT', 'AUTH'):
+                return 'PONG' if command == 'PING' else 'OK'
+            if command == 'GET':
+                return self.__data[arguments[0]][0] if self.__alive(arguments[0]) else None
+            if command == 'SET':
+                key, value, options = arguments[0], arguments[1], [option.upper() for option in arguments[2:]]
+                if (b'NX' in options and self.__alive(key)) or (b'XX' in options and not self.__alive(key)):
+                    return None
+                expires: float | None = None
+                if b'PX' in options:
+                    expires = monotonic() + int(options[options.index(b'PX') + 1]) / 1000
+                elif b'EX' in options:
+                    expires = monotonic() + int(options[options.index(b'EX') + 1])
+                self.__data[key] = (value, expires)
+                return 'OK'
+            if command == 'DEL':
+                return sum(1 for key in arguments if self.__alive(key) and self.__data.pop(key))
+            if command == 'EXISTS':
+                return sum(1 for key in arguments if self.__alive(key))
+            if command == 'SCAN':
+                # a single pass over every key, only the MATCH option is understood
+                options: list[bytes] = [option.upper() for option in arguments[1:]]
+                pattern: bytes = arguments[1:][options.index(b'MATCH') + 1] if b'MATCH' in options else b'*'
+                return [b'0', [key for key in list(self.__data) if self.__alive(key) and fnmatch.fnmatchcase(key, pattern)]]
+            if command == 'DBSIZE':
+                return sum(1 for key in list(self.__data) if self.__alive(key))
+            if command == 'EVAL':
+                # only the compare-and-delete script releasing locks is understood
+                key, token = arguments[2], arguments[3]
+                if b"redis.call('DEL'" not in arguments[0] or not self.__alive(key) or self.__data[key][0] != token:
+                    return 0
+                del self.__data[key]
+                return 1
+            if command == 'FLUSHDB':
+                self.__data.clear()
+                return 'OK'
+        raise ValueError("unknown command '{}'".format(command))
+
+    def start(self: FakeRedis, host: str = '127.0.0.1', port: int = 0) -> FakeRedis:
+        self.__server = FakeRedis.Server((host, port), FakeRedis.Handler)
+        self.__server.redis = self
+        self.__thread = Thread(target=self.__server.serve_forever, name='FakeRedis', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self: FakeRedis) -> None:
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__thread.join(timeout=5)
+            self.__server = None
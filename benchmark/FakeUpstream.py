@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+from PIL import Image
+
+
+class FakeUpstream:
+    # local stand-in for Twitch GQL and the avatar CDN with configurable latency and error rates
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version: str = 'HTTP/1.1'
+        server: FakeUpstream.Server
+
+        def log_message(self: FakeUpstream.Handler, format: str, *args) -> None:
+            pass
+
+        def __send(self: FakeUpstream.Handler, status: int, content_type: str = None, body: bytes = b'', headers: dict = None) -> None:
+            self.send_response(status)
+            if content_type:
+                self.send_header('Content-Type', content_type)
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def __delay(self: FakeUpstream.Handler, latency: float) -> bool:
+            # sleeps for the configured latency including jitter and tells whether the request should fail
+            upstream: FakeUpstream = self.server.upstream
+            upstream.count(self.command)
+            time.sleep(max(0.0, latency + random.uniform(-upstream.jitter, upstream.jitter)))
+            return random.random() < upstream.error_rate
+
+        def do_POST(self: FakeUpstream.Handler) -> None:
+            upstream: FakeUpstream = self.server.upstream
+            payload: dict = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+            if self.__delay(latency=upstream.gql_latency):
+                self.__send(status=500, content_type='application/json', body=b'{"error":"Internal Server Error"}')
+                return
+            variables: dict = payload.get('variables', {})
+            data: dict = {
+                'channel{}'.format(index): upstream.channel(name=variables['login{}'.format(index)])
+                for index in range(len(variables))
+            }
+            self.__send(status=200, content_type='application/json', body=json.dumps({'data': data}).encode('UTF-8'))
+
+        def do_GET(self: FakeUpstream.Handler) -> None:
+            upstream: FakeUpstream = self.server.upstream
+            if self.__delay(latency=upstream.avatar_latency):
+                self.__send(status=500)
+                return
+            body: bytes = upstream.avatar(name=self.path.rsplit('/', 1)[-1].split('.')[0])
+            etag: str = '"{}"'.format(hashlib.blake2b(body, digest_size=8).hexdigest())
+            if self.headers.get('If-None-Match') == etag:
+                self.__send(status=304, headers={'ETag': etag})
+                return
+            self.__send(status=200, content_type='image/png', body=body, headers={'ETag': etag})
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads: bool = True
+        upstream: FakeUpstream = None
+
+    def __init__(self: FakeUpstream, gql_latency: float = 0.05, avatar_latency: float = 0.02, jitter: float = 0.0, error_rate: float = 0.0, missing_prefix: str = 'missing') -> None:
+        self.gql_latency: float = gql_latency
+        self.avatar_latency: float = avatar_latency
+        self.jitter: float = jitter
+        self.error_rate: float = error_rate
+        # channels starting with this prefix don't exist
+        self.missing_prefix: str = missing_prefix
+        self.requests: dict[str, int] = {'POST': 0, 'GET': 0}
+        self.__lock: Lock = Lock()
+        self.__avatars: dict[str, bytes] = {}
+        self.__server: FakeUpstream.Server = None
+        self.__thread: Thread = None
+
+    @property
+    def base_uri(self: FakeUpstream) -> str:
+        host, port = self.__server.server_address[:2]
+        return 'http://{}:{}'.format(host, port)
+
+    @property
+    def gql_uri(self: FakeUpstream) -> str:
+        return self.base_uri + '/gql'
+
+    def count(self: FakeUpstream, method: str) -> None:
+        with self.__lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+
+    def channel(self: FakeUpstream, name: str) -> dict | None:
+        if name.startswith(self.missing_prefix):
+            return None
+        # derive stable channel data from the name
+        seed: int = int.from_bytes(hashlib.blake2b(name.encode('UTF-8'), digest_size=4).digest(), 'big')
+        live: bool = seed % 3 == 0
+        return {
+            'id': str(seed),
+            'login': name,
+            'displayName': name.title(),
+            'profileImageURL': '{}/avatar/{}.png'.format(self.base_uri, name),
+            'followers': {'totalCount': seed % 1000000},
+            'lastBroadcast': {'startedAt': '2022-10-{:02d}T12:00:00Z'.format(seed % 28 + 1)},
+            'stream': {'viewersCount': seed % 50000} if live else None,
+            'roles': {'isPartner': seed % 2 == 0}
+        }
+
+    def avatar(self: FakeUpstream, name: str) -> bytes:
+        with self.__lock:
+            if name not in self.__avatars:
+                seed: bytes = hashlib.blake2b(name.encode('UTF-8'), digest_size=3).digest()
+                buffer: io.BytesIO = io.BytesIO()
+                # served larger than displayed, so the grabber has to resize it like real avatars
+                Image.new('RGBA', (70, 70), (seed[0], seed[1], seed[2], 255)).save(buffer, 'PNG')
+                self.__avatars[name] = buffer.getvalue()
+            return self.__avatars[name]
+
+    def start(self: FakeUpstream, host: str = '127.0.0.1', port: int = 0) -> FakeUpstream:
+        self.__server = FakeUpstream.Server((host, port), FakeUpstream.Handler)
+        self.__server.upstream = self
+        self.__thread = Thread(target=self.__server.serve_forever, name='FakeUpstream', daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self: FakeUpstream) -> None:
+        if self.__server is not None:
+            self.__server.shutdown()
+            self.__server.server_close()
+            self.__thread.join(timeout=5)
+            self.__server = None
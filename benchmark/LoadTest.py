@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import random
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+
+import requests
+import uvicorn
+
+from benchmark.Benchmark import Benchmark
+from benchmark.FakeRedis import FakeRedis
+from benchmark.FakeUpstream import FakeUpstream
+from business.ChannelProvider import ChannelProvider
+from business.HttpPool import HttpPool
+from business.Logger import Logger
+from business.Refresher import Refresher
+from business.RenderPool import RenderPool
+from business.Router import Router
+from business.TwitchGrabber import TwitchGrabber
+from data.AvatarCache import AvatarCache
+from data.IMCache import IMCache
+from data.RedisBackend import RedisBackend
+from data.RenderCache import RenderCache
+from data.SharedMemoryBackend import SharedMemoryBackend
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+class LoadTest:
+    modes: tuple[str, ...] = ('png', 'jpeg', 'webp')
+
+    def __init__(self: LoadTest) -> None:
+        raise NotImplementedError("Instantiation of LoadTest not allowed.")
+
+    @staticmethod
+    def arguments(parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('--interface', choices=('wsgi', 'asgi'), default='wsgi', help='serving interface under test')
+        parser.add_argument('--duration', type=float, default=10, help='seconds the load is applied')
+        parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+        parser.add_argument('--client-processes', type=int, default=2, help='processes the clients are spread over')
+        parser.add_argument('--channels', type=int, default=200, help='distinct channels requested with a Zipf-like popularity')
+        parser.add_argument('--missing-ratio', type=float, default=0.05, help='share of requested channels which don\'t exist')
+        parser.add_argument('--gql-latency', type=float, default=0.05, help='seconds the fake GQL endpoint takes to answer')
+        parser.add_argument('--avatar-latency', type=float, default=0.02, help='seconds the fake avatar server takes to answer')
+        parser.add_argument('--jitter', type=float, default=0.01, help='random deviation of the upstream latency in seconds')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='share of upstream requests answered with 500')
+        parser.add_argument('--render-workers', type=int, default=0, help='render processes, 0 renders within the serving process')
+        parser.add_argument('--cache-backend', choices=('memory', 'shared', 'redis'), default='memory', help='channel cache storage, redis is served by a local stand-in')
+        parser.add_argument('--refresh-top', type=int, default=0, help='most requested channels refreshed in the background')
+
+    @staticmethod
+    def __free_port() -> int:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+            probe.bind(('127.0.0.1', 0))
+            return probe.getsockname()[1]
+
+    @staticmethod
+    def client(uri: str, channels: list[str], weights: list[float], duration: float, threads: int, seed: int) -> list[tuple[float, int]]:
+        # runs in its own process, so the clients don't compete with the server for the interpreter lock
+        deadline: float = time.monotonic() + duration
+
+        def run(index: int) -> list[tuple[float, int]]:
+            generator: random.Random = random.Random(seed * 1000 + index)
+            samples: list[tuple[float, int]] = []
+            with requests.Session() as session:
+                session.trust_env = False
+                while time.monotonic() < deadline:
+                    channel: str = generator.choices(channels, weights=weights)[0]
+                    params: dict = {'mode': generator.choice(LoadTest.modes), 'level': generator.randint(0, 9)}
+                    started: float = time.perf_counter()
+                    try:
+                        status: int = session.get('{}/{}'.format(uri, channel), params=params, timeout=30).status_code
+                    except requests.RequestException:
+                        status = 0
+                    samples.append((time.perf_counter() - started, status))
+            return samples
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            return [sample for samples in executor.map(run, range(threads)) for sample in samples]
+
+    @staticmethod
+    def __configure(args: argparse.Namespace, upstream: FakeUpstream) -> None:
+        Logger.mode = Logger.Mode.CONSOLE
+        Logger.min_severity = Logger.Severity.ERROR
+        TwitchGrabber.change_uri(upstream.gql_uri)
+        Refresher.top_n = args.refresh_top
+
+    @classmethod
+    def run(cls: LoadTest, args: argparse.Namespace) -> dict[str, dict]:
+        # render workers are forked by start(), before any thread is started
+        RenderPool.workers = args.render_workers
+        RenderPool.start()
+        upstream: FakeUpstream = FakeUpstream(
+            gql_latency=args.gql_latency,
+            avatar_latency=args.avatar_latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate
+        ).start()
+        LoadTest.__configure(args=args, upstream=upstream)
+        redis: FakeRedis | None = FakeRedis().start() if args.cache_backend == 'redis' else None
+        if redis:
+            IMCache.backend = RedisBackend(url=redis.url)
+        elif args.cache_backend == 'shared':
+            IMCache.backend = SharedMemoryBackend(name='streamerinfo-benchmark')
+        IMCache.backend.clear()
+        if Refresher.top_n > 0:
+            Refresher.start(refresh=ChannelProvider.revalidate_many)
+
+        asynchronous: bool = args.interface == 'asgi'
+        port: int = LoadTest.__free_port()
+        server: uvicorn.Server = uvicorn.Server(uvicorn.Config(
+            app=Router(version='benchmark', asynchronous=asynchronous).get_resources(),
+            host='127.0.0.1',
+            port=port,
+            log_level='warning',
+            access_log=False,
+            interface='asgi3' if asynchronous else 'wsgi',
+            lifespan='on' if asynchronous else 'off'
+        ))
+        serving: Thread = Thread(target=server.run, name='Server', daemon=True)
+        serving.start()
+        while not server.started:
+            time.sleep(0.05)
+
+        # every channel gets a weight following a Zipf-like distribution, a few don't exist at all
+        channels: list[str] = [
+            ('{}{}' if random.random() >= args.missing_ratio else upstream.missing_prefix + '{}{}').format('channel', index)
+            for index in range(args.channels)
+        ]
+        weights: list[float] = [1 / (rank + 1) for rank in range(len(channels))]
+        processes: int = max(1, min(args.client_processes, args.concurrency))
+        started: float = time.perf_counter()
+        with multiprocessing.get_context('spawn').Pool(processes=processes) as pool:
+            batches: list[list[tuple[float, int]]] = pool.starmap(LoadTest.client, [
+                ('http://127.0.0.1:{}'.format(port), channels, weights, args.duration, max(1, args.concurrency // processes), index)
+                for index in range(processes)
+            ])
+        elapsed: float = time.perf_counter() - started
+
+        server.should_exit = True
+        serving.join(timeout=10)
+        Refresher.stop()
+        RenderPool.stop()
+        HttpPool.close()
+        upstream.stop()
+        cache_stats: dict[str, dict] = {'channel': IMCache.stats(), 'avatar': AvatarCache.stats(), 'render': RenderCache.stats()}
+        IMCache.backend.close()
+        if redis:
+            redis.stop()
+
+        samples: list[tuple[float, int]] = [sample for batch in batches for sample in batch]
+        result: dict = Benchmark.summarize([duration for duration, _ in samples])
+        result['throughput'] = round(len(samples) / elapsed, 2)
+        statuses: dict[str, int] = {}
+        for _, status in samples:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        result['statuses'] = statuses
+        result['upstream_requests'] = dict(upstream.requests)
+        result['cache_hit_ratio'] = {
+            name: round(stats['hits'] / max(1, stats['hits'] + stats['misses']), 4)
+            for name, stats in cache_stats.items()
+        }
+        if resource is not None:
+            # peak resident memory of the serving process, reported in KiB on Linux
+            result['peak_rss_kib'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {'load/{}'.format(args.interface): result}
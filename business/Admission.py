@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import math
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Condition
+from time import monotonic
+
+from business.Metrics import Metrics
+
+
+class Admission:
+    class Rejected(Exception):
+        def __init__(self: Admission.Rejected, reason: str, retry_after: float) -> None:
+            super().__init__(reason)
+            # rate limited requests are answered with 429, shed ones with 503
+            self.reason: str = reason
+            self.limited: bool = reason in ('client', 'channel')
+            self.retry_after: int = max(1, math.ceil(retry_after))
+
+    @dataclass
+    class Bucket:
+        tokens: float
+        updated: float
+
+    # token buckets per client address and per channel, refilled by rate tokens per second up to burst, 0 disables them
+    client_rate: float = 20
+    client_burst: float = 100
+    # channels are only charged for requests which aren't answered from the caches
+    channel_rate: float = 5
+    channel_burst: float = 20
+    # buckets tracked per kind, the least recently used ones are dropped
+    max_buckets: int = 10000
+    # requests processed at once, waiting requests which are answered from the caches go first, 0 disables queueing
+    # served by WSGI, every processed and queued request occupies a server thread, see threads()
+    concurrency: int = 8
+    max_queue: int = 24
+    # seconds a request may wait for its turn, cold requests are shed right away while the queue is older than this
+    queue_target: float = 0.5
+
+    __condition: Condition = Condition()
+    __buckets: dict[str, OrderedDict[str, Admission.Bucket]] = {'client': OrderedDict(), 'channel': OrderedDict()}
+    __active: int = 0
+    __sequence: int = 0
+    # waiting requests as (priority, sequence), their enqueue times in arrival order
+    __waiting: list[tuple[int, int]] = []
+    __enqueued: dict[int, float] = {}
+    # waiting requests displaced by cached ones, rejected once they notice
+    __evicted: set[int] = set()
+    # events of waiting asynchronous requests with the loop they belong to, set whenever they may advance
+    __wakers: dict[int, tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+
+    def __init__(self: Admission) -> None:
+        raise NotImplementedError("Instantiation of Admission not allowed.")
+
+    @classmethod
+    def __refill(cls: Admission, kind: str, key: str, rate: float, burst: float, now: float) -> Admission.Bucket:
+        buckets: OrderedDict[str, Admission.Bucket] = cls.__buckets[kind]
+        bucket: Admission.Bucket | None = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = Admission.Bucket(tokens=burst, updated=now)
+            while len(buckets) > cls.max_buckets:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+            bucket.tokens = min(burst, bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+        return bucket
+
+    @classmethod
+    def limit(cls: Admission, client: str, channels: list[str], cold: list[str]) -> None:
+        # charges the client for every requested channel and every channel which has to be fetched or rendered
+        now: float = monotonic()
+        charges: list[tuple[str, str, float, float, float]] = []
+        if cls.client_rate > 0:
+            charges.append(('client', client, cls.client_rate, cls.client_burst, len(channels)))
+        if cls.channel_rate > 0:
+            charges.extend(('channel', channel, cls.channel_rate, cls.channel_burst, 1) for channel in cold)
+        with cls.__condition:
+            # every bucket is checked before any is charged, a rejected request costs nothing
+            taken: list[tuple[Admission.Bucket, float]] = []
+            for kind, key, rate, burst, cost in charges:
+                bucket: Admission.Bucket = Admission.__refill(kind=kind, key=key, rate=rate, burst=burst, now=now)
+                # requests costing more than the burst would never pass
+                cost = min(cost, burst)
+                if bucket.tokens < cost:
+                    Admission.__reject(reason=kind, retry_after=(cost - bucket.tokens) / rate)
+                taken.append((bucket, cost))
+            for bucket, cost in taken:
+                bucket.tokens -= cost
+
+    @staticmethod
+    def __reject(reason: str, retry_after: float) -> None:
+        Metrics.increment('streamerinfo_admission_rejected_total', reason=reason)
+        raise Admission.Rejected(reason=reason, retry_after=retry_after)
+
+    @classmethod
+    def __enqueue(cls: Admission, cheap: bool) -> int | None:
+        # None if the request was admitted right away, its sequence number if it has to wait
+        if cls.__active < cls.concurrency and not cls.__waiting:
+            cls.__active += 1
+            return None
+        if len(cls.__waiting) >= cls.max_queue:
+            cold: list[tuple[int, int]] = [entry for entry in cls.__waiting if entry[0]]
+            if not cheap or not cold:
+                Admission.__reject(reason='queue_full', retry_after=cls.queue_target)
+            # cached requests displace the most recent cold one
+            displaced: int = max(cold)[1]
+            cls.__evicted.add(displaced)
+            Admission.__remove(sequence=displaced)
+        now: float = monotonic()
+        if not cheap and cls.__enqueued and now - next(iter(cls.__enqueued.values())) > cls.queue_target:
+            # standing queue, cold requests wouldn't get their turn in time anyway
+            Admission.__reject(reason='queue_latency', retry_after=cls.queue_target)
+        cls.__sequence += 1
+        heapq.heappush(cls.__waiting, (0 if cheap else 1, cls.__sequence))
+        cls.__enqueued[cls.__sequence] = now
+        return cls.__sequence
+
+    @classmethod
+    def __remove(cls: Admission, sequence: int) -> None:
+        cls.__waiting = [entry for entry in cls.__waiting if entry[1] != sequence]
+        heapq.heapify(cls.__waiting)
+        del cls.__enqueued[sequence]
+        cls.__notify()
+
+    @classmethod
+    def __notify(cls: Admission) -> None:
+        # wakes the synchronous waiters and those asynchronous ones which can act, the next in line and the displaced ones
+        cls.__condition.notify_all()
+        sequences: set[int] = set(cls.__evicted)
+        if cls.__waiting and cls.__active < cls.concurrency:
+            sequences.add(cls.__waiting[0][1])
+        for sequence in sequences:
+            if sequence in cls.__wakers:
+                loop, event = cls.__wakers[sequence]
+                loop.call_soon_threadsafe(event.set)
+
+    @classmethod
+    def __advance(cls: Admission, sequence: int) -> bool:
+        # admits the waiting request if it's next in line and a slot is free
+        if sequence in cls.__evicted:
+            cls.__evicted.discard(sequence)
+            Admission.__reject(reason='queue_full', retry_after=cls.queue_target)
+        if cls.__active >= cls.concurrency or cls.__waiting[0][1] != sequence:
+            return False
+        heapq.heappop(cls.__waiting)
+        Metrics.observe('streamerinfo_admission_wait_seconds', monotonic() - cls.__enqueued.pop(sequence))
+        cls.__active += 1
+        return True
+
+    @classmethod
+    def __abandon(cls: Admission, sequence: int) -> None:
+        Admission.__remove(sequence=sequence)
+        Admission.__reject(reason='queue_timeout', retry_after=cls.queue_target)
+
+    @classmethod
+    def acquire(cls: Admission, cheap: bool) -> None:
+        if cls.concurrency <= 0:
+            return
+        with cls.__condition:
+            sequence: int | None = cls.__enqueue(cheap=cheap)
+            if sequence is None:
+                return
+            deadline: float = monotonic() + cls.queue_target
+            while not cls.__advance(sequence=sequence):
+                if monotonic() >= deadline:
+                    cls.__abandon(sequence=sequence)
+                cls.__condition.wait(timeout=deadline - monotonic())
+            # the next waiting request may fit as well
+            cls.__notify()
+
+    @classmethod
+    async def acquire_async(cls: Admission, cheap: bool) -> None:
+        if cls.concurrency <= 0:
+            return
+        event: asyncio.Event = asyncio.Event()
+        with cls.__condition:
+            sequence: int | None = cls.__enqueue(cheap=cheap)
+            if sequence is None:
+                return
+            cls.__wakers[sequence] = (asyncio.get_running_loop(), event)
+        deadline: float = monotonic() + cls.queue_target
+        try:
+            while True:
+                # cleared before checking, a release in between sets it again
+                event.clear()
+                with cls.__condition:
+                    if cls.__advance(sequence=sequence):
+                        cls.__notify()
+                        return
+                    if monotonic() >= deadline:
+                        cls.__abandon(sequence=sequence)
+                try:
+                    # don't block the event loop while waiting for a free slot
+                    await asyncio.wait_for(event.wait(), timeout=deadline - monotonic())
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # cancelled (e.g. the client disconnected) or rejected, a still queued entry would block everyone behind it
+            with cls.__condition:
+                cls.__evicted.discard(sequence)
+                if sequence in cls.__enqueued:
+                    Admission.__remove(sequence=sequence)
+            raise
+        finally:
+            with cls.__condition:
+                cls.__wakers.pop(sequence, None)
+
+    @classmethod
+    def release(cls: Admission) -> None:
+        if cls.concurrency <= 0:
+            return
+        with cls.__condition:
+            cls.__active = max(0, cls.__active - 1)
+            cls.__notify()
+
+    @classmethod
+    def threads(cls: Admission, default: int) -> int:
+        # server threads needed so that requests reach the queue instead of waiting in front of it
+        if cls.concurrency <= 0:
+            return default
+        return max(default, cls.concurrency + cls.max_queue)
+
+    @classmethod
+    def stats(cls: Admission) -> dict[str, int]:
+        with cls.__condition:
+            return {
+                'active': cls.__active,
+                'queued': len(cls.__waiting)
+            }
+
+    @classmethod
+    def reset(cls: Admission) -> None:
+        with cls.__condition:
+            for buckets in cls.__buckets.values():
+                buckets.clear()
+            cls.__active = 0
+            cls.__waiting = []
+            cls.__enqueued.clear()
+            cls.__evicted.clear()
+            cls.__wakers.clear()
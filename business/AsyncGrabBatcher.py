@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import asyncio
+
+from business.AsyncTwitchGrabber import AsyncTwitchGrabber
+from business.GrabBatcher import GrabBatcher
+from business.Logger import Logger
+from business.TwitchGrabber import TwitchGrabber
+from data.IMCache import IMCache
+
+
+class AsyncGrabBatcher:
+    # collects channel requests of the event loop during GrabBatcher.window into one upstream query
+    __loop: asyncio.AbstractEventLoop = None
+    __pending: dict[str, asyncio.Future] = {}
+    __timer: asyncio.TimerHandle = None
+    # running upstream queries, referenced until they finish
+    __tasks: set[asyncio.Task] = set()
+
+    def __init__(self: AsyncGrabBatcher) -> None:
+        raise NotImplementedError("Instantiation of AsyncGrabBatcher not allowed.")
+
+    @classmethod
+    async def grab(cls: AsyncGrabBatcher, channel_name: str) -> IMCache.ChannelInformation | bool | None:
+        return (await cls.grab_many(channel_names=[channel_name]))[channel_name]
+
+    @classmethod
+    async def grab_many(cls: AsyncGrabBatcher, channel_names: list[str]) -> dict[str, IMCache.ChannelInformation | bool | None]:
+        if GrabBatcher.window <= 0:
+            return await AsyncTwitchGrabber.grab_many(channel_names=channel_names)
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if cls.__loop is not loop:
+            # futures and timers belong to the loop they were created in
+            cls.__loop = loop
+            cls.__pending = {}
+            cls.__timer = None
+        futures: dict[str, asyncio.Future] = {}
+        for name in channel_names:
+            if name not in cls.__pending:
+                cls.__pending[name] = loop.create_future()
+            futures[name] = cls.__pending[name]
+        if len(cls.__pending) >= TwitchGrabber.batch_size:
+            # batch is full, no need to wait for the window to close
+            cls.__flush()
+        elif cls.__timer is None:
+            cls.__timer = loop.call_later(GrabBatcher.window, cls.__flush)
+        # shielded, a cancelled caller mustn't cancel the result other callers wait for
+        results: list = await asyncio.gather(*(asyncio.shield(future) for future in futures.values()))
+        return dict(zip(futures, results))
+
+    @classmethod
+    def __flush(cls: AsyncGrabBatcher) -> None:
+        pending: dict[str, asyncio.Future] = cls.__pending
+        cls.__pending = {}
+        if cls.__timer:
+            cls.__timer.cancel()
+            cls.__timer = None
+        if pending:
+            task: asyncio.Task = cls.__loop.create_task(AsyncGrabBatcher.__fetch(pending=pending))
+            cls.__tasks.add(task)
+            task.add_done_callback(cls.__tasks.discard)
+
+    @staticmethod
+    async def __fetch(pending: dict[str, asyncio.Future]) -> None:
+        results: dict[str, IMCache.ChannelInformation | bool | None] = {}
+        try:
+            results = await AsyncTwitchGrabber.grab_many(channel_names=list(pending))
+        except Exception as exc:
+            Logger.warn(message="Batched request to Twitch GQL failed: {}".format(exc))
+        for name, future in pending.items():
+            if not future.done():
+                future.set_result(results.get(name, False))
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import asyncio
+from time import perf_counter
+
+import httpx
+
+from business.HttpPool import HttpPool
+from business.Logger import Logger
+from business.Metrics import Metrics
+from business.TwitchGrabber import TwitchGrabber
+from business.UpstreamGuard import UpstreamGuard
+from data.AvatarCache import AvatarCache
+from data.IMCache import IMCache
+
+
+class AsyncTwitchGrabber:
+    __client: httpx.AsyncClient = None
+
+    def __init__(self: AsyncTwitchGrabber) -> None:
+        raise NotImplementedError("Instantiation of AsyncTwitchGrabber not allowed.")
+
+    @staticmethod
+    def __headers(headers: dict) -> dict:
+        # httpx doesn't support removing default headers by setting them to None
+        return {key: value for key, value in headers.items() if value is not None}
+
+    @classmethod
+    def client(cls: AsyncTwitchGrabber) -> httpx.AsyncClient:
+        if cls.__client is None:
+            cls.__client = httpx.AsyncClient(
+                timeout=httpx.Timeout(HttpPool.read_timeout, connect=HttpPool.connect_timeout),
+                limits=httpx.Limits(max_connections=HttpPool.pool_connections * HttpPool.pool_maxsize, max_keepalive_connections=HttpPool.pool_maxsize),
+                # retries failed connection attempts, failed answers are retried by __request
+                transport=httpx.AsyncHTTPTransport(retries=HttpPool.retries)
+            )
+            # like the synchronous requests, don't send a user agent at all
+            del cls.__client.headers['User-Agent']
+        return cls.__client
+
+    @classmethod
+    async def close(cls: AsyncTwitchGrabber) -> None:
+        if cls.__client is not None:
+            await cls.__client.aclose()
+            cls.__client = None
+
+    @classmethod
+    async def __request(cls: AsyncTwitchGrabber, method: str, url: str, **kwargs) -> httpx.Response:
+        # raises UpstreamGuard.Rejected without calling the host if its circuit is open or its concurrency limit is reached
+        await UpstreamGuard.acquire_async(url)
+        started: float = perf_counter()
+        success: bool | None = False
+        try:
+            # same retry policy as the pooled synchronous session
+            for retry in range(HttpPool.retries + 1):
+                if retry:
+                    await asyncio.sleep(HttpPool.backoff(retry))
+                res: httpx.Response = await cls.client().request(method, url, **kwargs)
+                if res.status_code not in HttpPool.retry_statuses:
+                    break
+            success = HttpPool.succeeded(res.status_code)
+        except asyncio.CancelledError:
+            # the client went away, this tells nothing about the host
+            success = None
+            raise
+        finally:
+            UpstreamGuard.release(url, success=success, duration=perf_counter() - started)
+        return res
+
+    @classmethod
+    async def grab(cls: AsyncTwitchGrabber, channel_name: str) -> IMCache.ChannelInformation | bool | None:
+        return (await cls.grab_many(channel_names=[channel_name]))[channel_name]
+
+    @classmethod
+    async def grab_many(cls: AsyncTwitchGrabber, channel_names: list[str]) -> dict[str, IMCache.ChannelInformation | bool | None]:
+        results: dict[str, IMCache.ChannelInformation | bool | None] = {}
+        for offset in range(0, len(channel_names), TwitchGrabber.batch_size):
+            results.update(await cls.__grab_batch(channel_names=channel_names[offset:offset + TwitchGrabber.batch_size]))
+        return results
+
+    @classmethod
+    async def __grab_batch(cls: AsyncTwitchGrabber, channel_names: list[str]) -> dict[str, IMCache.ChannelInformation | bool | None]:
+        try:
+            with Metrics.timer(stage='upstream_gql'):
+                res: httpx.Response = await cls.__request(
+                    'POST',
+                    TwitchGrabber.uri(),
+                    json=TwitchGrabber.payload(channel_names=channel_names),
+                    headers=AsyncTwitchGrabber.__headers(TwitchGrabber.headers())
+                )
+            return TwitchGrabber.parse(
+                channel_names=channel_names,
+                status_code=res.status_code,
+                content=res.content,
+                data=res.json() if res.status_code == 200 else {}
+            )
+        except UpstreamGuard.Rejected as rejected:
+            Logger.debug(message="Request to Twitch GQL skipped: {}".format(rejected))
+            return dict.fromkeys(channel_names, False)
+        except httpx.HTTPError as err:
+            Logger.warn(message="Request to Twitch GQL couldn't be established: {}".format(err))
+        except Exception as exc:
+            Logger.warn(message="An exception occurred while trying to parse Twitch GQL data: {}".format(exc))
+        Metrics.increment('streamerinfo_upstream_errors_total', upstream='gql')
+        return dict.fromkeys(channel_names, False)
+
+    @classmethod
+    async def grab_avatar(cls: AsyncTwitchGrabber, url: str, cached: AvatarCache.AvatarInformation = None) -> AvatarCache.AvatarInformation | bool:
+        try:
+            with Metrics.timer(stage='upstream_avatar'):
+                res: httpx.Response = await cls.__request(
+                    'GET',
+                    url,
+                    headers=AsyncTwitchGrabber.__headers(TwitchGrabber.avatar_headers(cached=cached)),
+                    timeout=httpx.Timeout(min(5.0, HttpPool.read_timeout), connect=HttpPool.connect_timeout)
+                )
+            return TwitchGrabber.parse_avatar(url=url, status_code=res.status_code, headers=res.headers, content=res.content, cached=cached)
+        except UpstreamGuard.Rejected as rejected:
+            Logger.debug(message="Request for avatar skipped: {}".format(rejected))
+            return False
+        except httpx.HTTPError as err:
+            Logger.warn(message="Request for avatar couldn't be established: {}".format(err))
+        except Exception as exc:
+            Logger.warn(message="An exception occurred while trying to load avatar: {}".format(exc))
+        Metrics.increment('streamerinfo_upstream_errors_total', upstream='avatar')
+        return False
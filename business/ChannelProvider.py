@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from business.AsyncGrabBatcher import AsyncGrabBatcher
+from business.AsyncTwitchGrabber import AsyncTwitchGrabber
+from business.GrabBatcher import GrabBatcher
+from business.Refresher import Refresher
+from business.SingleFlight import AsyncSingleFlight, SingleFlight
+from business.TwitchGrabber import TwitchGrabber
+from business.UpstreamGuard import UpstreamGuard
+from data.AvatarCache import AvatarCache
+from data.DiskCache import DiskCache
+from data.IMCache import IMCache
+
+
+class ChannelProvider:
+    # seconds a request waits for a concurrent fetch of the same key before falling back to stale data
+    wait_timeout: float = 10
+
+    __channel_flight: SingleFlight = SingleFlight()
+    __avatar_flight: SingleFlight = SingleFlight()
+    __async_channel_flight: AsyncSingleFlight = AsyncSingleFlight()
+    __async_avatar_flight: AsyncSingleFlight = AsyncSingleFlight()
+    # threads downloading the avatars of a batch concurrently, started on first use
+    __avatar_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='avatar')
+    # threads joining the fetches of a batch's missing channels concurrently, so the batcher requests them together
+    __channel_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='channel')
+
+    def __init__(self: ChannelProvider) -> None:
+        raise NotImplementedError("Instantiation of ChannelProvider not allowed.")
+
+    @classmethod
+    def __lookup(cls: ChannelProvider, name: str) -> IMCache.ChannelInformation | bool | None:
+        # returns None if the channel is known to not exist and False if it has to be fetched
+        if DiskCache.is_enabled() and not IMCache.contains(name):
+            # continue with information stored before the last restart
+            DiskCache.load_channel(name)
+        if IMCache.is_missing(name):
+            return None
+        information: IMCache.ChannelInformation = IMCache.get(name)
+        if not information and UpstreamGuard.is_open(TwitchGrabber.uri()):
+            # upstream is failing, serve outdated information of any age instead of a refresh which would be rejected
+            information = IMCache.peek(name)
+        if not information and Refresher.is_running():
+            information = IMCache.peek(name, max_stale=IMCache.stale_ttl)
+            if information:
+                # serve outdated information right away and refresh it in the background
+                Refresher.schedule(name)
+        return information
+
+    @staticmethod
+    async def __lookup_async(name: str) -> IMCache.ChannelInformation | bool | None:
+        # the disk tier queries SQLite, kept off the event loop like blocking cache backends
+        if DiskCache.is_enabled():
+            return await asyncio.to_thread(ChannelProvider.__lookup, name)
+        return await IMCache.offload(ChannelProvider.__lookup, name)
+
+    @staticmethod
+    def is_cached(name: str) -> bool:
+        # tells whether a lookup would be answered without waiting for upstream, without affecting the cache statistics
+        if IMCache.is_cached(name):
+            return True
+        if UpstreamGuard.is_open(TwitchGrabber.uri()):
+            return bool(IMCache.peek(name))
+        return Refresher.is_running() and bool(IMCache.peek(name, max_stale=IMCache.stale_ttl))
+
+    @staticmethod
+    def __fetched(information: IMCache.ChannelInformation | bool | None, stale: IMCache.ChannelInformation | bool) -> IMCache.ChannelInformation | bool:
+        if information is None:
+            return False
+        if not information:
+            # upstream failed, keep serving the outdated information if there is any
+            return stale
+        return information
+
+    @staticmethod
+    def __served(name: str, information: IMCache.ChannelInformation | bool) -> IMCache.ChannelInformation | bool:
+        if information and Refresher.is_running():
+            Refresher.record(name)
+        return information
+
+    @classmethod
+    def channel(cls: ChannelProvider, name: str) -> IMCache.ChannelInformation | bool:
+        information: IMCache.ChannelInformation = cls.__lookup(name)
+        if information is None:
+            # channel is known to not exist
+            return False
+        if not information:
+            information = cls.__joined(name)
+        return ChannelProvider.__served(name=name, information=information)
+
+    @classmethod
+    def __joined(cls: ChannelProvider, name: str) -> IMCache.ChannelInformation | bool:
+        # data doesn't exist or expired, refreshing it once for all concurrent requests
+        stale: IMCache.ChannelInformation = IMCache.peek(name)
+        return ChannelProvider.__fetched(
+            information=cls.__channel_flight.do(
+                key=name,
+                function=lambda: cls.refresh(name),
+                timeout=cls.wait_timeout,
+                fallback=stale
+            ),
+            stale=stale
+        )
+
+    @classmethod
+    async def channel_async(cls: ChannelProvider, name: str) -> IMCache.ChannelInformation | bool:
+        information: IMCache.ChannelInformation = await ChannelProvider.__lookup_async(name)
+        if information is None:
+            # channel is known to not exist
+            return False
+        if not information:
+            # data doesn't exist or expired, refreshing it once for all concurrent requests
+            stale: IMCache.ChannelInformation = await IMCache.offload(IMCache.peek, name)
+            information = ChannelProvider.__fetched(
+                information=await cls.__async_channel_flight.do(
+                    key=name,
+                    function=lambda: cls.refresh_async(name),
+                    timeout=cls.wait_timeout,
+                    fallback=stale
+                ),
+                stale=stale
+            )
+        return ChannelProvider.__served(name=name, information=information)
+
+    @classmethod
+    def channels(cls: ChannelProvider, names: list[str]) -> dict[str, IMCache.ChannelInformation | bool]:
+        # missing channels join fetches already in flight, the remaining ones are requested together by the batcher
+        found: dict[str, IMCache.ChannelInformation | bool | None] = {name: cls.__lookup(name) for name in names}
+        missing: list[str] = [name for name, information in found.items() if information is not None and not information]
+        if len(missing) > 1:
+            found.update(zip(missing, cls.__channel_executor.map(cls.__joined, missing)))
+        elif missing:
+            found[missing[0]] = cls.__joined(missing[0])
+        return {name: ChannelProvider.__served(name=name, information=information) if information else False for name, information in found.items()}
+
+    @classmethod
+    async def channels_async(cls: ChannelProvider, names: list[str]) -> dict[str, IMCache.ChannelInformation | bool]:
+        # every channel joins fetches already in flight, the remaining ones are requested together by the batcher
+        return dict(zip(names, await asyncio.gather(*(cls.channel_async(name) for name in names))))
+
+    @classmethod
+    def revalidate_many(cls: ChannelProvider, names: list[str]) -> None:
+        # fetched together with concurrent cache misses in as few upstream requests as possible
+        for name, information in GrabBatcher.grab_many(channel_names=names).items():
+            ChannelProvider.__store(name=name, information=information)
+            if information:
+                cls.avatar(information.avatar_uri)
+
+    @staticmethod
+    def __refreshed(name: str) -> IMCache.ChannelInformation | bool | None:
+        # another process may have fetched the channel while this one waited for the cache-wide lock
+        if not IMCache.backend.shared:
+            return False
+        if IMCache.is_missing(name):
+            return None
+        return IMCache.peek(name, max_stale=0)
+
+    @classmethod
+    def refresh(cls: ChannelProvider, name: str) -> IMCache.ChannelInformation | bool | None:
+        with IMCache.lock(key=name, timeout=cls.wait_timeout):
+            information: IMCache.ChannelInformation = ChannelProvider.__refreshed(name)
+            if information is not False:
+                return information
+            information = GrabBatcher.grab(name)
+            ChannelProvider.__store(name=name, information=information)
+        return information
+
+    @classmethod
+    async def refresh_async(cls: ChannelProvider, name: str) -> IMCache.ChannelInformation | bool | None:
+        async with IMCache.lock_async(key=name, timeout=cls.wait_timeout):
+            information: IMCache.ChannelInformation = await IMCache.offload(ChannelProvider.__refreshed, name)
+            if information is not False:
+                return information
+            information = await AsyncGrabBatcher.grab(name)
+            await IMCache.offload(ChannelProvider.__store, name=name, information=information)
+        return information
+
+    @staticmethod
+    def __store(name: str, information: IMCache.ChannelInformation | bool | None) -> None:
+        if information is None:
+            IMCache.store_missing(key=name)
+            DiskCache.store_channel(name=name, information=None)
+        elif information:
+            IMCache.store(key=name, value=information)
+            DiskCache.store_channel(name=name, information=information)
+
+    @classmethod
+    def avatar(cls: ChannelProvider, uri: str) -> Image | None:
+        if not uri:
+            return None
+        cached: AvatarCache.AvatarInformation = AvatarCache.get(uri) or (DiskCache.load_avatar(uri) if DiskCache.is_enabled() else False)
+        if cached and (AvatarCache.is_fresh(cached) or UpstreamGuard.is_open(uri)):
+            return cached.image
+        # avatar is unknown or expired, download or revalidate it once for all concurrent requests
+        return cls.__avatar_flight.do(
+            key=uri,
+            function=lambda: ChannelProvider.__stored_avatar(
+                uri=uri,
+                avatar=TwitchGrabber.grab_avatar(url=uri, cached=cached if cached else None),
+                cached=cached
+            ),
+            timeout=cls.wait_timeout,
+            fallback=cached.image if cached else None
+        )
+
+    @classmethod
+    async def avatar_async(cls: ChannelProvider, uri: str) -> Image | None:
+        if not uri:
+            return None
+        cached: AvatarCache.AvatarInformation = AvatarCache.get(uri) or (await asyncio.to_thread(DiskCache.load_avatar, uri) if DiskCache.is_enabled() else False)
+        if cached and (AvatarCache.is_fresh(cached) or UpstreamGuard.is_open(uri)):
+            return cached.image
+
+        async def refresh() -> Image | None:
+            return ChannelProvider.__stored_avatar(
+                uri=uri,
+                avatar=await AsyncTwitchGrabber.grab_avatar(url=uri, cached=cached if cached else None),
+                cached=cached
+            )
+
+        # avatar is unknown or expired, download or revalidate it once for all concurrent requests
+        return await cls.__async_avatar_flight.do(
+            key=uri,
+            function=refresh,
+            timeout=cls.wait_timeout,
+            fallback=cached.image if cached else None
+        )
+
+    @classmethod
+    def avatars(cls: ChannelProvider, uris: list[str]) -> list[Image | None]:
+        # downloaded concurrently instead of one after another, each with its own timeout
+        if len(uris) <= 1:
+            return [cls.avatar(uri) for uri in uris]
+        return list(cls.__avatar_executor.map(cls.avatar, uris))
+
+    @classmethod
+    async def avatars_async(cls: ChannelProvider, uris: list[str]) -> list[Image | None]:
+        return list(await asyncio.gather(*(cls.avatar_async(uri) for uri in uris)))
+
+    @staticmethod
+    def __stored_avatar(uri: str, avatar: AvatarCache.AvatarInformation | bool, cached: AvatarCache.AvatarInformation | bool) -> Image | None:
+        if not avatar:
+            # keep serving the outdated avatar if revalidation failed
+            return cached.image if cached else None
+        AvatarCache.store(key=uri, value=avatar)
+        DiskCache.store_avatar(uri=uri, avatar=avatar)
+        return avatar.image
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import io
+
+from PIL import Image
+
+
+class Encoder:
+    # Pillow settings per profile and format, measured with `python -m benchmark.Benchmark micro` on the widget:
+    # fast favours encode time, smallest favours bytes and balanced stays within a few milliseconds,
+    # lossy WEBP is faster and, with photo avatars, smaller than lossless, balanced keeps the widget lossless
+    profiles: dict[str, dict[str, dict]] = {
+        'fast': {
+            'PNG': {'compress_level': 1},
+            'JPEG': {'quality': 80},
+            'WEBP': {'quality': 80, 'method': 0}
+        },
+        'balanced': {
+            'PNG': {'compress_level': 6},
+            'JPEG': {'quality': 85, 'optimize': True},
+            'WEBP': {'lossless': True, 'quality': 75, 'method': 3}
+        },
+        'smallest': {
+            'PNG': {'compress_level': 9},
+            'JPEG': {'quality': 75, 'optimize': True, 'progressive': True},
+            'WEBP': {'quality': 80, 'method': 4}
+        }
+    }
+    # profile used if a request neither asks for a profile nor a level, None keeps the level based settings
+    default_profile: str | None = None
+
+    def __init__(self: Encoder) -> None:
+        raise NotImplementedError("Instantiation of Encoder not allowed.")
+
+    @staticmethod
+    def __level_options(image_format: str, level: int) -> dict:
+        # settings selected by the level parameter
+        if image_format == 'PNG':
+            return {'optimize': True, 'compress_level': level}
+        if image_format == 'JPEG':
+            return {'optimize': True, 'quality': (level * 10) + 5}
+        return {'lossless': True, 'quality': (level * 10) + 10}
+
+    @classmethod
+    def options(cls: Encoder, image_format: str, level: int, profile: str | None = None) -> dict:
+        if image_format not in ('PNG', 'JPEG', 'WEBP'):
+            raise ValueError("Unsupported image format: {}".format(image_format))
+        if profile is not None:
+            return cls.profiles[profile][image_format]
+        return Encoder.__level_options(image_format=image_format, level=level)
+
+    @classmethod
+    def encode(cls: Encoder, image: Image, image_format: str, level: int, profile: str | None = None) -> bytes:
+        options: dict = cls.options(image_format=image_format, level=level, profile=profile)
+        rendered_image: io.BytesIO = io.BytesIO()
+        (image.convert('RGB') if image_format == 'JPEG' else image).save(rendered_image, image_format, **options)
+        return rendered_image.getvalue()
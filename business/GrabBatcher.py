@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+from concurrent.futures import Future
+from threading import Lock, Timer
+
+from business.Logger import Logger
+from business.TwitchGrabber import TwitchGrabber
+from data.IMCache import IMCache
+
+
+class GrabBatcher:
+    # seconds during which channel requests are collected into one upstream query, 0 disables batching
+    window: float = 0.01
+
+    __lock: Lock = Lock()
+    __pending: dict[str, Future] = {}
+    __timer: Timer = None
+
+    def __init__(self: GrabBatcher) -> None:
+        raise NotImplementedError("Instantiation of GrabBatcher not allowed.")
+
+    @classmethod
+    def grab(cls: GrabBatcher, channel_name: str) -> IMCache.ChannelInformation | bool | None:
+        return cls.grab_many(channel_names=[channel_name])[channel_name]
+
+    @classmethod
+    def grab_many(cls: GrabBatcher, channel_names: list[str]) -> dict[str, IMCache.ChannelInformation | bool | None]:
+        if cls.window <= 0:
+            return TwitchGrabber.grab_many(channel_names=channel_names)
+        futures: dict[str, Future] = {}
+        flush: bool = False
+        with cls.__lock:
+            for name in channel_names:
+                if name not in cls.__pending:
+                    cls.__pending[name] = Future()
+                futures[name] = cls.__pending[name]
+            if len(cls.__pending) >= TwitchGrabber.batch_size:
+                # batch is full, no need to wait for the window to close
+                flush = True
+            elif cls.__timer is None:
+                cls.__timer = Timer(interval=cls.window, function=cls.__flush)
+                cls.__timer.daemon = True
+                cls.__timer.start()
+        if flush:
+            cls.__flush()
+        return {name: future.result() for name, future in futures.items()}
+
+    @classmethod
+    def __flush(cls: GrabBatcher) -> None:
+        with cls.__lock:
+            pending: dict[str, Future] = cls.__pending
+            cls.__pending = {}
+            if cls.__timer:
+                cls.__timer.cancel()
+                cls.__timer = None
+        if not pending:
+            return
+        results: dict[str, IMCache.ChannelInformation | bool | None] = {}
+        try:
+            results = TwitchGrabber.grab_many(channel_names=list(pending))
+        except Exception as exc:
+            Logger.warn(message="Batched request to Twitch GQL failed: {}".format(exc))
+        for name, future in pending.items():
+            future.set_result(results.get(name, False))
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+from threading import Lock
+from time import perf_counter
+
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from business.UpstreamGuard import UpstreamGuard
+
+
+class HttpPool:
+    class CountingHTTPConnectionPool(HTTPConnectionPool):
+        def _new_conn(self):
+            HttpPool.count(metric='connections')
+            return super()._new_conn()
+
+    class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+        def _new_conn(self):
+            HttpPool.count(metric='connections')
+            return super()._new_conn()
+
+    class PooledAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs) -> None:
+            super().init_poolmanager(*args, **kwargs)
+            # count newly established connections to be able to tell how often connections are reused
+            self.poolmanager.pool_classes_by_scheme = {
+                'http': HttpPool.CountingHTTPConnectionPool,
+                'https': HttpPool.CountingHTTPSConnectionPool
+            }
+
+    connect_timeout: float = 3.05
+    read_timeout: float = 10
+    # number of hosts with pooled connections and number of kept-alive connections per host
+    pool_connections: int = 4
+    pool_maxsize: int = 32
+    retries: int = 2
+    backoff_factor: float = 0.2
+    # answers retried after a backoff, rate limited ones fail fast to stale data and the circuit breaker
+    retry_statuses: tuple[int, ...] = (500, 502, 503, 504)
+
+    __session: Session = None
+    __lock: Lock = Lock()
+    __metrics: dict[str, int] = {
+        'requests': 0,
+        'connections': 0,
+        'retries': 0
+    }
+
+    def __init__(self: HttpPool) -> None:
+        raise NotImplementedError("Instantiation of HttpPool not allowed.")
+
+    @classmethod
+    def session(cls: HttpPool) -> Session:
+        if cls.__session is None:
+            with cls.__lock:
+                if cls.__session is None:
+                    retry: Retry = Retry(
+                        total=cls.retries,
+                        connect=cls.retries,
+                        read=0,
+                        status=cls.retries,
+                        backoff_factor=cls.backoff_factor,
+                        status_forcelist=cls.retry_statuses,
+                        allowed_methods=None,
+                        # the waits a host asks for are unbounded and would hold threads, guard slots and single-flight leaders
+                        respect_retry_after_header=False,
+                        raise_on_status=False
+                    )
+                    adapter: HttpPool.PooledAdapter = HttpPool.PooledAdapter(
+                        pool_connections=cls.pool_connections,
+                        pool_maxsize=cls.pool_maxsize,
+                        max_retries=retry
+                    )
+                    session: Session = Session()
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    cls.__session = session
+        return cls.__session
+
+    @classmethod
+    def backoff(cls: HttpPool, retry: int) -> float:
+        # seconds before the given retry, the same exponential backoff urllib3 applies
+        return 0 if retry <= 1 else cls.backoff_factor * (2 ** (retry - 1))
+
+    @staticmethod
+    def succeeded(status_code: int) -> bool:
+        # answers telling that the upstream host is struggling
+        return status_code < 500 and status_code != 429
+
+    @classmethod
+    def request(cls: HttpPool, method: str, url: str, read_timeout: float = None, **kwargs) -> Response:
+        # raises UpstreamGuard.Rejected without calling the host if its circuit is open or its concurrency limit is reached
+        UpstreamGuard.acquire(url)
+        started: float = perf_counter()
+        success: bool = False
+        try:
+            cls.count(metric='requests')
+            res: Response = cls.session().request(
+                method,
+                url,
+                timeout=(cls.connect_timeout, min(read_timeout, cls.read_timeout) if read_timeout else cls.read_timeout),
+                **kwargs
+            )
+            success = HttpPool.succeeded(res.status_code)
+        finally:
+            UpstreamGuard.release(url, success=success, duration=perf_counter() - started)
+        if res.raw is not None and res.raw.retries is not None and res.raw.retries.history:
+            cls.count(metric='retries', value=len(res.raw.retries.history))
+        return res
+
+    @classmethod
+    def count(cls: HttpPool, metric: str, value: int = 1) -> None:
+        with cls.__lock:
+            cls.__metrics[metric] += value
+
+    @classmethod
+    def stats(cls: HttpPool) -> dict[str, int]:
+        with cls.__lock:
+            stats: dict[str, int] = dict(cls.__metrics)
+        stats['reused'] = max(0, stats['requests'] + stats['retries'] - stats['connections'])
+        return stats
+
+    @classmethod
+    def close(cls: HttpPool) -> None:
+        with cls.__lock:
+            if cls.__session is not None:
+                cls.__session.close()
+                cls.__session = None
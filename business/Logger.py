@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import gzip
 import inspect
+import json
+import os
+import shutil
 import sys
 from datetime import datetime
 from enum import Enum
 from os import path
-from time import time
+from queue import Queue, Empty, Full
+from threading import Lock, Thread
+from time import time, monotonic
 
 from pytz import timezone
 
@@ -24,36 +30,152 @@ class Logger:
         ERROR = 4
         FATAL = 5
 
+    class Format(Enum):
+        TEXT = 0
+        JSON = 1
+
     mode = Mode.BOTH
+    output_format = Format.TEXT
+    # rotate the log file after it reached max_bytes or after rotate_interval seconds, 0 disables the respective policy
+    max_bytes: int = 0
+    rotate_interval: int = 0
+    backup_count: int = 5
+    compress: bool = False
+    # messages below this severity are dropped before any caller inspection or formatting happens
+    min_severity = Severity.TRACE
+    # number of records and seconds after which the background writer flushes its output
+    batch_size: int = 256
+    flush_interval: float = 0.5
     __logfile = None
+    __logfile_name: str = 'run.log'
+    __logfile_opened: float = 0
     __init_time = time().real
+    __timezone = timezone('Europe/Zurich')
+    __lock: Lock = Lock()
+    __queue: Queue = None
+    __writer: Thread = None
+    # records discarded because the background writer fell behind
+    __dropped: int = 0
+    __dropped_lock: Lock = Lock()
 
     @classmethod
     def change_logfile(cls: Logger, name) -> None:
-        if cls.__logfile:
-            cls.__logfile.close()
-        cls.__logfile = open(file=name + '.log', mode='ab+')
+        with cls.__lock:
+            if cls.__logfile:
+                cls.__logfile.close()
+            cls.__logfile_name = name + '.log'
+            cls.__open_logfile()
+
+    @classmethod
+    def __open_logfile(cls: Logger) -> None:
+        cls.__logfile = open(file=cls.__logfile_name, mode='ab+')
+        cls.__logfile_opened = monotonic()
+
+    @staticmethod
+    def __compress(name: str) -> None:
+        with open(name, 'rb') as source, gzip.open(name + '.gz', 'wb') as target:
+            shutil.copyfileobj(source, target)
+        os.remove(name)
+
+    @classmethod
+    def __rotate(cls: Logger) -> None:
+        cls.__logfile.close()
+        # shift existing backups, the oldest one gets dropped
+        for index in range(cls.backup_count - 1, 0, -1):
+            for extension in ('', '.gz'):
+                source: str = '{}.{}{}'.format(cls.__logfile_name, index, extension)
+                if path.exists(source):
+                    os.replace(source, '{}.{}{}'.format(cls.__logfile_name, index + 1, extension))
+        rotated: str = '{}.1'.format(cls.__logfile_name)
+        if cls.backup_count > 0:
+            os.replace(cls.__logfile_name, rotated)
+            if cls.compress:
+                Logger.__compress(name=rotated)
+        else:
+            os.remove(cls.__logfile_name)
+        cls.__open_logfile()
+
+    @classmethod
+    def start_writer(cls: Logger) -> None:
+        # from now on messages are only enqueued by the callers and written in batches by a background thread
+        if cls.__writer is not None:
+            return
+        cls.__queue = Queue(maxsize=cls.batch_size * 64)
+        cls.__writer = Thread(target=cls.__run, name='Logger', daemon=True)
+        cls.__writer.start()
 
     @classmethod
     def shutdown(cls: Logger):
-        if cls.__logfile:
-            cls.__logfile.close()
+        if cls.__writer is not None:
+            # write remaining messages before closing the log file
+            cls.__queue.put(None)
+            cls.__writer.join(timeout=5)
+            cls.__writer = None
+            cls.__queue = None
+        with cls.__lock:
+            if cls.__logfile:
+                cls.__logfile.close()
+                cls.__logfile = None
+
+    @classmethod
+    def dropped(cls: Logger) -> int:
+        return cls.__dropped
+
+    @classmethod
+    def is_enabled(cls: Logger, severity: Severity) -> bool:
+        return severity.value >= cls.min_severity.value
 
     @classmethod
-    def __print(cls: Logger, message: str, severity: Severity = Severity.DEBUG, overwrite_class: str = None, overwrite_method: str = None) -> None:
-        # get calling class and method
+    def __print(cls: Logger, message: str, severity: Severity = Severity.DEBUG, overwrite_class: str = None, overwrite_method: str = None, fields: dict = None) -> None:
+        if severity.value < cls.min_severity.value:
+            return
+
+        # get calling class and method, the file name is only resolved when formatting
         caller = inspect.currentframe().f_back.f_back
         c_method = overwrite_method if overwrite_method else caller.f_code.co_name
-        c_class = overwrite_class if overwrite_class else path.splitext(path.basename(caller.f_code.co_filename))[0]
+        c_file = None if overwrite_class else caller.f_code.co_filename
+        record: tuple = (time().real, severity, overwrite_class, c_file, c_method, message, fields)
+
+        queue: Queue = cls.__queue
+        if queue is not None:
+            # callers never wait for the writer, records are dropped while its queue is full
+            try:
+                queue.put_nowait(record)
+            except Full:
+                with cls.__dropped_lock:
+                    cls.__dropped += 1
+        else:
+            cls.__write(records=[record])
+
+    @classmethod
+    def __format(cls: Logger, record: tuple) -> str:
+        now_t, severity, c_class, c_file, c_method, message, fields = record
+        if c_class is None:
+            c_class = path.splitext(path.basename(c_file))[0]
         if c_method == '<module>':
             c_method = None
 
         # get timestamps
-        now = datetime.now(tz=timezone('Europe/Zurich'))
-        now_t = time().real
+        now = datetime.fromtimestamp(now_t, tz=cls.__timezone)
+
+        if cls.output_format == Logger.Format.JSON:
+            # one JSON object per line, easily ingestible by log shippers
+            entry: dict = {
+                'time': now.isoformat(timespec='milliseconds'),
+                'uptime': ((now_t - cls.__init_time) * 1000).__trunc__(),
+                'severity': severity.name,
+                'source': '.'.join(filter(None, (c_class, c_method))),
+                'message': message.strip()
+            }
+            if fields:
+                entry.update(fields)
+            return json.dumps(entry, default=str)
+
+        if fields:
+            message = '{} ({})'.format(message.strip(), ', '.join('{}={}'.format(key, value) for key, value in fields.items()))
 
         # build log message respecting the IntelliJ Log Format: https://regex101.com/r/m2rrfp/1
-        msg = "{} [{}]   {} - {} - {}".format(
+        return "{} [{}]   {} - {} - {}".format(
             str(now.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]).ljust(23, ' '),
             str(((now_t - cls.__init_time) * 1000).__trunc__()).rjust(10, ' '),
             str(severity.name).ljust(5, ' '),
@@ -61,75 +183,114 @@ class Logger:
             message.strip()
         )
 
-        # check where to output the logged message
-        if cls.mode == Logger.Mode.BOTH or cls.mode == Logger.Mode.CONSOLE:
-            # log to console
-            if severity in (Logger.Severity.TRACE, Logger.Severity.DEBUG, Logger.Severity.INFO):
-                # to stdout
-                sys.__stdout__.write(msg + '\n')
-                sys.__stdout__.flush()
-            else:
-                # to stderr
-                sys.__stdout__.flush()
-                sys.__stderr__.write(msg + '\n')
+    @classmethod
+    def __write(cls: Logger, records: list[tuple]) -> None:
+        lines: list[tuple[Logger.Severity, str]] = [(record[1], cls.__format(record)) for record in records]
+        with cls.__lock:
+            # check where to output the logged messages
+            if cls.mode == Logger.Mode.BOTH or cls.mode == Logger.Mode.CONSOLE:
+                # log to console
+                for severity, msg in lines:
+                    if severity in (Logger.Severity.TRACE, Logger.Severity.DEBUG, Logger.Severity.INFO):
+                        # to stdout
+                        sys.__stdout__.write(msg + '\n')
+                    else:
+                        # to stderr
+                        sys.__stdout__.flush()
+                        sys.__stderr__.write(msg + '\n')
                 sys.__stdout__.flush()
-        if cls.mode == Logger.Mode.BOTH or cls.mode == Logger.Mode.FILE:
-            # log to file
-            if not cls.__logfile:
-                cls.__logfile = open(file='run.log', mode='ab+')
-            cls.__logfile.write((msg + chr(13) + chr(10)).encode('UTF-8'))
-            cls.__logfile.flush()
+                sys.__stderr__.flush()
+            if cls.mode == Logger.Mode.BOTH or cls.mode == Logger.Mode.FILE:
+                # log to file
+                if not cls.__logfile:
+                    cls.__open_logfile()
+                data: bytes = ''.join(msg + chr(13) + chr(10) for _, msg in lines).encode('UTF-8')
+                if (cls.max_bytes and cls.__logfile.tell() > 0 and cls.__logfile.tell() + len(data) > cls.max_bytes) or (cls.rotate_interval and monotonic() - cls.__logfile_opened >= cls.rotate_interval):
+                    cls.__rotate()
+                cls.__logfile.write(data)
+                cls.__logfile.flush()
+
+    @classmethod
+    def __run(cls: Logger) -> None:
+        queue: Queue = cls.__queue
+        batch: list[tuple] = []
+        deadline: float = monotonic() + cls.flush_interval
+        running: bool = True
+        while running:
+            try:
+                record: tuple = queue.get(timeout=max(0.0, deadline - monotonic()))
+                if record is None:
+                    running = False
+                else:
+                    batch.append(record)
+            except Empty:
+                pass
+            # flush when the batch is full, the interval elapsed or the logger shuts down
+            if batch and (len(batch) >= cls.batch_size or monotonic() >= deadline or not running):
+                try:
+                    cls.__write(records=batch)
+                except Exception:
+                    pass
+                batch = []
+            if monotonic() >= deadline:
+                deadline = monotonic() + cls.flush_interval
 
     @classmethod
-    def trace(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None) -> None:
+    def trace(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None, fields: dict = None) -> None:
         cls.__print(
             severity=Logger.Severity.TRACE,
             message=message,
             overwrite_class=overwrite_class,
-            overwrite_method=overwrite_method
+            overwrite_method=overwrite_method,
+            fields=fields
         )
 
     @classmethod
-    def debug(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None) -> None:
+    def debug(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None, fields: dict = None) -> None:
         cls.__print(
             severity=Logger.Severity.DEBUG,
             message=message,
             overwrite_class=overwrite_class,
-            overwrite_method=overwrite_method
+            overwrite_method=overwrite_method,
+            fields=fields
         )
 
     @classmethod
-    def info(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None) -> None:
+    def info(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None, fields: dict = None) -> None:
         cls.__print(
             severity=Logger.Severity.INFO,
             message=message,
             overwrite_class=overwrite_class,
-            overwrite_method=overwrite_method
+            overwrite_method=overwrite_method,
+            fields=fields
         )
 
     @classmethod
-    def warn(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None) -> None:
+    def warn(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None, fields: dict = None) -> None:
         cls.__print(
             severity=Logger.Severity.WARN,
             message=message,
             overwrite_class=overwrite_class,
-            overwrite_method=overwrite_method
+            overwrite_method=overwrite_method,
+            fields=fields
         )
 
     @classmethod
-    def error(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None) -> None:
+    def error(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None, fields: dict = None) -> None:
         cls.__print(
             severity=Logger.Severity.ERROR,
             message=message,
             overwrite_class=overwrite_class,
-            overwrite_method=overwrite_method
+            overwrite_method=overwrite_method,
+            fields=fields
         )
 
     @classmethod
-    def fatal(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None) -> None:
+    def fatal(cls: Logger, message: str, overwrite_class: str = None, overwrite_method: str = None, fields: dict = None) -> None:
         cls.__print(
             severity=Logger.Severity.FATAL,
             message=message,
             overwrite_class=overwrite_class,
-            overwrite_method=overwrite_method
+            overwrite_method=overwrite_method,
+            fields=fields
         )
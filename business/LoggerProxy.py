@@ -19,6 +19,9 @@ class LoggerProxy:
         return Logger.mode in (Logger.Mode.CONSOLE, Logger.Mode.BOTH)
 
     def write(self: LoggerProxy, message: str) -> None:
+        if not Logger.is_enabled(self.__severity if self.__severity in (Logger.Severity.TRACE, Logger.Severity.DEBUG, Logger.Severity.INFO) else Logger.Severity.FATAL):
+            # message would be dropped anyway, skip buffering and caller inspection
+            return
         if message.endswith('\n'):
             # remove newline character from message as it will be handled by the logger function
             self.__message_buffer.append(
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from threading import Lock
+from time import perf_counter
+from typing import Iterator
+
+
+class Metrics:
+    @dataclass
+    class Histogram:
+        buckets: tuple[float, ...] = field(default_factory=tuple)
+        counts: list[int] = field(default_factory=list)
+        sum: float = 0
+        count: int = 0
+
+        def observe(self: Metrics.Histogram, value: float) -> None:
+            self.counts[bisect_left(self.buckets, value)] += 1
+            self.sum += value
+            self.count += 1
+
+    # upper bounds in seconds used for latency histograms
+    buckets: tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    __lock: Lock = Lock()
+    __histograms: dict[str, dict[tuple, Histogram]] = {}
+    __counters: dict[str, dict[tuple, float]] = {}
+    __gauges: dict[str, dict[tuple, float]] = {}
+    __help: dict[str, str] = {}
+
+    def __init__(self: Metrics) -> None:
+        raise NotImplementedError("Instantiation of Metrics not allowed.")
+
+    @classmethod
+    def describe(cls: Metrics, name: str, description: str) -> None:
+        cls.__help[name] = description
+
+    @classmethod
+    def observe(cls: Metrics, name: str, value: float, **labels: str) -> None:
+        key: tuple = tuple(sorted(labels.items()))
+        with cls.__lock:
+            series: dict[tuple, Metrics.Histogram] = cls.__histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Metrics.Histogram(buckets=cls.buckets, counts=[0] * (len(cls.buckets) + 1))
+            series[key].observe(value)
+
+    @classmethod
+    def increment(cls: Metrics, name: str, value: float = 1, **labels: str) -> None:
+        key: tuple = tuple(sorted(labels.items()))
+        with cls.__lock:
+            series: dict[tuple, float] = cls.__counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    @classmethod
+    def set_counter(cls: Metrics, name: str, value: float, **labels: str) -> None:
+        # counters maintained elsewhere (e.g. by the caches) are exported as their current total
+        with cls.__lock:
+            cls.__counters.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    @classmethod
+    def set_gauge(cls: Metrics, name: str, value: float, **labels: str) -> None:
+        with cls.__lock:
+            cls.__gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = value
+
+    @classmethod
+    @contextmanager
+    def timer(cls: Metrics, stage: str) -> Iterator[None]:
+        started: float = perf_counter()
+        try:
+            yield
+        finally:
+            cls.observe('streamerinfo_stage_duration_seconds', perf_counter() - started, stage=stage)
+
+    @staticmethod
+    def __labels(key: tuple, extra: tuple = ()) -> str:
+        pairs: tuple = key + extra
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs) + '}'
+
+    @classmethod
+    def __header(cls: Metrics, lines: list[str], name: str, kind: str) -> None:
+        if name in cls.__help:
+            lines.append('# HELP {} {}'.format(name, cls.__help[name]))
+        lines.append('# TYPE {} {}'.format(name, kind))
+
+    @classmethod
+    def render(cls: Metrics) -> str:
+        # Prometheus text exposition format
+        lines: list[str] = []
+        with cls.__lock:
+            for kind, metrics in (('counter', cls.__counters), ('gauge', cls.__gauges)):
+                for name, series in sorted(metrics.items()):
+                    cls.__header(lines=lines, name=name, kind=kind)
+                    for key, value in sorted(series.items()):
+                        lines.append('{}{} {}'.format(name, Metrics.__labels(key), value))
+            for name, series in sorted(cls.__histograms.items()):
+                cls.__header(lines=lines, name=name, kind='histogram')
+                for key, histogram in sorted(series.items()):
+                    cumulative: int = 0
+                    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{} {}'.format(name, Metrics.__labels(key, (('le', '+Inf' if bound == float('inf') else bound),)), cumulative))
+                    lines.append('{}_sum{} {}'.format(name, Metrics.__labels(key), histogram.sum))
+                    lines.append('{}_count{} {}'.format(name, Metrics.__labels(key), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    @classmethod
+    def reset(cls: Metrics) -> None:
+        with cls.__lock:
+            cls.__histograms.clear()
+            cls.__counters.clear()
+            cls.__gauges.clear()
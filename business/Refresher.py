@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+from threading import Condition, Thread
+from time import monotonic
+from typing import Callable
+
+from business.Logger import Logger
+from data.IMCache import IMCache
+
+
+class Refresher:
+    # number of most requested channels which get re-fetched before they expire
+    top_n: int = 50
+    # seconds before expiry in which a popular channel gets re-fetched
+    ahead: float = 5
+    # seconds between two scans for expiring popular channels
+    interval: float = 1
+    # seconds after which the request counters are halved
+    decay: float = 60
+
+    __thread: Thread = None
+    __running: bool = False
+    __condition: Condition = Condition()
+    __pending: set[str] = set()
+    __popularity: dict[str, int] = {}
+    __refresh: Callable[[list[str]], object] = None
+
+    def __init__(self: Refresher) -> None:
+        raise NotImplementedError("Instantiation of Refresher not allowed.")
+
+    @classmethod
+    def start(cls: Refresher, refresh: Callable[[list[str]], object]) -> None:
+        with cls.__condition:
+            if cls.__running:
+                return
+            cls.__refresh = refresh
+            cls.__running = True
+        cls.__thread = Thread(target=cls.__run, name='Refresher', daemon=True)
+        cls.__thread.start()
+
+    @classmethod
+    def stop(cls: Refresher) -> None:
+        with cls.__condition:
+            cls.__running = False
+            cls.__condition.notify_all()
+        if cls.__thread:
+            cls.__thread.join(timeout=cls.interval * 2)
+            cls.__thread = None
+
+    @classmethod
+    def is_running(cls: Refresher) -> bool:
+        return cls.__running
+
+    @classmethod
+    def record(cls: Refresher, name: str) -> None:
+        with cls.__condition:
+            cls.__popularity[name] = cls.__popularity.get(name, 0) + 1
+
+    @classmethod
+    def schedule(cls: Refresher, name: str) -> None:
+        with cls.__condition:
+            if name not in cls.__pending:
+                cls.__pending.add(name)
+                cls.__condition.notify()
+
+    @classmethod
+    def popular(cls: Refresher) -> list[str]:
+        with cls.__condition:
+            ranking: list[tuple[str, int]] = sorted(cls.__popularity.items(), key=lambda item: item[1], reverse=True)
+        return [name for name, _ in ranking[:cls.top_n]]
+
+    @classmethod
+    def __collect(cls: Refresher) -> set[str]:
+        # popular channels which are about to expire
+        names: set[str] = set()
+        for name in cls.popular():
+            expires_in: float = IMCache.expires_in(name)
+            if expires_in is not None and expires_in <= cls.ahead:
+                names.add(name)
+        return names
+
+    @classmethod
+    def __decay(cls: Refresher) -> None:
+        with cls.__condition:
+            cls.__popularity = {name: count // 2 for name, count in cls.__popularity.items() if count // 2 > 0}
+
+    @classmethod
+    def __run(cls: Refresher) -> None:
+        Logger.debug(message="Background refresher started.")
+        last_scan: float = 0
+        last_decay: float = monotonic()
+        while True:
+            with cls.__condition:
+                if not cls.__pending and cls.__running:
+                    cls.__condition.wait(timeout=max(0.0, last_scan + cls.interval - monotonic()))
+                if not cls.__running:
+                    break
+                names: set[str] = cls.__pending
+                cls.__pending = set()
+            now: float = monotonic()
+            if now - last_scan >= cls.interval:
+                names |= cls.__collect()
+                last_scan = now
+            if now - last_decay >= cls.decay:
+                cls.__decay()
+                last_decay = now
+            if not names:
+                continue
+            try:
+                cls.__refresh(sorted(names))
+            except Exception as exc:
+                Logger.warn(message="Refreshing channels {} failed: {}".format(', '.join(sorted(names)), exc))
+        Logger.debug(message="Background refresher stopped.")
@@ -0,0 +1,246 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from threading import BoundedSemaphore
+from time import perf_counter
+from typing import Callable
+
+from PIL import Image
+
+from business.Encoder import Encoder
+from business.Metrics import Metrics
+from business.WidgetRenderer import WidgetRenderer
+from data.AssetRegistry import AssetRegistry
+from data.GlyphCache import GlyphCache
+from data.IMCache import IMCache
+
+
+class RenderPool:
+    class Overloaded(Exception):
+        pass
+
+    # number of render processes, 0 renders within the serving process
+    workers: int = 0
+    # number of render jobs which may wait for a free worker
+    max_queue: int = 64
+    # seconds a job waits for a free queue slot before it is rejected
+    queue_timeout: float = 1
+
+    __executor: ProcessPoolExecutor = None
+    __slots: BoundedSemaphore = None
+
+    def __init__(self: RenderPool) -> None:
+        raise NotImplementedError("Instantiation of RenderPool not allowed.")
+
+    @staticmethod
+    def initialize() -> None:
+        # preload static assets and glyphs once per worker process
+        AssetRegistry.load()
+        GlyphCache.load()
+
+    @staticmethod
+    def ready() -> None:
+        pass
+
+    @staticmethod
+    def __render(information: IMCache.ChannelInformation, avatar: Image, image_format: str, level: int, profile: str | None, version: str, now: datetime) -> tuple[bytes, dict[str, float]]:
+        # stage timings are returned to the caller, metrics recorded within a worker process would be lost
+        timings: dict[str, float] = {}
+        base: Image = WidgetRenderer.render(information=information, avatar=avatar, version=version, now=now, timings=timings)
+        started: float = perf_counter()
+        data: bytes = Encoder.encode(image=base, image_format=image_format, level=level, profile=profile)
+        timings['encode'] = perf_counter() - started
+        return data, timings
+
+    @staticmethod
+    def __draw(information: IMCache.ChannelInformation, avatar: Image, version: str, now: datetime) -> tuple[tuple[str, tuple[int, int], bytes], dict[str, float]]:
+        # unencoded widget for composing sprite sheets
+        timings: dict[str, float] = {}
+        image: Image = WidgetRenderer.render(information=information, avatar=avatar, version=version, now=now, timings=timings)
+        return (image.mode, image.size, image.tobytes()), timings
+
+    @staticmethod
+    def job(information: IMCache.ChannelInformation, avatar: tuple[str, tuple[int, int], bytes] | None, image_format: str, level: int, profile: str | None, version: str, now: datetime) -> tuple[bytes, dict[str, float]]:
+        image: Image = Image.frombytes(*avatar) if avatar else None
+        return RenderPool.__render(information=information, avatar=image, image_format=image_format, level=level, profile=profile, version=version, now=now)
+
+    @staticmethod
+    def draw_job(information: IMCache.ChannelInformation, avatar: tuple[str, tuple[int, int], bytes] | None, version: str, now: datetime) -> tuple[tuple[str, tuple[int, int], bytes], dict[str, float]]:
+        image: Image = Image.frombytes(*avatar) if avatar else None
+        return RenderPool.__draw(information=information, avatar=image, version=version, now=now)
+
+    @staticmethod
+    def __transferable(avatar: Image) -> tuple[str, tuple[int, int], bytes] | None:
+        # images are transferred as raw pixel data, which is cheaper to pickle than any encoded format
+        return (avatar.mode, avatar.size, avatar.tobytes()) if avatar else None
+
+    @staticmethod
+    def __record(image_format: str, result: tuple[bytes, dict[str, float]]) -> bytes:
+        data, timings = result
+        for stage, duration in timings.items():
+            Metrics.observe('streamerinfo_stage_duration_seconds', duration, stage=stage)
+        Metrics.increment('streamerinfo_encoded_bytes_total', len(data), format=image_format)
+        Metrics.increment('streamerinfo_encoded_images_total', format=image_format)
+        return data
+
+    @classmethod
+    def start(cls: RenderPool) -> None:
+        if cls.workers <= 0 or cls.__executor is not None:
+            return
+        # forked workers don't re-run the entry point, fall back to the platform default elsewhere
+        context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+        cls.__slots = BoundedSemaphore(cls.workers + cls.max_queue)
+        cls.__executor = ProcessPoolExecutor(max_workers=cls.workers, mp_context=context, initializer=RenderPool.initialize)
+        # workers are only forked on the first submission, fork them now rather than in the middle of a request while other threads hold locks
+        for future in [cls.__executor.submit(RenderPool.ready) for _ in range(cls.workers)]:
+            future.result()
+
+    @classmethod
+    def stop(cls: RenderPool) -> None:
+        if cls.__executor is not None:
+            cls.__executor.shutdown(wait=False, cancel_futures=True)
+            cls.__executor = None
+
+    @classmethod
+    def __submit(cls: RenderPool, function: Callable, arguments: tuple, blocking: bool = True) -> Future:
+        if not (cls.__slots.acquire(timeout=cls.queue_timeout) if blocking else cls.__slots.acquire(blocking=False)):
+            raise RenderPool.Overloaded("Render queue is full.")
+        try:
+            future: Future = cls.__executor.submit(function, *arguments)
+        except Exception:
+            cls.__slots.release()
+            raise
+        future.add_done_callback(lambda _: cls.__slots.release())
+        return future
+
+    @classmethod
+    def __submit_all(cls: RenderPool, function: Callable, arguments: list[tuple], blocking: bool = True) -> list[Future]:
+        # every job is queued before waiting for any of them, so the workers render a batch in parallel
+        futures: list[Future] = []
+        try:
+            for job_arguments in arguments:
+                futures.append(cls.__submit(function=function, arguments=job_arguments, blocking=blocking))
+        except RenderPool.Overloaded:
+            for future in futures:
+                future.cancel()
+            raise
+        return futures
+
+    @staticmethod
+    def __compose(results: list[tuple[tuple[str, tuple[int, int], bytes], dict[str, float]]], image_format: str, level: int, profile: str | None) -> tuple[bytes, list[tuple[int, int, int, int]]]:
+        # widgets are placed in a grid of equally sized cells and encoded once
+        timings: dict[str, float] = {}
+        for _, result_timings in results:
+            for stage, duration in result_timings.items():
+                timings[stage] = timings.get(stage, 0) + duration
+        width: int = max(raw[1][0] for raw, _ in results)
+        height: int = max(raw[1][1] for raw, _ in results)
+        columns: int = math.ceil(math.sqrt(len(results)))
+        sheet: Image = Image.new('RGBA', (width * columns, height * math.ceil(len(results) / columns)), (0, 0, 0, 0))
+        boxes: list[tuple[int, int, int, int]] = []
+        for index, (raw, _) in enumerate(results):
+            box: tuple[int, int, int, int] = ((index % columns) * width, (index // columns) * height, raw[1][0], raw[1][1])
+            sheet.paste(Image.frombytes(*raw), box[:2])
+            boxes.append(box)
+        started: float = perf_counter()
+        data: bytes = Encoder.encode(image=sheet, image_format=image_format, level=level, profile=profile)
+        timings['encode'] = perf_counter() - started
+        return RenderPool.__record(image_format=image_format, result=(data, timings)), boxes
+
+    @classmethod
+    def render(cls: RenderPool, information: IMCache.ChannelInformation, avatar: Image, image_format: str, level: int, version: str, now: datetime, profile: str | None = None) -> bytes:
+        if cls.__executor is None:
+            return RenderPool.__record(
+                image_format=image_format,
+                result=RenderPool.__render(information=information, avatar=avatar, image_format=image_format, level=level, profile=profile, version=version, now=now)
+            )
+        return RenderPool.__record(
+            image_format=image_format,
+            result=cls.__submit(
+                function=RenderPool.job,
+                arguments=(information, RenderPool.__transferable(avatar), image_format, level, profile, version, now)
+            ).result()
+        )
+
+    @classmethod
+    async def render_async(cls: RenderPool, information: IMCache.ChannelInformation, avatar: Image, image_format: str, level: int, version: str, now: datetime, profile: str | None = None) -> bytes:
+        if cls.__executor is None:
+            return await asyncio.get_running_loop().run_in_executor(
+                None,
+                lambda: cls.render(information=information, avatar=avatar, image_format=image_format, level=level, profile=profile, version=version, now=now)
+            )
+        # don't block the event loop while waiting for a free slot
+        return RenderPool.__record(
+            image_format=image_format,
+            result=await asyncio.wrap_future(cls.__submit(
+                function=RenderPool.job,
+                arguments=(information, RenderPool.__transferable(avatar), image_format, level, profile, version, now),
+                blocking=False
+            ))
+        )
+
+    @classmethod
+    def render_many(cls: RenderPool, widgets: list[tuple[IMCache.ChannelInformation, Image]], image_format: str, level: int, version: str, now: datetime, profile: str | None = None) -> list[bytes]:
+        if cls.__executor is None:
+            return [
+                cls.render(information=information, avatar=avatar, image_format=image_format, level=level, profile=profile, version=version, now=now)
+                for information, avatar in widgets
+            ]
+        futures: list[Future] = cls.__submit_all(
+            function=RenderPool.job,
+            arguments=[(information, RenderPool.__transferable(avatar), image_format, level, profile, version, now) for information, avatar in widgets]
+        )
+        return [RenderPool.__record(image_format=image_format, result=future.result()) for future in futures]
+
+    @classmethod
+    async def render_many_async(cls: RenderPool, widgets: list[tuple[IMCache.ChannelInformation, Image]], image_format: str, level: int, version: str, now: datetime, profile: str | None = None) -> list[bytes]:
+        if cls.__executor is None:
+            # rendered by the threads of the default executor
+            return list(await asyncio.gather(*(
+                cls.render_async(information=information, avatar=avatar, image_format=image_format, level=level, profile=profile, version=version, now=now)
+                for information, avatar in widgets
+            )))
+        futures: list[Future] = cls.__submit_all(
+            function=RenderPool.job,
+            arguments=[(information, RenderPool.__transferable(avatar), image_format, level, profile, version, now) for information, avatar in widgets],
+            blocking=False
+        )
+        return [RenderPool.__record(image_format=image_format, result=result) for result in await asyncio.gather(*(asyncio.wrap_future(future) for future in futures))]
+
+    @classmethod
+    def sprite(cls: RenderPool, widgets: list[tuple[IMCache.ChannelInformation, Image]], image_format: str, level: int, version: str, now: datetime, profile: str | None = None) -> tuple[bytes, list[tuple[int, int, int, int]]]:
+        # returns the encoded sheet together with the box (x, y, width, height) of every widget
+        if cls.__executor is None:
+            results: list = [RenderPool.__draw(information=information, avatar=avatar, version=version, now=now) for information, avatar in widgets]
+        else:
+            results = [
+                future.result() for future in cls.__submit_all(
+                    function=RenderPool.draw_job,
+                    arguments=[(information, RenderPool.__transferable(avatar), version, now) for information, avatar in widgets]
+                )
+            ]
+        return RenderPool.__compose(results=results, image_format=image_format, level=level, profile=profile)
+
+    @classmethod
+    async def sprite_async(cls: RenderPool, widgets: list[tuple[IMCache.ChannelInformation, Image]], image_format: str, level: int, version: str, now: datetime, profile: str | None = None) -> tuple[bytes, list[tuple[int, int, int, int]]]:
+        loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+        if cls.__executor is None:
+            return await loop.run_in_executor(
+                None,
+                lambda: cls.sprite(widgets=widgets, image_format=image_format, level=level, profile=profile, version=version, now=now)
+            )
+        futures: list[Future] = cls.__submit_all(
+            function=RenderPool.draw_job,
+            arguments=[(information, RenderPool.__transferable(avatar), version, now) for information, avatar in widgets],
+            blocking=False
+        )
+        results: list = list(await asyncio.gather(*(asyncio.wrap_future(future) for future in futures)))
+        # the sheet is composed and encoded off the event loop
+        return await loop.run_in_executor(
+            None,
+            lambda: RenderPool.__compose(results=results, image_format=image_format, level=level, profile=profile)
+        )
@@ -1,25 +1,66 @@
 from __future__ import annotations
 
 import falcon
+import falcon.asgi
 from falcon import App
 
+from business.AsyncTwitchGrabber import AsyncTwitchGrabber
+from presentation.AdmissionControl import AdmissionControl
 from presentation.Overview import Overview
+from presentation.Prometheus import Prometheus
+from presentation.StaticFile import StaticFile
+from presentation.TwitchBatch import TwitchBatch
+from presentation.TwitchSubscription import TwitchSubscription
 from presentation.TwitchWidget import TwitchWidget
 
 
 class Router(App):
-    def __init__(self: Router, version: str) -> None:
+    class Lifespan:
+        async def process_shutdown(self: Router.Lifespan, scope: dict, event: dict) -> None:
+            # close pooled upstream connections of the event loop
+            await AsyncTwitchGrabber.close()
+
+    def __init__(self: Router, version: str, asynchronous: bool = False) -> None:
         super().__init__()
-        self.resources: App = falcon.App()
+        # asynchronous mode serves requests from an event loop using the *_async responders
+        suffix: str | None = 'async' if asynchronous else None
+        # admission control limits the work single clients and bursts cause before any resource is involved
+        self.resources: App | falcon.asgi.App = falcon.asgi.App(middleware=[Router.Lifespan(), AdmissionControl()]) if asynchronous else falcon.App(middleware=[AdmissionControl()])
         self.resources.add_route(
             uri_template='/',
-            resource=Overview()
+            resource=Overview(),
+            suffix=suffix
+        )
+        # static routes take precedence over the channel template
+        for uri_template, name in (('/favicon.ico', 'logo.ico'), ('/logo.ico', 'logo.ico'), ('/logo_icon.png', 'logo_icon.png')):
+            self.resources.add_route(
+                uri_template=uri_template,
+                resource=StaticFile(name=name),
+                suffix=suffix
+            )
+        self.resources.add_route(
+            uri_template='/metrics',
+            resource=Prometheus(),
+            suffix=suffix
+        )
+        self.resources.add_route(
+            uri_template='/batch/{output}',
+            resource=TwitchBatch(version=version),
+            suffix=suffix
         )
+        if asynchronous:
+            # push updates need long-lived connections, which only the event loop serves cheaply
+            self.resources.add_route(
+                uri_template='/subscribe/{channels}',
+                resource=TwitchSubscription(version=version),
+                suffix=suffix
+            )
         self.resources.add_route(
             uri_template='/{channel}',
             resource=TwitchWidget(version=version),
-            compile=True
+            compile=True,
+            suffix=suffix
         )
 
-    def get_resources(self: Router) -> App:
+    def get_resources(self: Router) -> App | falcon.asgi.App:
         return self.resources
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from threading import Event, Lock
+from typing import Any, Awaitable, Callable
+
+
+class SingleFlight:
+    @dataclass
+    class Call:
+        event: Event = field(default_factory=Event)
+        result: Any = None
+
+    def __init__(self: SingleFlight) -> None:
+        self.__calls: dict[str, SingleFlight.Call] = {}
+        self.__lock: Lock = Lock()
+
+    def do(self: SingleFlight, key: str, function: Callable[[], Any], timeout: float = None, fallback: Any = False) -> Any:
+        with self.__lock:
+            call: SingleFlight.Call = self.__calls.get(key)
+            leader: bool = call is None
+            if leader:
+                call = SingleFlight.Call()
+                self.__calls[key] = call
+        if not leader:
+            # another caller is already fetching this key, wait for its result
+            if call.event.wait(timeout=timeout):
+                return call.result
+            return fallback
+        call.result = fallback
+        try:
+            call.result = function()
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.event.set()
+        return call.result
+
+    def in_flight(self: SingleFlight) -> int:
+        return len(self.__calls)
+
+
+class AsyncSingleFlight:
+    def __init__(self: AsyncSingleFlight) -> None:
+        self.__calls: dict[str, asyncio.Future] = {}
+
+    async def do(self: AsyncSingleFlight, key: str, function: Callable[[], Awaitable[Any]], timeout: float = None, fallback: Any = False) -> Any:
+        call: asyncio.Future = self.__calls.get(key)
+        if call is not None:
+            # another coroutine is already fetching this key, wait for its result
+            try:
+                return await asyncio.wait_for(asyncio.shield(call), timeout=timeout)
+            except asyncio.TimeoutError:
+                return fallback
+        call = asyncio.get_running_loop().create_future()
+        self.__calls[key] = call
+        result: Any = fallback
+        try:
+            result = await function()
+        finally:
+            del self.__calls[key]
+            call.set_result(result)
+        return result
+
+    def in_flight(self: AsyncSingleFlight) -> int:
+        return len(self.__calls)
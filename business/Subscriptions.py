@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import base64
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from business.ChannelProvider import ChannelProvider
+from business.Logger import Logger
+from business.Metrics import Metrics
+from business.RenderPool import RenderPool
+from business.WidgetRenderer import WidgetRenderer
+from data.IMCache import IMCache
+from data.RenderCache import RenderCache
+
+
+class Subscriptions:
+    @dataclass(eq=False)
+    class Subscriber:
+        # image subscribers receive the rendered widget, the others the changed channel information
+        image_format: str | None = None
+        content_type: str | None = None
+        level: int = 9
+        profile: str | None = None
+        version: str = ''
+        queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=Subscriptions.max_queue))
+        # last state sent per channel, None if the channel was reported as not existing
+        sent: dict[str, dict | None] = field(default_factory=dict)
+
+        def push(self: Subscriptions.Subscriber, message: dict) -> None:
+            try:
+                self.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # slow consumer, queued deltas are dropped and the complete state is sent again on the next check
+                while not self.queue.empty():
+                    self.queue.get_nowait()
+                self.sent.clear()
+
+    @dataclass
+    class Channel:
+        subscribers: set[Subscriptions.Subscriber] = field(default_factory=set)
+        wake: asyncio.Event = field(default_factory=asyncio.Event)
+        task: asyncio.Task | None = None
+
+    # seconds between two checks of a subscribed channel, shared by all of its subscribers
+    interval: float = 5
+    # messages queued per subscriber before it gets resynchronized
+    max_queue: int = 16
+    # maximum number of channels per subscription
+    max_channels: int = 50
+
+    __channels: dict[str, Subscriptions.Channel] = {}
+
+    def __init__(self: Subscriptions) -> None:
+        raise NotImplementedError("Instantiation of Subscriptions not allowed.")
+
+    @staticmethod
+    def __state(information: IMCache.ChannelInformation) -> dict:
+        # displayed data, the refresh timestamp changes without anything visible changing
+        state: dict = information.to_dict()
+        del state['timestamp']
+        return state
+
+    @staticmethod
+    async def __image(information: IMCache.ChannelInformation, subscriber: Subscriptions.Subscriber) -> bytes:
+        # shares the render cache with the widget route
+        now: datetime = WidgetRenderer.timestamp()
+        key: tuple = RenderCache.key(
+            channel=information.name,
+            fingerprint=information.fingerprint(),
+            image_format=subscriber.image_format,
+            level=subscriber.level,
+            bucket=int(now.timestamp()),
+            profile=subscriber.profile
+        )
+        rendered_image: bytes | bool = RenderCache.get(key)
+        if not rendered_image:
+            rendered_image = await RenderPool.render_async(
+                information=information,
+                avatar=await ChannelProvider.avatar_async(information.avatar_uri),
+                image_format=subscriber.image_format,
+                level=subscriber.level,
+                profile=subscriber.profile,
+                version=subscriber.version,
+                now=now
+            )
+            RenderCache.store(key=key, value=rendered_image)
+        return rendered_image
+
+    @classmethod
+    async def __publish(cls: Subscriptions, name: str, channel: Subscriptions.Channel, information: IMCache.ChannelInformation | bool) -> None:
+        if not information and not await IMCache.offload(IMCache.is_missing, name):
+            # upstream failed without any data to fall back to, keep the subscribers' state
+            return
+        state: dict | None = Subscriptions.__state(information) if information else None
+        # every variant is rendered once per change, no matter how many subscribers receive it
+        rendered: dict[tuple, bytes] = {}
+        for subscriber in list(channel.subscribers):
+            if name in subscriber.sent and subscriber.sent[name] == state:
+                continue
+            message: dict = {'channel': name}
+            if state is None:
+                message['error'] = 'not_found'
+            elif subscriber.image_format is None:
+                previous: dict = subscriber.sent.get(name) or {}
+                message['stats'] = {key: value for key, value in state.items() if key not in previous or previous[key] != value}
+            else:
+                variant: tuple = (subscriber.image_format, subscriber.level, subscriber.profile, subscriber.version)
+                if variant not in rendered:
+                    try:
+                        rendered[variant] = await Subscriptions.__image(information=information, subscriber=subscriber)
+                    except RenderPool.Overloaded:
+                        # retried on the next check
+                        continue
+                message['content_type'] = subscriber.content_type
+                message['image'] = base64.b64encode(rendered[variant]).decode('ascii')
+            subscriber.sent[name] = state
+            subscriber.push(message)
+            Metrics.increment('streamerinfo_subscription_messages_total', kind='image' if 'image' in message else 'stats')
+
+    @classmethod
+    async def __watch(cls: Subscriptions, name: str, channel: Subscriptions.Channel) -> None:
+        # one loop per channel, woken up early when a subscriber joins
+        while channel.subscribers:
+            channel.wake.clear()
+            try:
+                await Subscriptions.__publish(name=name, channel=channel, information=await ChannelProvider.channel_async(name))
+            except Exception as exc:
+                Logger.warn(message="Publishing channel {} to subscribers failed: {}".format(name, exc))
+            try:
+                await asyncio.wait_for(channel.wake.wait(), timeout=cls.interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @classmethod
+    def subscribe(cls: Subscriptions, names: list[str], subscriber: Subscriptions.Subscriber) -> None:
+        for name in names:
+            channel: Subscriptions.Channel = cls.__channels.setdefault(name, Subscriptions.Channel())
+            channel.subscribers.add(subscriber)
+            channel.wake.set()
+            if channel.task is None or channel.task.done():
+                channel.task = asyncio.get_running_loop().create_task(cls.__watch(name=name, channel=channel))
+
+    @classmethod
+    def unsubscribe(cls: Subscriptions, names: list[str], subscriber: Subscriptions.Subscriber) -> None:
+        for name in names:
+            channel: Subscriptions.Channel | None = cls.__channels.get(name)
+            if not channel:
+                continue
+            channel.subscribers.discard(subscriber)
+            if not channel.subscribers:
+                # last subscriber left, stop checking the channel
+                if channel.task:
+                    channel.task.cancel()
+                del cls.__channels[name]
+
+    @classmethod
+    def stats(cls: Subscriptions) -> dict[str, int]:
+        return {
+            'channels': len(cls.__channels),
+            'subscriptions': sum(len(channel.subscribers) for channel in cls.__channels.values())
+        }
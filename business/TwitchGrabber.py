@@ -2,15 +2,18 @@ from __future__ import annotations
 
 import io
 from datetime import datetime
-from io import BytesIO
 
-import requests
+from PIL import Image
 from dateutil import parser
 from dateutil.parser import ParserError
 from dateutil.tz import UTC
 from requests import Response, HTTPError
 
+from business.HttpPool import HttpPool
 from business.Logger import Logger
+from business.Metrics import Metrics
+from business.UpstreamGuard import UpstreamGuard
+from data.AvatarCache import AvatarCache
 from data.IMCache import IMCache
 
 
@@ -18,6 +21,8 @@ class TwitchGrabber:
     # check https://gist.github.com/TwitchToken/bf056f46456f97c0f6b21d0e438a00f3 for latest GraphQL client-id
     __key: str = 'r8s4dac0uhzifbpu9sjdiwzctle17ff'
     __uri: str = 'https://gql.twitch.tv/gql'
+    # maximum number of channels requested within one GQL query
+    batch_size: int = 25
 
     @staticmethod
     def __parse_date(date_string: str) -> datetime | bool:
@@ -27,78 +32,182 @@ class TwitchGrabber:
         except ParserError:
             return False
 
+    @staticmethod
+    def __build_query(count: int) -> str:
+        # every channel gets its own aliased user query, so a whole batch is answered in one round trip
+        return '''
+            query ChannelAboutPage_Query({}) {{
+              {}
+            }}
+            fragment ChannelAboutPage_Channel on User {{
+              id
+              login
+              displayName
+              profileImageURL(width: 50)
+              followers {{
+                totalCount
+              }}
+              lastBroadcast {{
+                startedAt
+              }}
+              stream {{
+                viewersCount
+              }}
+              roles {{
+                isPartner
+              }}
+            }}
+            '''.format(
+            ', '.join('$login{}: String!'.format(index) for index in range(count)),
+            ' '.join('channel{0}: user(login: $login{0}) {{ ...ChannelAboutPage_Channel }}'.format(index) for index in range(count))
+        )
+
+    @staticmethod
+    def __parse_channel(channel: dict) -> IMCache.ChannelInformation:
+        started_at: datetime = None
+        if channel['lastBroadcast'] and channel['lastBroadcast']['startedAt']:
+            started_at = TwitchGrabber.__parse_date(date_string=channel['lastBroadcast']['startedAt'])
+        return IMCache.ChannelInformation(
+            name=channel['login'],
+            displayed_name=channel['displayName'],
+            is_partnered=channel['roles']['isPartner'],
+            avatar_uri=channel['profileImageURL'],
+            live_count=channel['stream']['viewersCount'] if channel['stream'] is not None else None,
+            follower_count=channel['followers']['totalCount'],
+            latest_stream=started_at if started_at is not False else None,
+            timestamp=datetime.now()
+        )
+
+    @classmethod
+    def grab(cls: TwitchGrabber, channel_name: str) -> IMCache.ChannelInformation | bool | None:
+        return cls.grab_many(channel_names=[channel_name])[channel_name]
+
+    @classmethod
+    def grab_many(cls: TwitchGrabber, channel_names: list[str]) -> dict[str, IMCache.ChannelInformation | bool | None]:
+        # channels which don't exist are returned as None, failed ones as False
+        results: dict[str, IMCache.ChannelInformation | bool | None] = {}
+        for offset in range(0, len(channel_names), cls.batch_size):
+            results.update(cls.__grab_batch(channel_names=channel_names[offset:offset + cls.batch_size]))
+        return results
+
     @classmethod
-    def grab(cls: TwitchGrabber, channel_name: str) -> IMCache.ChannelInformation | bool:
-        payload: dict = {
-            'query': '''
-                query ChannelAboutPage_Query($login: String!) {
-                  channel: user(login: $login) {
-                    id
-                    login
-                    displayName
-                    profileImageURL(width: 50)
-                    followers {
-                      totalCount
-                    }
-                    lastBroadcast {
-                      startedAt
-                    }
-                    stream {
-                      viewersCount
-                    }
-                    roles {
-                      isPartner
-                    }
-                  }
-                }
-                ''',
-            'variables': {
-                'login': channel_name
-            }
+    def payload(cls: TwitchGrabber, channel_names: list[str]) -> dict:
+        return {
+            'query': TwitchGrabber.__build_query(count=len(channel_names)),
+            'variables': {'login{}'.format(index): name for index, name in enumerate(channel_names)}
         }
-        headers: dict = {
+
+    @classmethod
+    def headers(cls: TwitchGrabber) -> dict:
+        return {
             'Client-ID': cls.__key,
             'Content-Type': 'application/json',
             'Accept': 'application/json',
             'User-Agent': None
         }
+
+    @classmethod
+    def uri(cls: TwitchGrabber) -> str:
+        return cls.__uri
+
+    @classmethod
+    def change_uri(cls: TwitchGrabber, uri: str) -> None:
+        # used to point the grabber at a local stand-in of the GQL endpoint
+        cls.__uri = uri
+
+    @classmethod
+    def parse(cls: TwitchGrabber, channel_names: list[str], status_code: int, content: bytes, data: dict) -> dict[str, IMCache.ChannelInformation | bool | None]:
+        results: dict[str, IMCache.ChannelInformation | bool | None] = dict.fromkeys(channel_names, False)
+        if not status_code == 200:
+            Logger.warn(message="Requesting Twitch GQL Data went wrong: {}".format(content))
+            Metrics.increment('streamerinfo_upstream_errors_total', upstream='gql')
+            return results
+        if not data.get('data'):
+            Logger.warn(message="Twitch GQL answered with an unsupported format: {}".format(data))
+            Metrics.increment('streamerinfo_upstream_errors_total', upstream='gql')
+            return results
+        for index, name in enumerate(channel_names):
+            alias: str = 'channel{}'.format(index)
+            if alias not in data['data']:
+                continue
+            if data['data'][alias]:
+                results[name] = TwitchGrabber.__parse_channel(channel=data['data'][alias])
+            elif not data.get('errors'):
+                # channel doesn't exist
+                results[name] = None
+        return results
+
+    @classmethod
+    def __grab_batch(cls: TwitchGrabber, channel_names: list[str]) -> dict[str, IMCache.ChannelInformation | bool | None]:
         try:
-            res: Response = requests.request('POST', cls.__uri, json=payload, headers=headers, timeout=10)
-            if not res.status_code == 200:
-                Logger.warn(message="Requesting Twitch GQL Data went wrong: {}".format(res.content))
-                return False
-            data: dict = res.json()
-            if data['data'] and data['data']['channel']:
-                channel: dict = data['data']['channel']
-                started_at: datetime = None
-                if channel['lastBroadcast']['startedAt']:
-                    started_at = TwitchGrabber.__parse_date(date_string=channel['lastBroadcast']['startedAt'])
-                return IMCache.ChannelInformation(
-                    name=channel['login'],
-                    displayed_name=channel['displayName'],
-                    is_partnered=channel['roles']['isPartner'],
-                    avatar_uri=channel['profileImageURL'],
-                    live_count=channel['stream']['viewersCount'] if channel['stream'] is not None else None,
-                    follower_count=channel['followers']['totalCount'],
-                    latest_stream=started_at if started_at is not False else None,
-                    timestamp=datetime.now()
-                )
-            else:
-                Logger.warn(message="Twitch GQL answered with an unsupported format: {}".format(data))
+            with Metrics.timer(stage='upstream_gql'):
+                res: Response = HttpPool.request('POST', cls.__uri, json=cls.payload(channel_names=channel_names), headers=cls.headers())
+            return cls.parse(
+                channel_names=channel_names,
+                status_code=res.status_code,
+                content=res.content,
+                data=res.json() if res.status_code == 200 else {}
+            )
+        except UpstreamGuard.Rejected as rejected:
+            Logger.debug(message="Request to Twitch GQL skipped: {}".format(rejected))
+            return dict.fromkeys(channel_names, False)
         except HTTPError as err:
             Logger.warn(message="Request to Twitch GQL couldn't be established: {}".format(err))
         except Exception as exc:
             Logger.warn(message="An exception occurred while trying to parse Twitch GQL data: {}".format(exc))
-        return False
-    @classmethod
-    def grab_avatar(cls: TwitchGrabber, url: str) -> BytesIO | bool:
+        Metrics.increment('streamerinfo_upstream_errors_total', upstream='gql')
+        return dict.fromkeys(channel_names, False)
+
+    @staticmethod
+    def avatar_headers(cached: AvatarCache.AvatarInformation = None) -> dict:
         headers: dict = {
             'User-Agent': None
         }
+        if cached:
+            # revalidate the cached avatar instead of downloading it again
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+        return headers
+
+    @staticmethod
+    def parse_avatar(url: str, status_code: int, headers: dict, content: bytes, cached: AvatarCache.AvatarInformation = None) -> AvatarCache.AvatarInformation | bool:
+        if status_code == 304 and cached:
+            return AvatarCache.AvatarInformation(
+                uri=url,
+                image=cached.image,
+                etag=headers.get('ETag', cached.etag),
+                last_modified=headers.get('Last-Modified', cached.last_modified),
+                timestamp=datetime.now()
+            )
+        if not status_code == 200:
+            Logger.warn(message="Failed getting avatar: {}".format(content))
+            Metrics.increment('streamerinfo_upstream_errors_total', upstream='avatar')
+            return False
+        image: Image = Image.open(io.BytesIO(initial_bytes=content)).convert('RGBA')
+        if image.size != AvatarCache.avatar_size:
+            image = image.resize(AvatarCache.avatar_size, Image.Resampling.LANCZOS)
+        return AvatarCache.AvatarInformation(
+            uri=url,
+            image=image,
+            etag=headers.get('ETag'),
+            last_modified=headers.get('Last-Modified'),
+            timestamp=datetime.now()
+        )
+
+    @classmethod
+    def grab_avatar(cls: TwitchGrabber, url: str, cached: AvatarCache.AvatarInformation = None) -> AvatarCache.AvatarInformation | bool:
         try:
-            res: Response = requests.request('GET', url, json=None, data=None, headers=headers, timeout=5)
-            if not res.status_code == 200:
-                Logger.warn(message="Failed getting avatar: {}".format(res.content))
-            return io.BytesIO(initial_bytes=res.content)
-        except HTTPError as err:
+            with Metrics.timer(stage='upstream_avatar'):
+                res: Response = HttpPool.request('GET', url, read_timeout=5, headers=cls.avatar_headers(cached=cached))
+            return cls.parse_avatar(url=url, status_code=res.status_code, headers=res.headers, content=res.content, cached=cached)
+        except UpstreamGuard.Rejected as rejected:
+            Logger.debug(message="Request for avatar skipped: {}".format(rejected))
             return False
+        except HTTPError as err:
+            Logger.warn(message="Request for avatar couldn't be established: {}".format(err))
+        except Exception as exc:
+            Logger.warn(message="An exception occurred while trying to load avatar: {}".format(exc))
+        Metrics.increment('streamerinfo_upstream_errors_total', upstream='avatar')
+        return False
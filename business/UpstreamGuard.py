@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass, field
+from threading import Condition
+from time import monotonic
+from urllib.parse import urlsplit
+
+from business.Logger import Logger
+
+
+class UpstreamGuard:
+    class Rejected(Exception):
+        pass
+
+    @dataclass
+    class Host:
+        # closed passes calls, open rejects them and half-open lets a single probe through
+        state: str = 'closed'
+        failures: int = 0
+        opened: float = field(default_factory=float)
+        probing: bool = False
+        # adaptive number of concurrent calls, raised additively on success and lowered multiplicatively on failure
+        limit: float = 0
+        in_flight: int = 0
+        rejected: dict[str, int] = field(default_factory=lambda: {'open': 0, 'limit': 0})
+
+    # consecutive failures which open the circuit of a host
+    failure_threshold: int = 5
+    # seconds the circuit stays open before a probe is let through
+    open_timeout: float = 10
+    # bounds and start of the concurrency limit per host
+    min_limit: int = 1
+    max_limit: int = 64
+    initial_limit: int = 16
+    # calls slower than this many seconds lower the limit like failures, without counting towards opening the circuit
+    latency_target: float = 2
+    backoff: float = 0.5
+    # seconds a call waits for a free slot before it is rejected
+    wait_timeout: float = 1
+    # seconds between two checks for a free slot of asynchronous callers
+    poll_interval: float = 0.01
+
+    __condition: Condition = Condition()
+    __hosts: dict[str, UpstreamGuard.Host] = {}
+
+    def __init__(self: UpstreamGuard) -> None:
+        raise NotImplementedError("Instantiation of UpstreamGuard not allowed.")
+
+    @staticmethod
+    def host(url: str) -> str:
+        parts = urlsplit(url)
+        return '{}://{}'.format(parts.scheme, parts.netloc)
+
+    @classmethod
+    def __host(cls: UpstreamGuard, name: str) -> UpstreamGuard.Host:
+        if name not in cls.__hosts:
+            cls.__hosts[name] = UpstreamGuard.Host(limit=cls.initial_limit)
+        return cls.__hosts[name]
+
+    @classmethod
+    def __admit(cls: UpstreamGuard, name: str) -> bool | None:
+        # True if the call may proceed, None if it has to wait for a free slot and False if the circuit rejects it
+        host: UpstreamGuard.Host = cls.__host(name)
+        if host.state == 'open':
+            if monotonic() - host.opened < cls.open_timeout:
+                host.rejected['open'] += 1
+                return False
+            host.state = 'half_open'
+            Logger.info(message="Circuit of {} is half-open, probing.".format(name))
+        if host.state == 'half_open':
+            if host.probing:
+                host.rejected['open'] += 1
+                return False
+            host.probing = True
+        elif host.in_flight >= int(host.limit):
+            return None
+        host.in_flight += 1
+        return True
+
+    @classmethod
+    def acquire(cls: UpstreamGuard, url: str) -> None:
+        name: str = UpstreamGuard.host(url)
+        deadline: float = monotonic() + cls.wait_timeout
+        with cls.__condition:
+            admitted: bool | None = cls.__admit(name)
+            while admitted is None and monotonic() < deadline:
+                cls.__condition.wait(timeout=deadline - monotonic())
+                admitted = cls.__admit(name)
+            UpstreamGuard.__reject(name=name, admitted=admitted)
+
+    @classmethod
+    async def acquire_async(cls: UpstreamGuard, url: str) -> None:
+        name: str = UpstreamGuard.host(url)
+        deadline: float = monotonic() + cls.wait_timeout
+        with cls.__condition:
+            admitted: bool | None = cls.__admit(name)
+        while admitted is None and monotonic() < deadline:
+            # don't block the event loop while waiting for a free slot
+            await asyncio.sleep(cls.poll_interval)
+            with cls.__condition:
+                admitted = cls.__admit(name)
+        with cls.__condition:
+            UpstreamGuard.__reject(name=name, admitted=admitted)
+
+    @classmethod
+    def __reject(cls: UpstreamGuard, name: str, admitted: bool | None) -> None:
+        if admitted:
+            return
+        if admitted is None:
+            cls.__host(name).rejected['limit'] += 1
+            raise UpstreamGuard.Rejected("Concurrency limit of {} reached.".format(name))
+        raise UpstreamGuard.Rejected("Circuit of {} is open.".format(name))
+
+    @classmethod
+    def release(cls: UpstreamGuard, url: str, success: bool | None, duration: float) -> None:
+        # None if the call was abandoned before its outcome was known, it neither counts as success nor as failure
+        name: str = UpstreamGuard.host(url)
+        with cls.__condition:
+            host: UpstreamGuard.Host = cls.__host(name)
+            host.in_flight -= 1
+            if success is None:
+                # a half-open circuit lets the next call probe the host instead
+                host.probing = False
+                cls.__condition.notify_all()
+                return
+            if host.state == 'half_open':
+                host.probing = False
+                if success:
+                    host.state = 'closed'
+                    host.failures = 0
+                    Logger.info(message="Circuit of {} closed.".format(name))
+                else:
+                    UpstreamGuard.__open(name=name, host=host)
+            elif success:
+                host.failures = 0
+            else:
+                host.failures += 1
+                if host.failures >= cls.failure_threshold:
+                    UpstreamGuard.__open(name=name, host=host)
+            if success and duration < cls.latency_target:
+                # raised only while the limit is actually used, an idle host would otherwise grow it without bound
+                if host.in_flight + 1 >= host.limit / 2:
+                    host.limit = min(cls.max_limit, host.limit + 1 / host.limit)
+            else:
+                host.limit = max(cls.min_limit, host.limit * cls.backoff)
+            cls.__condition.notify_all()
+
+    @classmethod
+    def __open(cls: UpstreamGuard, name: str, host: UpstreamGuard.Host) -> None:
+        if host.state != 'open':
+            Logger.warn(message="Circuit of {} opened, calls are rejected for {} seconds.".format(name, cls.open_timeout))
+        host.state = 'open'
+        host.opened = monotonic()
+        host.failures = 0
+
+    @classmethod
+    def is_open(cls: UpstreamGuard, url: str) -> bool:
+        # tells whether calls to the host of the url are currently rejected
+        with cls.__condition:
+            host: UpstreamGuard.Host | None = cls.__hosts.get(UpstreamGuard.host(url))
+            return bool(host) and host.state == 'open' and monotonic() - host.opened < cls.open_timeout
+
+    @classmethod
+    def stats(cls: UpstreamGuard) -> dict[str, dict]:
+        with cls.__condition:
+            return {
+                name: {
+                    'state': host.state,
+                    'limit': int(host.limit),
+                    'in_flight': host.in_flight,
+                    'rejected': dict(host.rejected)
+                }
+                for name, host in cls.__hosts.items()
+            }
+
+    @classmethod
+    def reset(cls: UpstreamGuard) -> None:
+        with cls.__condition:
+            cls.__hosts.clear()
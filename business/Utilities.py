@@ -12,3 +12,26 @@ class Utilities:
         else:
             # uncompiled version
             return Path(__file__).parent.parent.joinpath(path)
+
+    @staticmethod
+    def accepted(header: str | None) -> dict[str, float]:
+        # media ranges or codings of an Accept or Accept-Encoding header with their quality values
+        accepted: dict[str, float] = {}
+        for value in (header or '').split(','):
+            name, *parameters = value.strip().lower().split(';')
+            quality: float = 1.0
+            for parameter in parameters:
+                key, _, number = parameter.strip().partition('=')
+                if key == 'q':
+                    try:
+                        quality = float(number)
+                    except ValueError:
+                        quality = 0.0
+            if name.strip():
+                accepted[name.strip()] = max(quality, accepted.get(name.strip(), 0.0))
+        return accepted
+
+    @staticmethod
+    def quality(accepted: dict[str, float], *ranges: str) -> float | None:
+        # quality of the most specific of the given ranges the client listed, None if none of them is listed
+        return next((accepted[name] for name in ranges if name in accepted), None)
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+from time import perf_counter
+
+from PIL import Image, ImageFont
+
+from data.AssetRegistry import AssetRegistry
+from data.GlyphCache import GlyphCache
+from data.IMCache import IMCache
+from data.LayerCache import LayerCache
+
+
+class WidgetRenderer:
+    # time-dependent texts ("GENERATED ON" and the relative last stream) are rendered at this granularity in seconds
+    granularity: int = 10
+
+    def __init__(self: WidgetRenderer) -> None:
+        raise NotImplementedError("Instantiation of WidgetRenderer not allowed.")
+
+    @classmethod
+    def timestamp(cls: WidgetRenderer, now: datetime = None) -> datetime:
+        now = now if now else datetime.now(timezone.utc)
+        if cls.granularity <= 1:
+            return now.replace(microsecond=0)
+        return datetime.fromtimestamp(now.timestamp() // cls.granularity * cls.granularity, tz=now.tzinfo)
+
+    @staticmethod
+    def __to_hr(dt: datetime, now: datetime) -> str:
+        if not dt:
+            return 'Never'
+        delta = now - dt
+        delta_seconds: float = delta.total_seconds()
+
+        day = int(delta_seconds // (24 * 3600))
+        year = 0
+        if day > 365:
+            year = int(day // 365)
+            day = day - (year * 365)
+        time = delta_seconds % (24 * 3600)
+        hour = int(time // 3600)
+        time %= 3600
+        minutes = int(time // 60)
+        time %= 60
+        seconds = int(time)
+
+        if year > 0:
+            if day > 0:
+                return '{}y {}d ago'.format(year, day)
+            return '{}y ago'.format(year)
+        if day > 0:
+            if hour > 0:
+                return '{}d {}h ago'.format(day, hour)
+            return '{}d ago'.format(day)
+        if hour > 0:
+            if minutes > 0:
+                return '{}h {}m ago'.format(hour, minutes)
+            return '{}h ago'.format(hour)
+        if minutes > 0:
+            if seconds > 0:
+                return '{}m {}s ago'.format(minutes, seconds)
+            return '{}s ago'.format(seconds)
+        if seconds > 0:
+            return '{}s ago'.format(seconds)
+        return 'a few seconds ago'
+
+    @staticmethod
+    def __find_font_size(text: str, width: int) -> ImageFont:
+        # largest font size the text fits into, using memoized variants and cached widths
+        low: int = 3
+        high: int = 300
+        while low < high:
+            size: int = (low + high + 1) // 2
+            if GlyphCache.width(text=text, size=size) < width:
+                low = size
+            else:
+                high = size - 1
+        return AssetRegistry.font(size=low)
+
+    @staticmethod
+    def __identity(information: IMCache.ChannelInformation, avatar: Image, version: str) -> Image:
+        # everything which only changes with the avatar, name or partner status of a channel
+        base: Image = AssetRegistry.base()
+
+        # all layers are composited before any text is drawn, none of them overlaps a text
+        if avatar:
+            base.alpha_composite(avatar, dest=(18, 52))
+        base.alpha_composite(AssetRegistry.layer('channel_avatar_border'))
+        if information and information.is_partnered:
+            base.alpha_composite(AssetRegistry.layer('channel_partnered'))
+
+        GlyphCache.draw(image=base, xy=(235, 6), text=version, fill='#10002b', size=16)
+        GlyphCache.draw(image=base, xy=(42, 188), text='GENERATED ON ', fill='#391f54', size=16)
+        if information:
+            GlyphCache.draw(image=base, xy=(80, 55), text=information.displayed_name[:19], fill='#FFFFFF', size=25)
+            GlyphCache.draw(image=base, xy=(80, 77), text='Last stream: ', fill='#FFFFFF', size=16)
+            GlyphCache.draw(image=base, xy=(68, 125), text='Viewers:', fill='#FFFFFF', size=16)
+            GlyphCache.draw(image=base, xy=(68, 150), text='Followers:', fill='#FFFFFF', size=16)
+        return base
+
+    @classmethod
+    def __layer(cls: WidgetRenderer, information: IMCache.ChannelInformation, avatar: Image, version: str) -> Image:
+        if not information:
+            return WidgetRenderer.__identity(information=information, avatar=avatar, version=version)
+        identity: tuple = LayerCache.identity(information=information, avatar=avatar, version=version)
+        layer: Image | None = LayerCache.get(channel=information.name, identity=identity)
+        if layer is None:
+            layer = WidgetRenderer.__identity(information=information, avatar=avatar, version=version)
+            LayerCache.store(channel=information.name, identity=identity, layer=layer)
+        return layer
+
+    @classmethod
+    def render(cls: WidgetRenderer, information: IMCache.ChannelInformation, avatar: Image, version: str, now: datetime, timings: dict[str, float] = None) -> Image:
+        started: float = perf_counter()
+        # the dynamic texts are drawn onto a copy of the cached identity layer, their areas are empty within the layer
+        base: Image = cls.__layer(information=information, avatar=avatar, version=version).copy()
+        composited: float = perf_counter()
+
+        GlyphCache.draw(
+            image=base,
+            xy=(42 + int(GlyphCache.width(text='GENERATED ON ', size=16)), 188),
+            text=now.astimezone().strftime('%Y-%m-%d %H:%M:%S'),
+            fill='#391f54',
+            size=16
+        )
+        if information:
+            GlyphCache.draw(
+                image=base,
+                xy=(80 + int(GlyphCache.width(text='Last stream: ', size=16)), 77),
+                text='LIVE' if information.live_count else WidgetRenderer.__to_hr(information.latest_stream, now),
+                fill='#FFFFFF',
+                size=16
+            )
+            GlyphCache.draw(
+                image=base,
+                xy=(148, 125),
+                text=str('{:,}'.format(information.live_count).replace(',', '.') if information.live_count else '-').rjust(10, ' '),
+                fill='#FFFFFF',
+                size=16
+            )
+            GlyphCache.draw(
+                image=base,
+                xy=(148, 150),
+                text=str('{:,}'.format(information.follower_count).replace(',', '.') if information.follower_count else '-').rjust(10, ' '),
+                fill='#FFFFFF',
+                size=16
+            )
+        if timings is not None:
+            timings['composite'] = composited - started
+            timings['text'] = perf_counter() - composited
+        return base
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from threading import Lock
+
+from PIL import Image, ImageFont
+
+from business.Utilities import Utilities
+
+
+class AssetRegistry:
+    size: tuple[int, int] = (275, 221)
+    font_sizes: tuple[int, ...] = (16, 25)
+
+    __lock: Lock = Lock()
+    __loaded: bool = False
+    __base: Image = None
+    __font: ImageFont = None
+    __fonts: dict[int, ImageFont] = {}
+    __layers: dict[str, Image] = {}
+
+    def __init__(self: AssetRegistry) -> None:
+        raise NotImplementedError("Instantiation of AssetRegistry not allowed.")
+
+    @staticmethod
+    def __open(name: str) -> Image:
+        with Image.open(str(Utilities.get_dynamic_path(path='static/internals/' + name + '.png'))) as image:
+            return image.convert('RGBA')
+
+    @classmethod
+    def load(cls: AssetRegistry) -> None:
+        with cls.__lock:
+            if cls.__loaded:
+                return
+
+            # pre-composite the fixed background layers into one base image
+            base: Image = Image.new('RGBA', cls.size, (255, 0, 0, 0))
+            for name in ('widget_background', 'widget_title', 'content_background'):
+                base.alpha_composite(cls.__open(name))
+
+            # layers which have to be composited on top of dynamic content
+            layers: dict[str, Image] = {}
+            for name in ('channel_avatar_border', 'channel_partnered'):
+                layers[name] = cls.__open(name)
+
+            # font and its commonly used variants
+            font: ImageFont = ImageFont.truetype(str(Utilities.get_dynamic_path(path='static/internals/monogram-extended.ttf')))
+            fonts: dict[int, ImageFont] = {}
+            for size in cls.font_sizes:
+                fonts[size] = font.font_variant(size=size)
+
+            cls.__base = base
+            cls.__layers = layers
+            cls.__font = font
+            cls.__fonts = fonts
+            cls.__loaded = True
+
+    @classmethod
+    def base(cls: AssetRegistry) -> Image:
+        cls.load()
+        return cls.__base.copy()
+
+    @classmethod
+    def layer(cls: AssetRegistry, name: str) -> Image:
+        cls.load()
+        return cls.__layers[name]
+
+    @classmethod
+    def font(cls: AssetRegistry, size: int = None) -> ImageFont:
+        cls.load()
+        if size is None:
+            return cls.__font
+        if size not in cls.__fonts:
+            with cls.__lock:
+                if size not in cls.__fonts:
+                    cls.__fonts[size] = cls.__font.font_variant(size=size)
+        return cls.__fonts[size]
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from threading import Lock
+
+from PIL import Image
+
+
+class AvatarCache:
+    @dataclass
+    class AvatarInformation:
+        uri: str = field(default_factory=str)
+        image: Image = None
+        etag: str = None
+        last_modified: str = None
+        timestamp: datetime = field(default_factory=datetime)
+
+        def size(self: AvatarCache.AvatarInformation) -> int:
+            if not self.image:
+                return 0
+            return self.image.width * self.image.height * len(self.image.getbands())
+
+    avatar_size: tuple[int, int] = (50, 50)
+    ttl: int = 3600
+    max_bytes: int = 16 * 1024 * 1024
+
+    __cache: OrderedDict[str, AvatarInformation] = OrderedDict()
+    __size: int = 0
+    __lock: Lock = Lock()
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __init__(self: AvatarCache) -> None:
+        raise NotImplementedError("Instantiation of AvatarCache not allowed.")
+
+    @classmethod
+    def get(cls: AvatarCache, key: str) -> AvatarInformation | bool:
+        with cls.__lock:
+            if key in cls.__cache:
+                cls.__cache.move_to_end(key)
+                cls.hits += 1
+                return cls.__cache[key]
+            cls.misses += 1
+        return False
+
+    @classmethod
+    def is_fresh(cls: AvatarCache, value: AvatarInformation) -> bool:
+        return value.timestamp + timedelta(seconds=cls.ttl) >= datetime.now()
+
+    @classmethod
+    def store(cls: AvatarCache, key: str, value: AvatarInformation) -> None:
+        if value.size() > cls.max_bytes:
+            return
+        with cls.__lock:
+            if key in cls.__cache:
+                cls.__size -= cls.__cache.pop(key).size()
+            cls.__cache[key] = value
+            cls.__size += value.size()
+            # evict least recently used avatars until the memory cap is respected again
+            while cls.__size > cls.max_bytes:
+                _, evicted = cls.__cache.popitem(last=False)
+                cls.__size -= evicted.size()
+                cls.evictions += 1
+
+    @classmethod
+    def size(cls: AvatarCache) -> int:
+        return cls.__size
+
+    @classmethod
+    def stats(cls: AvatarCache) -> dict[str, int]:
+        return {
+            'entries': len(cls.__cache),
+            'bytes': cls.__size,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions
+        }
+
+    @classmethod
+    def clear(cls: AvatarCache) -> None:
+        with cls.__lock:
+            cls.__cache.clear()
+            cls.__size = 0
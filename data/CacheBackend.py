@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class CacheBackend(ABC):
+    # tells whether entries and locks are visible to other processes
+    shared: bool = False
+    # tells whether calls wait on the network, they are kept off the event loop then
+    blocking: bool = False
+
+    @abstractmethod
+    def get(self: CacheBackend, key: str) -> Any | None:
+        # returns the entry and marks it as recently used
+        ...
+
+    @abstractmethod
+    def peek(self: CacheBackend, key: str) -> Any | None:
+        # returns the entry without affecting eviction
+        ...
+
+    @abstractmethod
+    def put(self: CacheBackend, key: str, entry: Any, max_entries: int) -> int:
+        # stores the entry and returns the number of evicted entries
+        ...
+
+    @abstractmethod
+    def contains(self: CacheBackend, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def size(self: CacheBackend) -> int:
+        ...
+
+    def acquire(self: CacheBackend, key: str, ttl: float) -> str | None:
+        # tries to take the cache-wide lock of the key for at most ttl seconds, returns a token to release it with
+        return 'local'
+
+    def release(self: CacheBackend, key: str, token: str) -> None:
+        pass
+
+    def clear(self: CacheBackend) -> None:
+        pass
+
+    def close(self: CacheBackend) -> None:
+        pass
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from datetime import datetime
+from queue import Queue, Empty, Full
+from threading import Lock, Thread
+from time import time
+
+from PIL import Image
+
+from data.AvatarCache import AvatarCache
+from data.IMCache import IMCache
+
+
+class DiskCache:
+    # file of the SQLite database, None disables the disk tier
+    path: str | None = None
+    max_bytes: int = 64 * 1024 * 1024
+    # seconds after which stored entries are dropped, regardless of the in-memory ttl
+    ttl: int = 24 * 60 * 60
+    # number of queued writes after which the writer commits a transaction
+    batch_size: int = 128
+    __reader: sqlite3.Connection = None
+    __lock: Lock = Lock()
+    __queue: Queue = None
+    __writer: Thread = None
+
+    def __init__(self: DiskCache) -> None:
+        raise NotImplementedError("Instantiation of DiskCache not allowed.")
+
+    @classmethod
+    def __connect(cls: DiskCache) -> sqlite3.Connection:
+        connection: sqlite3.Connection = sqlite3.connect(cls.path, check_same_thread=False)
+        # readers don't block the writer and vice versa
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    @classmethod
+    def open(cls: DiskCache) -> None:
+        if not cls.path or cls.__writer is not None:
+            return
+        with cls.__connect() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS channels (name TEXT PRIMARY KEY, data TEXT, stored REAL NOT NULL, size INTEGER NOT NULL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS avatars (uri TEXT PRIMARY KEY, mode TEXT, width INTEGER, height INTEGER, pixels BLOB, etag TEXT, last_modified TEXT, stored REAL NOT NULL, size INTEGER NOT NULL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS channels_stored ON channels (stored)')
+            connection.execute('CREATE INDEX IF NOT EXISTS avatars_stored ON avatars (stored)')
+        cls.__reader = cls.__connect()
+        cls.__queue = Queue(maxsize=cls.batch_size * 64)
+        cls.__writer = Thread(target=cls.__run, name='DiskCache', daemon=True)
+        cls.__writer.start()
+
+    @classmethod
+    def close(cls: DiskCache) -> None:
+        if cls.__writer is not None:
+            # write remaining entries before closing the database
+            cls.__queue.put(None)
+            cls.__writer.join(timeout=10)
+            cls.__writer = None
+            cls.__queue = None
+        with cls.__lock:
+            if cls.__reader is not None:
+                cls.__reader.close()
+                cls.__reader = None
+
+    @classmethod
+    def is_enabled(cls: DiskCache) -> bool:
+        return cls.__reader is not None
+
+    @classmethod
+    def __enqueue(cls: DiskCache, record: tuple) -> None:
+        queue: Queue = cls.__queue
+        if queue is None:
+            return
+        try:
+            queue.put_nowait(record)
+        except Full:
+            # writing through is best effort, the entry is simply fetched again after a restart
+            pass
+
+    @classmethod
+    def store_channel(cls: DiskCache, name: str, information: IMCache.ChannelInformation | None) -> None:
+        if cls.__queue is None:
+            return
+        # None marks a channel which doesn't exist
+        data: str | None = json.dumps(information.to_dict()) if information else None
+        cls.__enqueue(('channel', name, data, time()))
+
+    @classmethod
+    def store_avatar(cls: DiskCache, uri: str, avatar: AvatarCache.AvatarInformation) -> None:
+        if cls.__queue is None or not avatar.image:
+            return
+        cls.__enqueue(('avatar', uri, avatar, avatar.timestamp.timestamp()))
+
+    @classmethod
+    def __restore_channel(cls: DiskCache, name: str, data: str | None, stored: float, now: float) -> None:
+        # the in-memory expiry continues where it stopped, expired entries are still served while they get refreshed
+        age: float = now - stored
+        if data is None:
+            if age < IMCache.negative_ttl:
+                IMCache.store_missing(key=name, ttl=IMCache.negative_ttl - age)
+            return
+        IMCache.store(key=name, value=IMCache.ChannelInformation.from_dict(json.loads(data)), ttl=IMCache.ttl - age)
+
+    @staticmethod
+    def __restore_avatar(uri: str, mode: str, width: int, height: int, pixels: bytes, etag: str, last_modified: str, stored: float) -> AvatarCache.AvatarInformation:
+        avatar: AvatarCache.AvatarInformation = AvatarCache.AvatarInformation(
+            uri=uri,
+            image=Image.frombytes(mode, (width, height), pixels),
+            etag=etag,
+            last_modified=last_modified,
+            timestamp=datetime.fromtimestamp(stored)
+        )
+        AvatarCache.store(key=uri, value=avatar)
+        return avatar
+
+    @classmethod
+    def load_channel(cls: DiskCache, name: str) -> bool:
+        # lazily moves a stored channel into the in-memory cache, returns whether there was one
+        now: float = time()
+        with cls.__lock:
+            if cls.__reader is None:
+                return False
+            row: tuple = cls.__reader.execute('SELECT data, stored FROM channels WHERE name = ? AND stored >= ?', (name, now - cls.ttl)).fetchone()
+        if not row:
+            return False
+        cls.__restore_channel(name=name, data=row[0], stored=row[1], now=now)
+        return True
+
+    @classmethod
+    def load_avatar(cls: DiskCache, uri: str) -> AvatarCache.AvatarInformation | bool:
+        with cls.__lock:
+            if cls.__reader is None:
+                return False
+            row: tuple = cls.__reader.execute(
+                'SELECT mode, width, height, pixels, etag, last_modified, stored FROM avatars WHERE uri = ? AND stored >= ?',
+                (uri, time() - cls.ttl)
+            ).fetchone()
+        if not row:
+            return False
+        return DiskCache.__restore_avatar(uri, *row)
+
+    @classmethod
+    def warm(cls: DiskCache) -> int:
+        # loads the most recently stored entries within the bounds of the in-memory caches, returns the number of loaded entries
+        now: float = time()
+        with cls.__lock:
+            if cls.__reader is None:
+                return 0
+            channels: list[tuple] = cls.__reader.execute(
+                'SELECT name, data, stored FROM channels WHERE stored >= ? ORDER BY stored DESC LIMIT ?',
+                (now - cls.ttl, IMCache.max_entries)
+            ).fetchall()
+            avatars: list[tuple] = cls.__reader.execute(
+                'SELECT uri, mode, width, height, pixels, etag, last_modified, stored FROM avatars WHERE stored >= ? ORDER BY stored DESC',
+                (now - cls.ttl,)
+            ).fetchall()
+        # only as many avatars as fit into memory
+        size: int = 0
+        for index, row in enumerate(avatars):
+            size += len(row[4])
+            if size > AvatarCache.max_bytes:
+                avatars = avatars[:index]
+                break
+        # oldest first, so the most recent entries end up as most recently used
+        for name, data, stored in reversed(channels):
+            cls.__restore_channel(name=name, data=data, stored=stored, now=now)
+        for row in reversed(avatars):
+            DiskCache.__restore_avatar(*row)
+        return len(channels) + len(avatars)
+
+    @classmethod
+    def __write(cls: DiskCache, connection: sqlite3.Connection, records: list[tuple]) -> None:
+        with connection:
+            for kind, key, value, stored in records:
+                if kind == 'channel':
+                    connection.execute(
+                        'INSERT OR REPLACE INTO channels (name, data, stored, size) VALUES (?, ?, ?, ?)',
+                        (key, value, stored, len(key) + len(value or ''))
+                    )
+                else:
+                    pixels: bytes = value.image.tobytes()
+                    connection.execute(
+                        'INSERT OR REPLACE INTO avatars (uri, mode, width, height, pixels, etag, last_modified, stored, size) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (key, value.image.mode, value.image.width, value.image.height, pixels, value.etag, value.last_modified, stored, len(key) + len(pixels))
+                    )
+            # expire old entries and drop the oldest ones until the size bound is respected
+            expired: float = time() - cls.ttl
+            connection.execute('DELETE FROM channels WHERE stored < ?', (expired,))
+            connection.execute('DELETE FROM avatars WHERE stored < ?', (expired,))
+            size: int = connection.execute('SELECT (SELECT IFNULL(SUM(size), 0) FROM channels) + (SELECT IFNULL(SUM(size), 0) FROM avatars)').fetchone()[0]
+            if size <= cls.max_bytes:
+                return
+            oldest: list[tuple] = connection.execute(
+                "SELECT 'channels', name, size, stored FROM channels UNION ALL SELECT 'avatars', uri, size, stored FROM avatars ORDER BY stored"
+            ).fetchall()
+            for table, key, entry_size, _ in oldest:
+                if size <= cls.max_bytes:
+                    break
+                connection.execute('DELETE FROM {} WHERE {} = ?'.format(table, 'name' if table == 'channels' else 'uri'), (key,))
+                size -= entry_size
+
+    @classmethod
+    def __run(cls: DiskCache) -> None:
+        queue: Queue = cls.__queue
+        connection: sqlite3.Connection = cls.__connect()
+        running: bool = True
+        while running:
+            records: list[tuple] = []
+            # block for the first record, then take whatever else is already queued
+            record: tuple = queue.get()
+            while record is not None:
+                records.append(record)
+                if len(records) >= cls.batch_size:
+                    break
+                try:
+                    record = queue.get_nowait()
+                except Empty:
+                    break
+            running = record is not None
+            if records:
+                try:
+                    cls.__write(connection=connection, records=records)
+                except sqlite3.Error:
+                    pass
+        connection.close()
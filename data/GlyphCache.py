@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+
+from PIL import Image, ImageDraw, ImageFont
+
+from data.AssetRegistry import AssetRegistry
+
+
+class GlyphCache:
+    # characters of the numbers and relative times which are pre-rasterized per font size and composed by blitting
+    characters: str = '0123456789 .,:-adefghmnorswyLIVEN'
+    # fixed texts pre-rasterized as a whole
+    labels: tuple[str, ...] = ('Viewers:', 'Followers:', 'Last stream: ', 'GENERATED ON ')
+    # maximum number of other cached texts, e.g. channel names and the version
+    max_runs: int = 4096
+
+    __lock: Lock = Lock()
+    __loaded: bool = False
+    # text masks together with their offset relative to the drawing position, keyed by font size and text
+    __glyphs: dict[tuple[int, str], tuple[Image, tuple[int, int]]] = {}
+    __runs: OrderedDict[tuple[int, str], tuple[Image, tuple[int, int]]] = OrderedDict()
+    __widths: dict[tuple[int, str], float] = {}
+
+    def __init__(self: GlyphCache) -> None:
+        raise NotImplementedError("Instantiation of GlyphCache not allowed.")
+
+    @staticmethod
+    def __rasterize(font: ImageFont, text: str) -> tuple[Image, tuple[int, int]]:
+        # the same anti-aliased mask FreeType produces when drawing the text
+        left, top, right, bottom = font.getbbox(text)
+        mask: Image = Image.new('L', (max(1, right - left), max(1, bottom - top)), 0)
+        ImageDraw.Draw(mask).text(xy=(-left, -top), text=text, fill=255, font=font)
+        return mask, (left, top)
+
+    @classmethod
+    def load(cls: GlyphCache) -> None:
+        with cls.__lock:
+            if cls.__loaded:
+                return
+            glyphs: dict[tuple[int, str], tuple[Image, tuple[int, int]]] = {}
+            for size in AssetRegistry.font_sizes:
+                font: ImageFont = AssetRegistry.font(size=size)
+                for text in tuple(cls.characters) + cls.labels:
+                    glyphs[(size, text)] = GlyphCache.__rasterize(font=font, text=text)
+            cls.__glyphs = glyphs
+            cls.__loaded = True
+
+    @classmethod
+    def width(cls: GlyphCache, text: str, size: int) -> float:
+        key: tuple[int, str] = (size, text)
+        width: float = cls.__widths.get(key)
+        if width is None:
+            width = AssetRegistry.font(size=size).getlength(text)
+            if len(cls.__widths) < cls.max_runs:
+                cls.__widths[key] = width
+        return width
+
+    @classmethod
+    def __run(cls: GlyphCache, text: str, size: int) -> tuple[Image, tuple[int, int]]:
+        key: tuple[int, str] = (size, text)
+        with cls.__lock:
+            run: tuple[Image, tuple[int, int]] = cls.__runs.get(key)
+            if run is not None:
+                cls.__runs.move_to_end(key)
+                return run
+        run = GlyphCache.__rasterize(font=AssetRegistry.font(size=size), text=text)
+        with cls.__lock:
+            cls.__runs[key] = run
+            while len(cls.__runs) > cls.max_runs:
+                cls.__runs.popitem(last=False)
+        return run
+
+    @staticmethod
+    def __blit(image: Image, xy: tuple[int, int], glyph: tuple[Image, tuple[int, int]], fill: str) -> None:
+        mask, (left, top) = glyph
+        image.paste(fill, (xy[0] + left, xy[1] + top), mask)
+
+    @classmethod
+    def draw(cls: GlyphCache, image: Image, xy: tuple[int, int], text: str, fill: str, size: int) -> None:
+        # draws like ImageDraw.text, but from cached bitmaps instead of rendering the text with FreeType
+        cls.load()
+        glyph: tuple[Image, tuple[int, int]] = cls.__glyphs.get((size, text))
+        if glyph is not None:
+            GlyphCache.__blit(image=image, xy=xy, glyph=glyph, fill=fill)
+        elif text and all((size, character) in cls.__glyphs for character in text):
+            # the font is monospaced without kerning, every glyph starts where the previous one advanced to
+            x: float = xy[0]
+            for character in text:
+                if character != ' ':
+                    GlyphCache.__blit(image=image, xy=(int(x), xy[1]), glyph=cls.__glyphs[(size, character)], fill=fill)
+                x += cls.width(text=character, size=size)
+        elif text:
+            GlyphCache.__blit(image=image, xy=xy, glyph=cls.__run(text=text, size=size), fill=fill)
@@ -1,7 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import json
+from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass, field
 from datetime import datetime
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Any, AsyncIterator, Callable, Iterator
+
+from data.CacheBackend import CacheBackend
+from data.MemoryBackend import MemoryBackend
 
 
 class IMCache:
@@ -16,17 +26,185 @@ class IMCache:
         latest_stream: datetime = field(default_factory=datetime)
         timestamp: datetime = field(default_factory=datetime)
 
-    cache: dict[str, ChannelInformation] = {}
+        def fingerprint(self: IMCache.ChannelInformation) -> str:
+            # identifies the displayed data, the refresh timestamp is left out on purpose
+            data: tuple = (
+                self.name,
+                self.displayed_name,
+                self.is_partnered,
+                self.avatar_uri,
+                self.live_count,
+                self.follower_count,
+                self.latest_stream.isoformat() if self.latest_stream else None
+            )
+            return hashlib.blake2b(repr(data).encode('UTF-8'), digest_size=8).hexdigest()
+
+        def to_dict(self: IMCache.ChannelInformation) -> dict:
+            return {
+                'name': self.name,
+                'displayed_name': self.displayed_name,
+                'is_partnered': self.is_partnered,
+                'avatar_uri': self.avatar_uri,
+                'live_count': self.live_count,
+                'follower_count': self.follower_count,
+                'latest_stream': self.latest_stream.isoformat() if self.latest_stream else None,
+                'timestamp': self.timestamp.isoformat() if self.timestamp else None
+            }
+
+        @staticmethod
+        def from_dict(values: dict) -> IMCache.ChannelInformation:
+            values = dict(values)
+            for name in ('latest_stream', 'timestamp'):
+                values[name] = datetime.fromisoformat(values[name]) if values[name] else None
+            return IMCache.ChannelInformation(**values)
+
+    @dataclass
+    class Entry:
+        # a value of None marks a channel which doesn't exist (negative caching)
+        value: IMCache.ChannelInformation | None = None
+        # wall-clock time, so entries can be shared between processes
+        expires: float = field(default_factory=float)
+
+        def is_fresh(self: IMCache.Entry) -> bool:
+            return self.expires >= time()
+
+        def serialize(self: IMCache.Entry) -> str:
+            return json.dumps({'value': self.value.to_dict() if self.value else None, 'expires': self.expires})
+
+        @staticmethod
+        def deserialize(data: str | bytes) -> IMCache.Entry:
+            values: dict = json.loads(data)
+            return IMCache.Entry(
+                value=IMCache.ChannelInformation.from_dict(values['value']) if values['value'] else None,
+                expires=values['expires']
+            )
+
+    max_entries: int = 10000
+    ttl: int = 60
+    negative_ttl: int = 300
+    # seconds after expiry during which outdated information is served while it gets refreshed in the background
+    stale_ttl: int = 300
+    # seconds between attempts to take a cache-wide lock held by another process
+    lock_poll_interval: float = 0.05
+
+    backend: CacheBackend = MemoryBackend()
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    __lock: Lock = Lock()
 
     def __init__(self: IMCache) -> None:
         raise NotImplementedError("Instantiation of IMCache not allowed.")
 
+    @classmethod
+    def __count(cls: IMCache, hit: bool) -> None:
+        with cls.__lock:
+            if hit:
+                cls.hits += 1
+            else:
+                cls.misses += 1
+
     @classmethod
     def get(cls: IMCache, key: str) -> ChannelInformation | bool:
-        if key in cls.cache:
-            return cls.cache[key]
+        entry: IMCache.Entry = cls.backend.get(key)
+        if entry and entry.is_fresh() and entry.value:
+            cls.__count(hit=True)
+            return entry.value
+        cls.__count(hit=False)
+        return False
+
+    @classmethod
+    def peek(cls: IMCache, key: str, max_stale: float = None) -> ChannelInformation | bool:
+        # returns stored information even if expired (at most max_stale seconds ago), without affecting eviction or statistics
+        entry: IMCache.Entry = cls.backend.peek(key)
+        if entry and entry.value:
+            if max_stale is None or entry.expires + max_stale >= time():
+                return entry.value
+        return False
+
+    @classmethod
+    def expires_in(cls: IMCache, key: str) -> float | None:
+        entry: IMCache.Entry = cls.backend.peek(key)
+        if entry and entry.value:
+            return entry.expires - time()
+        return None
+
+    @classmethod
+    def is_missing(cls: IMCache, key: str) -> bool:
+        entry: IMCache.Entry = cls.backend.peek(key)
+        if entry and entry.is_fresh() and not entry.value:
+            cls.backend.get(key)
+            cls.__count(hit=True)
+            return True
         return False
 
     @classmethod
-    def store(cls: IMCache, key: str, value: ChannelInformation) -> None:
-        cls.cache[key] = value
+    def is_cached(cls: IMCache, key: str) -> bool:
+        # tells whether a lookup would be answered without upstream requests, without affecting eviction or statistics
+        entry: IMCache.Entry = cls.backend.peek(key)
+        return bool(entry) and entry.is_fresh()
+
+    @classmethod
+    def contains(cls: IMCache, key: str) -> bool:
+        # tells whether there is any entry, even an expired or negative one
+        return cls.backend.contains(key)
+
+    @classmethod
+    def store(cls: IMCache, key: str, value: ChannelInformation, ttl: float = None) -> None:
+        cls.__put(key=key, entry=IMCache.Entry(value=value, expires=time() + (cls.ttl if ttl is None else ttl)))
+
+    @classmethod
+    def store_missing(cls: IMCache, key: str, ttl: float = None) -> None:
+        cls.__put(key=key, entry=IMCache.Entry(value=None, expires=time() + (cls.negative_ttl if ttl is None else ttl)))
+
+    @classmethod
+    def __put(cls: IMCache, key: str, entry: Entry) -> None:
+        evicted: int = cls.backend.put(key=key, entry=entry, max_entries=cls.max_entries)
+        if evicted:
+            with cls.__lock:
+                cls.evictions += evicted
+
+    @classmethod
+    async def offload(cls: IMCache, function: Callable[..., Any], *args, **kwargs) -> Any:
+        # cache calls of blocking backends run in a thread, the event loop keeps serving other requests meanwhile
+        if not cls.backend.blocking:
+            return function(*args, **kwargs)
+        return await asyncio.to_thread(function, *args, **kwargs)
+
+    @classmethod
+    @contextmanager
+    def lock(cls: IMCache, key: str, timeout: float) -> Iterator[bool]:
+        # cache-wide lock of a key, yields False if it couldn't be taken within the timeout
+        deadline: float = monotonic() + timeout
+        token: str | None = cls.backend.acquire(key=key, ttl=timeout)
+        while token is None and monotonic() < deadline:
+            sleep(cls.lock_poll_interval)
+            token = cls.backend.acquire(key=key, ttl=timeout)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                cls.backend.release(key=key, token=token)
+
+    @classmethod
+    @asynccontextmanager
+    async def lock_async(cls: IMCache, key: str, timeout: float) -> AsyncIterator[bool]:
+        deadline: float = monotonic() + timeout
+        token: str | None = await cls.offload(cls.backend.acquire, key=key, ttl=timeout)
+        while token is None and monotonic() < deadline:
+            await asyncio.sleep(cls.lock_poll_interval)
+            token = await cls.offload(cls.backend.acquire, key=key, ttl=timeout)
+        try:
+            yield token is not None
+        finally:
+            if token is not None:
+                await cls.offload(cls.backend.release, key=key, token=token)
+
+    @classmethod
+    def stats(cls: IMCache) -> dict[str, int]:
+        return {
+            'entries': cls.backend.size(),
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions
+        }
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import hashlib
+from collections import OrderedDict
+from threading import Lock
+
+from PIL import Image
+
+from data.IMCache import IMCache
+
+
+class LayerCache:
+    # pre-composited identity layer per channel: the widget without the texts changing between requests
+    max_bytes: int = 16 * 1024 * 1024
+
+    __cache: OrderedDict[str, tuple[tuple, Image]] = OrderedDict()
+    __size: int = 0
+    __lock: Lock = Lock()
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    invalidations: int = 0
+
+    def __init__(self: LayerCache) -> None:
+        raise NotImplementedError("Instantiation of LayerCache not allowed.")
+
+    @staticmethod
+    def identity(information: IMCache.ChannelInformation, avatar: Image, version: str) -> tuple:
+        # everything the layer depends on, the avatar by content since a revalidated avatar keeps its URI
+        return (
+            information.displayed_name,
+            information.is_partnered,
+            version,
+            (avatar.mode, avatar.size, hashlib.blake2b(avatar.tobytes(), digest_size=16).digest()) if avatar else None
+        )
+
+    @staticmethod
+    def __bytes(image: Image) -> int:
+        return image.width * image.height * len(image.getbands())
+
+    @classmethod
+    def get(cls: LayerCache, channel: str, identity: tuple) -> Image | None:
+        with cls.__lock:
+            entry: tuple[tuple, Image] | None = cls.__cache.get(channel)
+            if entry and entry[0] == identity:
+                cls.__cache.move_to_end(channel)
+                cls.hits += 1
+                return entry[1]
+            if entry:
+                # avatar, name or partner status changed
+                del cls.__cache[channel]
+                cls.__size -= LayerCache.__bytes(entry[1])
+                cls.invalidations += 1
+            cls.misses += 1
+        return None
+
+    @classmethod
+    def store(cls: LayerCache, channel: str, identity: tuple, layer: Image) -> None:
+        size: int = LayerCache.__bytes(layer)
+        if size > cls.max_bytes:
+            return
+        with cls.__lock:
+            if channel in cls.__cache:
+                cls.__size -= LayerCache.__bytes(cls.__cache.pop(channel)[1])
+            cls.__cache[channel] = (identity, layer)
+            cls.__size += size
+            # evict least recently used layers until the cache fits again
+            while cls.__size > cls.max_bytes:
+                _, (_, evicted) = cls.__cache.popitem(last=False)
+                cls.__size -= LayerCache.__bytes(evicted)
+                cls.evictions += 1
+
+    @classmethod
+    def stats(cls: LayerCache) -> dict[str, int]:
+        return {
+            'entries': len(cls.__cache),
+            'bytes': cls.__size,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions,
+            'invalidations': cls.invalidations
+        }
+
+    @classmethod
+    def clear(cls: LayerCache) -> None:
+        with cls.__lock:
+            cls.__cache.clear()
+            cls.__size = 0
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any
+
+from data.CacheBackend import CacheBackend
+
+
+class MemoryBackend(CacheBackend):
+    # entries live in the class state of the serving process, locks are left to the in-process single-flight
+    def __init__(self: MemoryBackend) -> None:
+        self.__cache: OrderedDict[str, Any] = OrderedDict()
+        self.__lock: Lock = Lock()
+
+    def get(self: MemoryBackend, key: str) -> Any | None:
+        with self.__lock:
+            entry: Any = self.__cache.get(key)
+            if entry is not None:
+                self.__cache.move_to_end(key)
+            return entry
+
+    def peek(self: MemoryBackend, key: str) -> Any | None:
+        return self.__cache.get(key)
+
+    def put(self: MemoryBackend, key: str, entry: Any, max_entries: int) -> int:
+        evicted: int = 0
+        with self.__lock:
+            self.__cache[key] = entry
+            self.__cache.move_to_end(key)
+            # evict least recently used entries
+            while len(self.__cache) > max_entries:
+                self.__cache.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def contains(self: MemoryBackend, key: str) -> bool:
+        return key in self.__cache
+
+    def size(self: MemoryBackend) -> int:
+        return len(self.__cache)
+
+    def clear(self: MemoryBackend) -> None:
+        with self.__lock:
+            self.__cache.clear()
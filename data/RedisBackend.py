@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import socket
+import threading
+import uuid
+from time import monotonic, time
+from urllib.parse import urlparse
+
+from business.Logger import Logger
+from data.CacheBackend import CacheBackend
+from data.IMCache import IMCache
+
+
+class RedisBackend(CacheBackend):
+    # entries live in a server speaking the Redis protocol (RESP), shared by every process and host connected to it
+    shared: bool = True
+    blocking: bool = True
+
+    class Error(Exception):
+        pass
+
+    __release_script: str = "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end return 0"
+
+    def __init__(self: RedisBackend, url: str = 'redis://127.0.0.1:6379/0', prefix: str = 'streamerinfo:', timeout: float = 1) -> None:
+        parsed = urlparse(url)
+        self.host: str = parsed.hostname or '127.0.0.1'
+        self.port: int = parsed.port or 6379
+        self.database: int = int(parsed.path.lstrip('/') or 0)
+        self.password: str | None = parsed.password
+        self.prefix: str = prefix
+        self.timeout: float = timeout
+        # seconds commands are skipped after a failure instead of reconnecting for every one of them
+        self.retry_interval: float = 1
+        self.__unavailable_until: float = 0
+        # one connection per thread, RESP replies are matched to requests by order
+        self.__local: threading.local = threading.local()
+
+    def __connect(self: RedisBackend) -> tuple[socket.socket, object]:
+        connection: socket.socket = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.__local.connection = connection, connection.makefile('rb')
+        if self.password:
+            self.__command('AUTH', self.password)
+        if self.database:
+            self.__command('SELECT', self.database)
+        return self.__local.connection
+
+    def __disconnect(self: RedisBackend) -> None:
+        connection: tuple[socket.socket, object] | None = getattr(self.__local, 'connection', None)
+        self.__local.connection = None
+        if connection:
+            connection[1].close()
+            connection[0].close()
+
+    @staticmethod
+    def __encode(*arguments: str | bytes | int | float) -> bytes:
+        parts: list[bytes] = [b'*%d\r\n' % len(arguments)]
+        for argument in arguments:
+            data: bytes = argument if isinstance(argument, bytes) else str(argument).encode('UTF-8')
+            parts.append(b'$%d\r\n%s\r\n' % (len(data), data))
+        return b''.join(parts)
+
+    @staticmethod
+    def __reply(reader) -> object:
+        line: bytes = reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError("Connection closed by the server.")
+        kind, data = line[:1], line[1:-2]
+        if kind == b'+':
+            return data.decode('UTF-8')
+        if kind == b'-':
+            raise RedisBackend.Error(data.decode('UTF-8'))
+        if kind == b':':
+            return int(data)
+        if kind == b'$':
+            if int(data) < 0:
+                return None
+            value: bytes = reader.read(int(data) + 2)[:-2]
+            return value
+        if kind == b'*':
+            return None if int(data) < 0 else [RedisBackend.__reply(reader) for _ in range(int(data))]
+        raise RedisBackend.Error("Unsupported reply: {}".format(line))
+
+    def __command(self: RedisBackend, *arguments: str | bytes | int | float) -> object:
+        connection: tuple[socket.socket, object] | None = getattr(self.__local, 'connection', None) or self.__connect()
+        connection[0].sendall(RedisBackend.__encode(*arguments))
+        return RedisBackend.__reply(connection[1])
+
+    def __failed(self: RedisBackend) -> None:
+        self.__disconnect()
+        self.__unavailable_until = monotonic() + self.retry_interval
+
+    def __call(self: RedisBackend, *arguments: str | bytes | int | float) -> object:
+        # the cache degrades to misses while the server is unreachable
+        if monotonic() < self.__unavailable_until:
+            return None
+        try:
+            return self.__command(*arguments)
+        except RedisBackend.Error as err:
+            # the server answered, the connection stays usable
+            Logger.warn(message="Redis cache command {} failed: {}".format(arguments[0], err))
+            return None
+        except (OSError, ConnectionError) as err:
+            self.__failed()
+            Logger.warn(message="Redis cache command {} failed: {}".format(arguments[0], err))
+            return None
+
+    def get(self: RedisBackend, key: str) -> IMCache.Entry | None:
+        data: bytes | None = self.__call('GET', self.prefix + 'channel:' + key)
+        return IMCache.Entry.deserialize(data) if data else None
+
+    def peek(self: RedisBackend, key: str) -> IMCache.Entry | None:
+        return self.get(key)
+
+    def put(self: RedisBackend, key: str, entry: IMCache.Entry, max_entries: int) -> int:
+        # expired entries are kept for serving stale data, the size is bounded by the server's eviction policy
+        retention: int = max(1, int((entry.expires - time() + IMCache.stale_ttl) * 1000))
+        self.__call('SET', self.prefix + 'channel:' + key, entry.serialize(), 'PX', retention)
+        return 0
+
+    def contains(self: RedisBackend, key: str) -> bool:
+        return bool(self.__call('EXISTS', self.prefix + 'channel:' + key))
+
+    def __keys(self: RedisBackend, pattern: str) -> list[bytes]:
+        # incrementally iterated, unlike KEYS this doesn't block the server on large databases
+        keys: list[bytes] = []
+        cursor: bytes = b'0'
+        while True:
+            reply: list | None = self.__call('SCAN', cursor, 'MATCH', self.prefix + pattern, 'COUNT', 1000)
+            if not reply:
+                return keys
+            cursor, found = reply
+            keys.extend(found)
+            if cursor == b'0':
+                return keys
+
+    def size(self: RedisBackend) -> int:
+        # only the channel entries of this cache, neither its locks nor other keys of the database
+        return len(self.__keys('channel:*'))
+
+    def acquire(self: RedisBackend, key: str, ttl: float) -> str | None:
+        # the lock expires after ttl seconds, so a crashed holder doesn't block other processes for long
+        token: str = uuid.uuid4().hex
+        if monotonic() < self.__unavailable_until:
+            return 'unavailable'
+        try:
+            acquired: object = self.__command('SET', self.prefix + 'lock:' + key, token, 'NX', 'PX', max(1, int(ttl * 1000)))
+        except RedisBackend.Error as err:
+            Logger.warn(message="Redis cache lock couldn't be taken: {}".format(err))
+            return 'unavailable'
+        except (OSError, ConnectionError) as err:
+            self.__failed()
+            Logger.warn(message="Redis cache lock couldn't be taken: {}".format(err))
+            # proceed without the cache-wide lock rather than waiting for an unreachable server
+            return 'unavailable'
+        return token if acquired == 'OK' else None
+
+    def release(self: RedisBackend, key: str, token: str) -> None:
+        # only the holder may release the lock, it may have expired and been taken by another process meanwhile
+        # compared and deleted by the server in one step, nothing can take the lock in between
+        self.__call('EVAL', RedisBackend.__release_script, 1, self.prefix + 'lock:' + key, token)
+
+    def clear(self: RedisBackend) -> None:
+        # the database may be shared with other applications
+        keys: list[bytes] = self.__keys('*')
+        for index in range(0, len(keys), 1000):
+            self.__call('DEL', *keys[index:index + 1000])
+
+    def close(self: RedisBackend) -> None:
+        self.__disconnect()
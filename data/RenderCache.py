@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+
+
+class RenderCache:
+    max_bytes: int = 32 * 1024 * 1024
+
+    __cache: OrderedDict[tuple, bytes] = OrderedDict()
+    __size: int = 0
+    __lock: Lock = Lock()
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def __init__(self: RenderCache) -> None:
+        raise NotImplementedError("Instantiation of RenderCache not allowed.")
+
+    @staticmethod
+    def key(channel: str, fingerprint: str, image_format: str, level: int, bucket: int, profile: str | None = None) -> tuple:
+        return channel, fingerprint, image_format, profile or level, bucket
+
+    @classmethod
+    def get(cls: RenderCache, key: tuple) -> bytes | bool:
+        with cls.__lock:
+            if key in cls.__cache:
+                cls.__cache.move_to_end(key)
+                cls.hits += 1
+                return cls.__cache[key]
+            cls.misses += 1
+        return False
+
+    @classmethod
+    def store(cls: RenderCache, key: tuple, value: bytes) -> None:
+        if len(value) > cls.max_bytes:
+            return
+        with cls.__lock:
+            if key in cls.__cache:
+                cls.__size -= len(cls.__cache.pop(key))
+            cls.__cache[key] = value
+            cls.__size += len(value)
+            # evict least recently used entries until the cache fits again
+            while cls.__size > cls.max_bytes:
+                _, evicted = cls.__cache.popitem(last=False)
+                cls.__size -= len(evicted)
+                cls.evictions += 1
+
+    @classmethod
+    def size(cls: RenderCache) -> int:
+        return cls.__size
+
+    @classmethod
+    def stats(cls: RenderCache) -> dict[str, int]:
+        return {
+            'entries': len(cls.__cache),
+            'bytes': cls.__size,
+            'hits': cls.hits,
+            'misses': cls.misses,
+            'evictions': cls.evictions
+        }
+
+    @classmethod
+    def clear(cls: RenderCache) -> None:
+        with cls.__lock:
+            cls.__cache.clear()
+            cls.__size = 0
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import struct
+import tempfile
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+from threading import Lock
+
+from data.CacheBackend import CacheBackend
+from data.IMCache import IMCache
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows
+    fcntl = None
+
+
+class SharedMemoryBackend(CacheBackend):
+    # entries live in a named shared memory block of fixed size slots, any process on the host attaching the same name shares them:
+    # a key is stored in the slot its hash points to, a colliding key replaces it
+    shared: bool = True
+    # POSIX record locks aren't available on Windows
+    supported: bool = fcntl is not None
+    # the block starts with the number of attached processes, the slots follow
+    __attached: struct.Struct = struct.Struct('<Q')
+    __slots_offset: int = 64
+    # sequence (odd while being written), key hash and payload length precede every payload
+    __header: struct.Struct = struct.Struct('<QQI')
+    # reads retry this often before giving up on a slot which is constantly rewritten
+    __read_attempts: int = 16
+
+    def __init__(self: SharedMemoryBackend, name: str = 'streamerinfo', slots: int = 4096, slot_size: int = 1024) -> None:
+        if not SharedMemoryBackend.supported:
+            raise NotImplementedError("Shared memory cache backend requires POSIX file locks.")
+        self.slots: int = slots
+        self.slot_size: int = slot_size
+        # byte range locks on this file guard attaching and detaching (first byte), writes to a slot (first range)
+        # and the cache-wide key locks (second range), they are released by the operating system if a process dies while holding them
+        self.__lock_path: str = os.path.join(tempfile.gettempdir(), name + '.lock')
+        self.__lock_file: int = self.__lock_attachment()
+        try:
+            self.__memory: SharedMemory = SharedMemoryBackend.__attach(name=name, size=self.__slots_offset + slots * slot_size)
+            self.__attached.pack_into(self.__memory.buf, 0, self.__attached.unpack_from(self.__memory.buf, 0)[0] + 1)
+        except BaseException:
+            # closing the file releases its locks as well
+            os.close(self.__lock_file)
+            raise
+        fcntl.lockf(self.__lock_file, fcntl.LOCK_UN, 1, 0)
+        # POSIX record locks are owned by the process, threads of the same process are excluded locally
+        self.__write_lock: Lock = Lock()
+        self.__key_locks: dict[int, Lock] = {}
+        self.__key_locks_lock: Lock = Lock()
+
+    def __lock_attachment(self: SharedMemoryBackend) -> int:
+        # opens the lock file holding the attachment lock, retried if the last process detaching removed the file meanwhile
+        while True:
+            lock_file: int = os.open(self.__lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.lockf(lock_file, fcntl.LOCK_EX, 1, 0)
+            try:
+                if os.stat(self.__lock_path).st_ino == os.fstat(lock_file).st_ino:
+                    return lock_file
+            except FileNotFoundError:
+                pass
+            os.close(lock_file)
+
+    @staticmethod
+    def __attach(name: str, size: int) -> SharedMemory:
+        try:
+            memory: SharedMemory = SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            memory = SharedMemory(name=name)
+            if memory.size < size:
+                memory.close()
+                raise ValueError("Shared memory block {} is smaller than the configured slots.".format(name))
+        # the block has to outlive the process which created it, other workers may still be using it
+        resource_tracker.unregister(getattr(memory, '_name', '/' + name), 'shared_memory')
+        return memory
+
+    @staticmethod
+    def __hash(key: str) -> int:
+        return int.from_bytes(hashlib.blake2b(key.encode('UTF-8'), digest_size=8).digest(), 'little') or 1
+
+    def __offset(self: SharedMemoryBackend, index: int) -> int:
+        return self.__slots_offset + index * self.slot_size
+
+    def __read(self: SharedMemoryBackend, key: str) -> IMCache.Entry | None:
+        key_hash: int = SharedMemoryBackend.__hash(key)
+        offset: int = self.__offset(key_hash % self.slots)
+        buffer: memoryview = self.__memory.buf
+        for _ in range(self.__read_attempts):
+            sequence, slot_hash, length = self.__header.unpack_from(buffer, offset)
+            if sequence % 2:
+                # slot is being written right now
+                continue
+            if slot_hash != key_hash:
+                return None
+            payload: bytes = bytes(buffer[offset + self.__header.size:offset + self.__header.size + length])
+            if self.__header.unpack_from(buffer, offset)[0] != sequence:
+                # slot changed while reading it
+                continue
+            try:
+                stored_key, data = payload.split(b'\n', 1)
+                return IMCache.Entry.deserialize(data) if stored_key.decode('UTF-8') == key else None
+            except ValueError:
+                return None
+        return None
+
+    def get(self: SharedMemoryBackend, key: str) -> IMCache.Entry | None:
+        return self.__read(key)
+
+    def peek(self: SharedMemoryBackend, key: str) -> IMCache.Entry | None:
+        return self.__read(key)
+
+    def put(self: SharedMemoryBackend, key: str, entry: IMCache.Entry, max_entries: int) -> int:
+        payload: bytes = key.encode('UTF-8') + b'\n' + entry.serialize().encode('UTF-8')
+        if self.__header.size + len(payload) > self.slot_size:
+            # doesn't fit into a slot, the entry isn't cached
+            return 0
+        key_hash: int = SharedMemoryBackend.__hash(key)
+        index: int = key_hash % self.slots
+        offset: int = self.__offset(index)
+        buffer: memoryview = self.__memory.buf
+        with self.__write_lock:
+            fcntl.lockf(self.__lock_file, fcntl.LOCK_EX, 1, 1 + index)
+            try:
+                sequence, slot_hash, _ = self.__header.unpack_from(buffer, offset)
+                # readers retry while the sequence is odd or changed, an odd sequence left by a crashed writer is rounded up
+                sequence += sequence % 2
+                self.__header.pack_into(buffer, offset, sequence + 1, slot_hash, 0)
+                buffer[offset + self.__header.size:offset + self.__header.size + len(payload)] = payload
+                self.__header.pack_into(buffer, offset, sequence + 2, key_hash, len(payload))
+            finally:
+                fcntl.lockf(self.__lock_file, fcntl.LOCK_UN, 1, 1 + index)
+        return 1 if slot_hash not in (0, key_hash) else 0
+
+    def contains(self: SharedMemoryBackend, key: str) -> bool:
+        return self.__read(key) is not None
+
+    def size(self: SharedMemoryBackend) -> int:
+        return sum(
+            1 for index in range(self.slots)
+            if self.__header.unpack_from(self.__memory.buf, self.__offset(index))[1]
+        )
+
+    def attached(self: SharedMemoryBackend) -> int:
+        return self.__attached.unpack_from(self.__memory.buf, 0)[0]
+
+    def acquire(self: SharedMemoryBackend, key: str, ttl: float) -> str | None:
+        # the lock is held until released or the holding process dies, the ttl isn't needed
+        index: int = 1 + self.slots + SharedMemoryBackend.__hash(key) % self.slots
+        with self.__key_locks_lock:
+            local: Lock = self.__key_locks.setdefault(index, Lock())
+        if not local.acquire(blocking=False):
+            return None
+        try:
+            fcntl.lockf(self.__lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, index)
+        except OSError:
+            local.release()
+            return None
+        return str(index)
+
+    def release(self: SharedMemoryBackend, key: str, token: str) -> None:
+        index: int = int(token)
+        fcntl.lockf(self.__lock_file, fcntl.LOCK_UN, 1, index)
+        self.__key_locks[index].release()
+
+    def clear(self: SharedMemoryBackend) -> None:
+        with self.__write_lock:
+            for index in range(self.slots):
+                fcntl.lockf(self.__lock_file, fcntl.LOCK_EX, 1, 1 + index)
+                try:
+                    sequence, _, _ = self.__header.unpack_from(self.__memory.buf, self.__offset(index))
+                    self.__header.pack_into(self.__memory.buf, self.__offset(index), sequence + sequence % 2 + 2, 0, 0)
+                finally:
+                    fcntl.lockf(self.__lock_file, fcntl.LOCK_UN, 1, 1 + index)
+
+    def close(self: SharedMemoryBackend) -> None:
+        # detaches from the block, the last process removes the block and the lock file so processes started later don't find stale ones,
+        # a process which dies without closing stays counted and the block is kept
+        fcntl.lockf(self.__lock_file, fcntl.LOCK_EX, 1, 0)
+        attached: int = max(0, self.attached() - 1)
+        self.__attached.pack_into(self.__memory.buf, 0, attached)
+        if attached == 0:
+            # SharedMemory.unlink() unregisters the block from the resource tracker again
+            resource_tracker.register(getattr(self.__memory, '_name', '/' + self.__memory.name), 'shared_memory')
+            self.__memory.unlink()
+            os.unlink(self.__lock_path)
+        self.__memory.close()
+        # releases the attachment lock as well, after the lock file has been removed
+        os.close(self.__lock_file)
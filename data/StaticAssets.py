@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+from dataclasses import dataclass, field
+from threading import Lock
+
+from business.Utilities import Utilities
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional, clients accepting it get gzip instead
+    brotli = None
+
+
+class StaticAssets:
+    @dataclass
+    class Asset:
+        content_type: str = field(default_factory=str)
+        # encoded variants by content coding, the identity variant is always present
+        variants: dict[str, bytes] = field(default_factory=dict)
+        # strong validator per variant, the representations differ byte-wise
+        etags: dict[str, str] = field(default_factory=dict)
+
+    # served files by name, relative to the project directory
+    files: dict[str, tuple[str, str]] = {
+        'overview.html': ('static/internals/overview.html', 'text/html; charset=utf-8'),
+        'logo.ico': ('static/logo.ico', 'image/x-icon'),
+        'logo_icon.png': ('static/logo_icon.png', 'image/png')
+    }
+    # content codings in order of preference if accepted equally
+    encodings: tuple[str, ...] = ('br', 'gzip', 'identity')
+    # seconds clients and proxies may reuse an asset without revalidation
+    max_age: int = 3600
+
+    __lock: Lock = Lock()
+    __loaded: bool = False
+    __assets: dict[str, StaticAssets.Asset] = {}
+
+    def __init__(self: StaticAssets) -> None:
+        raise NotImplementedError("Instantiation of StaticAssets not allowed.")
+
+    @staticmethod
+    def __encode(data: bytes) -> dict[str, bytes]:
+        variants: dict[str, bytes] = {'identity': data}
+        # compressed once at startup with the highest levels, variants which don't pay off are dropped
+        compressed: dict[str, bytes] = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            compressed['br'] = brotli.compress(data, quality=11)
+        for encoding, variant in compressed.items():
+            if len(variant) < len(data) * 0.9:
+                variants[encoding] = variant
+        return variants
+
+    @classmethod
+    def load(cls: StaticAssets) -> None:
+        with cls.__lock:
+            if cls.__loaded:
+                return
+            assets: dict[str, StaticAssets.Asset] = {}
+            for name, (path, content_type) in cls.files.items():
+                with open(Utilities.get_dynamic_path(path=path), 'rb') as file:
+                    variants: dict[str, bytes] = StaticAssets.__encode(file.read())
+                digest: str = hashlib.blake2b(variants['identity'], digest_size=12).hexdigest()
+                assets[name] = StaticAssets.Asset(
+                    content_type=content_type,
+                    variants=variants,
+                    etags={encoding: digest if encoding == 'identity' else '{}-{}'.format(digest, encoding) for encoding in variants}
+                )
+            cls.__assets = assets
+            cls.__loaded = True
+
+    @classmethod
+    def get(cls: StaticAssets, name: str) -> StaticAssets.Asset | None:
+        cls.load()
+        return cls.__assets.get(name)
+
+    @classmethod
+    def negotiate(cls: StaticAssets, asset: StaticAssets.Asset, accept_encoding: str | None) -> str:
+        # content coding with the highest quality value, identity is acceptable unless explicitly refused
+        accepted: dict[str, float] = Utilities.accepted(accept_encoding)
+        candidates: list[tuple[float, int, str]] = []
+        for index, encoding in enumerate(cls.encodings):
+            quality: float | None = Utilities.quality(accepted, encoding, '*')
+            if quality is None:
+                quality = 1.0 if encoding == 'identity' else 0.0
+            if encoding in asset.variants and quality > 0:
+                candidates.append((quality, -index, encoding))
+        return max(candidates)[2] if candidates else 'identity'
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from falcon import Request, Response, HTTP_429, HTTP_503, HTTPTooManyRequests
+from falcon.asgi import WebSocket
+
+from business.Admission import Admission
+from business.ChannelProvider import ChannelProvider
+from data.IMCache import IMCache
+from presentation.TwitchBatch import TwitchBatch
+from presentation.TwitchSubscription import TwitchSubscription
+from presentation.TwitchWidget import TwitchWidget
+
+
+class AdmissionControl:
+    # take the client address from X-Forwarded-For, only if served behind a trusted proxy
+    forwarded: bool = False
+
+    @staticmethod
+    def __channels(request: Request, resource: object, params: dict) -> list[str] | None:
+        # static files and metrics are served from memory and aren't limited
+        if isinstance(resource, TwitchWidget):
+            name: str | None = TwitchWidget.name(params.get('channel'))
+            return [name] if name else None
+        if isinstance(resource, TwitchBatch):
+            return TwitchBatch.channels(request=request)
+        if isinstance(resource, TwitchSubscription):
+            # subscribing to channels which aren't cached starts loops fetching them from upstream
+            return TwitchSubscription.channels(channels=params.get('channels') or '')
+        return None
+
+    @classmethod
+    def __admit(cls: AdmissionControl, request: Request, resource: object, params: dict) -> bool | None:
+        # None if the request isn't subject to admission control, otherwise whether it's answered from the caches
+        channels: list[str] | None = AdmissionControl.__channels(request=request, resource=resource, params=params)
+        if not channels:
+            return None
+        cold: list[str] = [channel for channel in channels if not ChannelProvider.is_cached(channel)]
+        client: str = request.access_route[0] if cls.forwarded and request.access_route else request.remote_addr
+        Admission.limit(client=client or '', channels=channels, cold=cold)
+        if isinstance(resource, TwitchSubscription):
+            # subscriptions stay open, they are only rate limited and don't take a place in the queue
+            return None
+        return not cold
+
+    @staticmethod
+    def __rejected(response: Response, rejection: Admission.Rejected) -> None:
+        response.status = HTTP_429 if rejection.limited else HTTP_503
+        response.append_header('Retry-After', str(rejection.retry_after))
+        # skip the responder
+        response.complete = True
+
+    def process_resource(self: AdmissionControl, request: Request, response: Response, resource: object, params: dict) -> None:
+        try:
+            cheap: bool | None = AdmissionControl.__admit(request=request, resource=resource, params=params)
+            if cheap is None:
+                return
+            Admission.acquire(cheap=cheap)
+        except Admission.Rejected as rejection:
+            AdmissionControl.__rejected(response=response, rejection=rejection)
+            return
+        request.context.admitted = True
+
+    async def process_resource_async(self: AdmissionControl, request: Request, response: Response, resource: object, params: dict) -> None:
+        try:
+            cheap: bool | None = await IMCache.offload(AdmissionControl.__admit, request=request, resource=resource, params=params)
+            if cheap is None:
+                return
+            await Admission.acquire_async(cheap=cheap)
+        except Admission.Rejected as rejection:
+            AdmissionControl.__rejected(response=response, rejection=rejection)
+            return
+        request.context.admitted = True
+
+    async def process_resource_ws(self: AdmissionControl, request: Request, websocket: WebSocket, resource: object, params: dict) -> None:
+        try:
+            await IMCache.offload(AdmissionControl.__admit, request=request, resource=resource, params=params)
+        except Admission.Rejected as rejection:
+            # the handshake is denied with close code 3429
+            raise HTTPTooManyRequests(retry_after=rejection.retry_after)
+
+    def process_response(self: AdmissionControl, request: Request, response: Response, resource: object, succeeded: bool) -> None:
+        if request.context.get('admitted'):
+            Admission.release()
+
+    async def process_response_async(self: AdmissionControl, request: Request, response: Response, resource: object, succeeded: bool) -> None:
+        self.process_response(request=request, response=response, resource=resource, succeeded=succeeded)
@@ -1,14 +1,8 @@
 from __future__ import annotations
 
-import os
+from presentation.StaticFile import StaticFile
 
-from falcon import Request, Response, HTTP_200
 
-from business.Utilities import Utilities
-
-
-class Overview(object):
-    def on_get(self: Overview, request: Request, response: Response) -> None:
-        response.status = HTTP_200
-        response.content_type = 'text/html'
-        response.stream = open(Utilities.get_dynamic_path(path='static/internals/overview.html'), 'rb')
+class Overview(StaticFile):
+    def __init__(self: Overview) -> None:
+        super().__init__(name='overview.html')
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from falcon import Request, Response, HTTP_200
+
+from business.Admission import Admission
+from business.HttpPool import HttpPool
+from business.Logger import Logger
+from business.Metrics import Metrics
+from business.Subscriptions import Subscriptions
+from business.UpstreamGuard import UpstreamGuard
+from data.AvatarCache import AvatarCache
+from data.IMCache import IMCache
+from data.LayerCache import LayerCache
+from data.RenderCache import RenderCache
+
+
+class Prometheus(object):
+    def __init__(self: Prometheus) -> None:
+        Metrics.describe('streamerinfo_request_duration_seconds', 'Duration of widget requests by outcome.')
+        Metrics.describe('streamerinfo_stage_duration_seconds', 'Duration of the individual request stages.')
+        Metrics.describe('streamerinfo_upstream_errors_total', 'Failed requests to upstream services.')
+        Metrics.describe('streamerinfo_encoded_bytes_total', 'Bytes of encoded widget images by format.')
+        Metrics.describe('streamerinfo_encoded_images_total', 'Encoded widget images by format.')
+        Metrics.describe('streamerinfo_cache_requests_total', 'Cache lookups by cache and result.')
+        Metrics.describe('streamerinfo_cache_evictions_total', 'Entries evicted from the caches.')
+        Metrics.describe('streamerinfo_cache_invalidations_total', 'Entries dropped because the data they depend on changed.')
+        Metrics.describe('streamerinfo_cache_entries', 'Entries held by the caches.')
+        Metrics.describe('streamerinfo_cache_bytes', 'Bytes held by the byte-bounded caches.')
+        Metrics.describe('streamerinfo_upstream_connections_total', 'Pooled upstream connection usage.')
+        Metrics.describe('streamerinfo_upstream_circuit_open', 'Whether calls to an upstream host are rejected (1) or let through (0, 0.5 while probing).')
+        Metrics.describe('streamerinfo_upstream_concurrency_limit', 'Adaptive limit of concurrent calls per upstream host.')
+        Metrics.describe('streamerinfo_upstream_in_flight', 'Calls currently in flight per upstream host.')
+        Metrics.describe('streamerinfo_upstream_rejected_total', 'Upstream calls rejected by the circuit breaker or the concurrency limit.')
+        Metrics.describe('streamerinfo_admission_rejected_total', 'Requests rejected by rate limits (client, channel) or shed from the queue.')
+        Metrics.describe('streamerinfo_admission_wait_seconds', 'Time admitted requests waited in the queue.')
+        Metrics.describe('streamerinfo_admission_requests', 'Requests being processed (active) or waiting for their turn (queued).')
+        Metrics.describe('streamerinfo_subscriptions', 'Open channel subscriptions and the channels they watch.')
+        Metrics.describe('streamerinfo_subscription_messages_total', 'Updates pushed to subscribers by kind.')
+
+    @staticmethod
+    def __collect() -> None:
+        # cache and pool statistics are maintained by their owners and exported as of now
+        for name, stats in (('channel', IMCache.stats()), ('avatar', AvatarCache.stats()), ('render', RenderCache.stats()), ('layer', LayerCache.stats())):
+            Metrics.set_counter('streamerinfo_cache_requests_total', stats['hits'], cache=name, result='hit')
+            Metrics.set_counter('streamerinfo_cache_requests_total', stats['misses'], cache=name, result='miss')
+            Metrics.set_counter('streamerinfo_cache_evictions_total', stats['evictions'], cache=name)
+            Metrics.set_gauge('streamerinfo_cache_entries', stats['entries'], cache=name)
+            if 'bytes' in stats:
+                Metrics.set_gauge('streamerinfo_cache_bytes', stats['bytes'], cache=name)
+            if 'invalidations' in stats:
+                Metrics.set_counter('streamerinfo_cache_invalidations_total', stats['invalidations'], cache=name)
+        for event, value in HttpPool.stats().items():
+            Metrics.set_counter('streamerinfo_upstream_connections_total', value, event=event)
+        for host, stats in UpstreamGuard.stats().items():
+            Metrics.set_gauge('streamerinfo_upstream_circuit_open', {'closed': 0, 'half_open': 0.5, 'open': 1}[stats['state']], host=host)
+            Metrics.set_gauge('streamerinfo_upstream_concurrency_limit', stats['limit'], host=host)
+            Metrics.set_gauge('streamerinfo_upstream_in_flight', stats['in_flight'], host=host)
+            for reason, value in stats['rejected'].items():
+                Metrics.set_counter('streamerinfo_upstream_rejected_total', value, host=host, reason=reason)
+        for state, value in Admission.stats().items():
+            Metrics.set_gauge('streamerinfo_admission_requests', value, state=state)
+        for kind, value in Subscriptions.stats().items():
+            Metrics.set_gauge('streamerinfo_subscriptions', value, kind=kind)
+        Metrics.set_counter('streamerinfo_log_dropped_total', Logger.dropped())
+
+    def on_get(self: Prometheus, request: Request, response: Response) -> None:
+        Prometheus.__collect()
+        response.status = HTTP_200
+        response.content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        response.text = Metrics.render()
+
+    async def on_get_async(self: Prometheus, request: Request, response: Response) -> None:
+        # the cache size may be queried from a remote backend
+        await IMCache.offload(self.on_get, request=request, response=response)
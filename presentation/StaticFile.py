@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from falcon import Request, Response, HTTP_200, HTTP_304
+
+from data.StaticAssets import StaticAssets
+
+
+class StaticFile:
+    def __init__(self: StaticFile, name: str) -> None:
+        self.name: str = name
+
+        # load and compress static files once instead of on every request
+        StaticAssets.load()
+
+    def on_get(self: StaticFile, request: Request, response: Response) -> None:
+        asset: StaticAssets.Asset = StaticAssets.get(self.name)
+        encoding: str = StaticAssets.negotiate(asset=asset, accept_encoding=request.get_header('Accept-Encoding'))
+        response.cache_control = ['public', 'max-age={}'.format(StaticAssets.max_age)]
+        response.vary = ('Accept-Encoding',)
+        response.etag = asset.etags[encoding]
+        if request.if_none_match and any(tag == '*' or tag in asset.etags.values() for tag in request.if_none_match):
+            # client already has the file, in any of its encodings
+            response.status = HTTP_304
+            return
+        response.status = HTTP_200
+        response.content_type = asset.content_type
+        if encoding != 'identity':
+            response.set_header('Content-Encoding', encoding)
+        response.data = asset.variants[encoding]
+
+    async def on_get_async(self: StaticFile, request: Request, response: Response) -> None:
+        # served from memory, nothing to wait for
+        self.on_get(request=request, response=response)
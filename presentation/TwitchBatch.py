@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from time import perf_counter
+
+from PIL import Image
+from falcon import Request, Response, HTTP_200, HTTP_400, HTTP_404
+
+from business.ChannelProvider import ChannelProvider
+from business.Logger import Logger
+from business.Metrics import Metrics
+from business.RenderPool import RenderPool
+from business.WidgetRenderer import WidgetRenderer
+from data.IMCache import IMCache
+from data.RenderCache import RenderCache
+from presentation.TwitchWidget import TwitchWidget
+from presentation.WidgetHeaders import WidgetHeaders
+
+
+class TwitchBatch:
+    # bundles of separately encoded widgets or a single sprite sheet with the box of every widget
+    outputs: tuple[str, ...] = ('json', 'multipart', 'sprite')
+    # maximum number of channels per request
+    max_channels: int = 50
+
+    def __init__(self: TwitchBatch, version: str) -> None:
+        self.__version__ = version
+        self.cp: ChannelProvider.__class__ = ChannelProvider
+        self.rc: RenderCache.__class__ = RenderCache
+
+    @classmethod
+    def channels(cls: TwitchBatch, request: Request) -> list[str] | None:
+        # channels are passed comma-separated and/or as repeated parameters, invalid names are skipped
+        names: list[str] = []
+        for value in request.get_param_as_list('channels') or []:
+            for channel in value.split(','):
+                name: str | None = TwitchWidget.name(channel.strip())
+                if name and name not in names:
+                    names.append(name)
+        if not names or len(names) > cls.max_channels:
+            return None
+        return names
+
+    @staticmethod
+    def __parse(request: Request) -> tuple[list[str], int, str | None, str, str] | None:
+        names: list[str] | None = TwitchBatch.channels(request=request)
+        if not names:
+            return None
+        return (names, *TwitchWidget.options(request=request))
+
+    def __keys(self: TwitchBatch, found: dict[str, IMCache.ChannelInformation | bool], image_format: str, level: int, profile: str | None) -> tuple[dict[str, tuple], datetime]:
+        # the same render cache entries are used as for single widgets
+        now: datetime = WidgetRenderer.timestamp()
+        return {
+            name: self.rc.key(
+                channel=name,
+                fingerprint=information.fingerprint(),
+                image_format=image_format,
+                level=level,
+                bucket=int(now.timestamp()),
+                profile=profile
+            )
+            for name, information in found.items() if information
+        }, now
+
+    def __etag(self: TwitchBatch, output: str, names: list[str], keys: dict[str, tuple]) -> str:
+        return hashlib.blake2b(repr((output, tuple(names), tuple(keys.values()), self.__version__)).encode('UTF-8'), digest_size=12).hexdigest()
+
+    @staticmethod
+    def __expires_in(keys: dict[str, tuple]) -> float:
+        # the bundle stays valid until the first of its channels expires
+        return min((IMCache.expires_in(name) or 0 for name in keys), default=0)
+
+    @staticmethod
+    def __record(output: str, names: list[str], rendered: int, image_format: str, started: float) -> None:
+        Metrics.observe('streamerinfo_request_duration_seconds', perf_counter() - started, outcome='batch')
+        if Logger.is_enabled(Logger.Severity.DEBUG):
+            Logger.debug(
+                message="Served widget batch.",
+                fields={
+                    'output': output,
+                    'channels': len(names),
+                    'rendered': rendered,
+                    'format': image_format,
+                    'duration_ms': round((perf_counter() - started) * 1000, 3)
+                }
+            )
+
+    @staticmethod
+    def __respond_bundle(response: Response, output: str, names: list[str], images: dict[str, bytes], content_type: str, image_format: str) -> None:
+        response.status = HTTP_200
+        if output == 'json':
+            # channels which don't exist are listed with null
+            response.content_type = 'application/json'
+            response.data = json.dumps({
+                'content_type': content_type,
+                'widgets': {name: base64.b64encode(images[name]).decode('ascii') if name in images else None for name in names}
+            }).encode('UTF-8')
+            return
+        boundary: str = uuid.uuid4().hex
+        parts: list[bytes] = []
+        for name in names:
+            if name in images:
+                parts.append((
+                    '--{}\r\nContent-Type: {}\r\nContent-Disposition: inline; name="{}"; filename="{}.{}"\r\nContent-Length: {}\r\n\r\n'
+                ).format(boundary, content_type, name, name, image_format.lower(), len(images[name])).encode('UTF-8'))
+                parts.append(images[name])
+                parts.append(b'\r\n')
+        parts.append('--{}--\r\n'.format(boundary).encode('UTF-8'))
+        response.content_type = 'multipart/mixed; boundary={}'.format(boundary)
+        response.set_header('X-Missing-Channels', ','.join(name for name in names if name not in images))
+        response.data = b''.join(parts)
+
+    @staticmethod
+    def __respond_sprite(response: Response, names: list[str], keys: dict[str, tuple], sprite: tuple[bytes, list[tuple[int, int, int, int]]], content_type: str) -> None:
+        data, boxes = sprite
+        response.status = HTTP_200
+        response.content_type = content_type
+        # box (x, y, width, height) of every widget within the sheet
+        response.set_header('X-Sprite-Map', json.dumps(dict(zip(keys, boxes)), separators=(',', ':')))
+        response.set_header('X-Missing-Channels', ','.join(name for name in names if name not in keys))
+        response.data = data
+
+    def on_get(self: TwitchBatch, request: Request, response: Response, output: str) -> None:
+        started: float = perf_counter()
+        if output not in TwitchBatch.outputs:
+            response.status = HTTP_404
+            return
+        parsed: tuple[list[str], int, str | None, str, str] | None = TwitchBatch.__parse(request=request)
+        if not parsed:
+            response.status = HTTP_400
+            return
+        names, level, profile, content_type, image_format = parsed
+
+        # grab channel information, channels which aren't cached are fetched together
+        with Metrics.timer(stage='channel'):
+            found: dict[str, IMCache.ChannelInformation | bool] = self.cp.channels(names)
+        keys, now = self.__keys(found=found, image_format=image_format, level=level, profile=profile)
+        etag: str = self.__etag(output=output, names=names, keys=keys)
+        WidgetHeaders.cache(request=request, response=response, expires_in=TwitchBatch.__expires_in(keys), etag=etag, now=now)
+        if WidgetHeaders.not_modified(request=request, response=response, etag=etag):
+            TwitchBatch.__record(output=output, names=names, rendered=0, image_format=image_format, started=started)
+            return
+        if not keys:
+            response.status = HTTP_404
+            TwitchBatch.__record(output=output, names=names, rendered=0, image_format=image_format, started=started)
+            return
+
+        # sprite sheets are composed from unencoded widgets, bundles reuse already encoded images
+        cached: dict[str, bytes | bool] = {} if output == 'sprite' else {name: self.rc.get(key) for name, key in keys.items()}
+        images: dict[str, bytes] = {name: image for name, image in cached.items() if image}
+        pending: list[str] = [name for name in keys if name not in images]
+        with Metrics.timer(stage='avatar'):
+            avatars: list[Image] = self.cp.avatars([found[name].avatar_uri for name in pending])
+        widgets: list[tuple[IMCache.ChannelInformation, Image]] = [(found[name], avatar) for name, avatar in zip(pending, avatars)]
+        try:
+            if output == 'sprite':
+                sprite: tuple[bytes, list[tuple[int, int, int, int]]] = RenderPool.sprite(widgets=widgets, image_format=image_format, level=level, profile=profile, version=self.__version__, now=now)
+            elif widgets:
+                for name, rendered_image in zip(pending, RenderPool.render_many(widgets=widgets, image_format=image_format, level=level, profile=profile, version=self.__version__, now=now)):
+                    self.rc.store(key=keys[name], value=rendered_image)
+                    images[name] = rendered_image
+        except RenderPool.Overloaded:
+            WidgetHeaders.overloaded(response=response)
+            TwitchBatch.__record(output=output, names=names, rendered=0, image_format=image_format, started=started)
+            return
+        if output == 'sprite':
+            TwitchBatch.__respond_sprite(response=response, names=names, keys=keys, sprite=sprite, content_type=content_type)
+        else:
+            TwitchBatch.__respond_bundle(response=response, output=output, names=names, images=images, content_type=content_type, image_format=image_format)
+        TwitchBatch.__record(output=output, names=names, rendered=len(pending), image_format=image_format, started=started)
+
+    async def on_get_async(self: TwitchBatch, request: Request, response: Response, output: str) -> None:
+        started: float = perf_counter()
+        if output not in TwitchBatch.outputs:
+            response.status = HTTP_404
+            return
+        parsed: tuple[list[str], int, str | None, str, str] | None = TwitchBatch.__parse(request=request)
+        if not parsed:
+            response.status = HTTP_400
+            return
+        names, level, profile, content_type, image_format = parsed
+
+        # grab channel information without blocking the event loop, channels which aren't cached are fetched together
+        with Metrics.timer(stage='channel'):
+            found: dict[str, IMCache.ChannelInformation | bool] = await self.cp.channels_async(names)
+        keys, now = self.__keys(found=found, image_format=image_format, level=level, profile=profile)
+        etag: str = self.__etag(output=output, names=names, keys=keys)
+        WidgetHeaders.cache(request=request, response=response, expires_in=await IMCache.offload(TwitchBatch.__expires_in, keys), etag=etag, now=now)
+        if WidgetHeaders.not_modified(request=request, response=response, etag=etag):
+            TwitchBatch.__record(output=output, names=names, rendered=0, image_format=image_format, started=started)
+            return
+        if not keys:
+            response.status = HTTP_404
+            TwitchBatch.__record(output=output, names=names, rendered=0, image_format=image_format, started=started)
+            return
+
+        # sprite sheets are composed from unencoded widgets, bundles reuse already encoded images
+        cached: dict[str, bytes | bool] = {} if output == 'sprite' else {name: self.rc.get(key) for name, key in keys.items()}
+        images: dict[str, bytes] = {name: image for name, image in cached.items() if image}
+        pending: list[str] = [name for name in keys if name not in images]
+        with Metrics.timer(stage='avatar'):
+            avatars: list[Image] = await self.cp.avatars_async([found[name].avatar_uri for name in pending])
+        widgets: list[tuple[IMCache.ChannelInformation, Image]] = [(found[name], avatar) for name, avatar in zip(pending, avatars)]
+        try:
+            if output == 'sprite':
+                sprite: tuple[bytes, list[tuple[int, int, int, int]]] = await RenderPool.sprite_async(widgets=widgets, image_format=image_format, level=level, profile=profile, version=self.__version__, now=now)
+            elif widgets:
+                for name, rendered_image in zip(pending, await RenderPool.render_many_async(widgets=widgets, image_format=image_format, level=level, profile=profile, version=self.__version__, now=now)):
+                    self.rc.store(key=keys[name], value=rendered_image)
+                    images[name] = rendered_image
+        except RenderPool.Overloaded:
+            WidgetHeaders.overloaded(response=response)
+            TwitchBatch.__record(output=output, names=names, rendered=0, image_format=image_format, started=started)
+            return
+        if output == 'sprite':
+            TwitchBatch.__respond_sprite(response=response, names=names, keys=keys, sprite=sprite, content_type=content_type)
+        else:
+            TwitchBatch.__respond_bundle(response=response, output=output, names=names, images=images, content_type=content_type, image_format=image_format)
+        TwitchBatch.__record(output=output, names=names, rendered=len(pending), image_format=image_format, started=started)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+from typing import AsyncIterator
+
+from falcon import Request, Response, HTTP_400
+from falcon.asgi import SSEvent, WebSocket
+from falcon.errors import WebSocketDisconnected
+
+from business.Subscriptions import Subscriptions
+from presentation.TwitchWidget import TwitchWidget
+
+
+class TwitchSubscription:
+    # seconds without messages after which a keep-alive is sent
+    heartbeat: float = 15
+
+    def __init__(self: TwitchSubscription, version: str) -> None:
+        self.__version__ = version
+
+    @staticmethod
+    def channels(channels: str) -> list[str] | None:
+        # channels are passed comma-separated, invalid names are skipped
+        names: list[str] = []
+        for channel in channels.split(','):
+            name: str | None = TwitchWidget.name(channel.strip())
+            if name and name not in names:
+                names.append(name)
+        if not names or len(names) > Subscriptions.max_channels:
+            return None
+        return names
+
+    def __parse(self: TwitchSubscription, request: Request, channels: str) -> tuple[list[str], Subscriptions.Subscriber] | None:
+        names: list[str] | None = TwitchSubscription.channels(channels=channels)
+        if not names:
+            return None
+        if request.get_param('format', default='stats').lower() != 'image':
+            return names, Subscriptions.Subscriber(version=self.__version__)
+        level, profile, content_type, image_format = TwitchWidget.options(request=request)
+        return names, Subscriptions.Subscriber(
+            image_format=image_format,
+            content_type=content_type,
+            level=level,
+            profile=profile,
+            version=self.__version__
+        )
+
+    @classmethod
+    async def __messages(cls: TwitchSubscription, subscriber: Subscriptions.Subscriber) -> AsyncIterator[dict | None]:
+        # yields None whenever a keep-alive is due
+        while True:
+            try:
+                yield await asyncio.wait_for(subscriber.queue.get(), timeout=cls.heartbeat)
+            except asyncio.TimeoutError:
+                yield None
+
+    @staticmethod
+    async def __events(names: list[str], subscriber: Subscriptions.Subscriber) -> AsyncIterator[SSEvent | None]:
+        Subscriptions.subscribe(names=names, subscriber=subscriber)
+        try:
+            async for message in TwitchSubscription.__messages(subscriber=subscriber):
+                yield SSEvent(json=message, event='update') if message else None
+        finally:
+            # the client disconnected
+            Subscriptions.unsubscribe(names=names, subscriber=subscriber)
+
+    async def on_get_async(self: TwitchSubscription, request: Request, response: Response, channels: str) -> None:
+        parsed: tuple[list[str], Subscriptions.Subscriber] | None = self.__parse(request=request, channels=channels)
+        if not parsed:
+            response.status = HTTP_400
+            return
+        names, subscriber = parsed
+        # server-sent events, served until the client disconnects
+        response.append_header('Cache-Control', 'no-cache')
+        response.sse = TwitchSubscription.__events(names=names, subscriber=subscriber)
+
+    async def on_websocket_async(self: TwitchSubscription, request: Request, websocket: WebSocket, channels: str) -> None:
+        parsed: tuple[list[str], Subscriptions.Subscriber] | None = self.__parse(request=request, channels=channels)
+        if not parsed:
+            # rejects the handshake
+            return
+        names, subscriber = parsed
+        await websocket.accept()
+        Subscriptions.subscribe(names=names, subscriber=subscriber)
+        try:
+            async for message in TwitchSubscription.__messages(subscriber=subscriber):
+                if websocket.closed:
+                    break
+                if message:
+                    await websocket.send_media(message)
+        except WebSocketDisconnected:
+            pass
+        finally:
+            Subscriptions.unsubscribe(names=names, subscriber=subscriber)
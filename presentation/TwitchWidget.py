@@ -1,17 +1,26 @@
 from __future__ import annotations
 
-import io
+import hashlib
 from dataclasses import dataclass
-from datetime import datetime, timedelta, timezone
+from datetime import datetime
 from enum import Enum
+from time import perf_counter
 from typing import Any
 
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image
 from falcon import Request, Response, HTTP_200, HTTP_404
 
-from business.TwitchGrabber import TwitchGrabber
+from business.ChannelProvider import ChannelProvider
+from business.Encoder import Encoder
+from business.Logger import Logger
+from business.Metrics import Metrics
+from business.RenderPool import RenderPool
 from business.Utilities import Utilities
+from business.WidgetRenderer import WidgetRenderer
+from data.AssetRegistry import AssetRegistry
 from data.IMCache import IMCache
+from data.RenderCache import RenderCache
+from presentation.WidgetHeaders import WidgetHeaders
 
 
 class TwitchWidget:
@@ -26,222 +35,189 @@ class TwitchWidget:
 
     def __init__(self: TwitchWidget, version: str) -> None:
         self.__version__ = version
-        self.ic: IMCache.__class__ = IMCache
-        self.tg: TwitchGrabber.__class__ = TwitchGrabber
+        self.cp: ChannelProvider.__class__ = ChannelProvider
+        self.rc: RenderCache.__class__ = RenderCache
+
+        # load static assets once instead of on every request
+        AssetRegistry.load()
+
+    @staticmethod
+    def __choose_format(request: Request, params: dict[Any]) -> tuple[str, str]:
+        if 'mode' in params:
+            # match mode
+            chosen_mode: str = params.get('mode').upper()
+            if chosen_mode == TwitchWidget.Mode.PNG.name:
+                return TwitchWidget.Mode.PNG.value, 'PNG'
+            elif chosen_mode == TwitchWidget.Mode.JPEG.name or chosen_mode == TwitchWidget.Mode.JPG.name:
+                return TwitchWidget.Mode.JPEG.value, 'JPEG'
+            elif chosen_mode == TwitchWidget.Mode.WEBP.name:
+                return TwitchWidget.Mode.WEBP.value, 'WEBP'
+        # automatic mode, formats accepted by the client in order of their quality, the most specific media range counts
+        accepted: dict[str, float] = Utilities.accepted(request.accept)
+        preferred: list[tuple[float, bool, int, TwitchWidget.Mode]] = []
+        for index, mode in enumerate((TwitchWidget.Mode.WEBP, TwitchWidget.Mode.PNG, TwitchWidget.Mode.JPEG)):
+            explicit: bool = mode.value in accepted
+            quality: float = Utilities.quality(accepted, mode.value, 'image/*', '*/*') or 0
+            if quality > 0:
+                # explicitly named formats go first, wildcards alone don't promise support for WebP, most supported format first then
+                preferred.append((quality, explicit, -index if explicit else index, mode))
+        if preferred:
+            mode: TwitchWidget.Mode = max(preferred, key=lambda choice: choice[:3])[3]
+            return mode.value, mode.name
+        # unknown client or nothing acceptable, serving most supported format
+        return TwitchWidget.Mode.JPEG.value, 'JPEG'
+
+    @staticmethod
+    def name(channel: str) -> str | None:
+        if not channel or channel.startswith('favico'):
+            # do nothing
+            return None
+
+        channel = channel.lower()
+        if len(channel) > 25 or len(channel) < 3:
+            # ignore names shorter that are shorter than 3 characters or bigger than 25 characters
+            return None
+        return channel
+
+    @staticmethod
+    def options(request: Request) -> tuple[int, str | None, str, str]:
+        params: dict[Any] = request.params
+
+        level: int = 9
+        if 'level' in params:
+            try:
+                level = int(params.get('level'))
+            except ValueError:
+                # malformed levels are treated like missing ones
+                level = 9
+            if level > 9 or level < 0:
+                level = 9
+        # a named encoder profile takes precedence over the level
+        profile: str | None = params.get('profile', '').lower() or None
+        if profile not in Encoder.profiles:
+            profile = Encoder.default_profile if 'level' not in params else None
+        content_type, image_format = TwitchWidget.__choose_format(request=request, params=params)
+        return level, profile, content_type, image_format
+
+    @staticmethod
+    def __parse(request: Request, channel: str) -> tuple[str, int, str | None, str, str] | None:
+        channel = TwitchWidget.name(channel)
+        if not channel:
+            return None
+        return (channel, *TwitchWidget.options(request=request))
+
+    def __cached(self: TwitchWidget, channel: str, information: IMCache.ChannelInformation, image_format: str, level: int, profile: str | None) -> tuple[tuple, datetime, bytes | bool]:
+        # serve already encoded image if the displayed data didn't change
+        now: datetime = WidgetRenderer.timestamp()
+        key: tuple = self.rc.key(
+            channel=channel,
+            fingerprint=information.fingerprint(),
+            image_format=image_format,
+            level=level,
+            bucket=int(now.timestamp()),
+            profile=profile
+        )
+        return key, now, self.rc.get(key)
+
+    def __etag(self: TwitchWidget, key: tuple) -> str:
+        # strong validator derived from everything the encoded image depends on
+        return hashlib.blake2b(repr(key + (self.__version__,)).encode('UTF-8'), digest_size=12).hexdigest()
 
     @staticmethod
-    def __to_hr(dt: datetime) -> str:
-        if not dt:
-            return 'Never'
-        now = datetime.now(timezone.utc)
-        delta = now - dt
-        delta_seconds: float = delta.total_seconds()
-
-        day = int(delta_seconds // (24 * 3600))
-        year = 0
-        if day > 365:
-            year = int(day // 365)
-            day = day - (year * 365)
-        time = delta_seconds % (24 * 3600)
-        hour = int(time // 3600)
-        time %= 3600
-        minutes = int(time // 60)
-        time %= 60
-        seconds = int(time)
-
-        if year > 0:
-            if day > 0:
-                return '{}y {}d ago'.format(year, day)
-            return '{}y ago'.format(year)
-        if day > 0:
-            if hour > 0:
-                return '{}d {}h ago'.format(day, hour)
-            return '{}d ago'.format(day)
-        if hour > 0:
-            if minutes > 0:
-                return '{}h {}m ago'.format(hour, minutes)
-            return '{}h ago'.format(hour)
-        if minutes > 0:
-            if seconds > 0:
-                return '{}m {}s ago'.format(minutes, seconds)
-            return '{}s ago'.format(seconds)
-        if seconds > 0:
-            return '{}s ago'.format(seconds)
-        return 'a few seconds ago'
+    def __record(channel: str, outcome: str, image_format: str, started: float) -> None:
+        Metrics.observe('streamerinfo_request_duration_seconds', perf_counter() - started, outcome=outcome)
+        if Logger.is_enabled(Logger.Severity.DEBUG):
+            Logger.debug(
+                message="Served widget.",
+                fields={
+                    'channel': channel,
+                    'cache': outcome,
+                    'format': image_format,
+                    'duration_ms': round((perf_counter() - started) * 1000, 3)
+                }
+            )
 
     @staticmethod
-    def __find_font_size(font: ImageFont, text: str, width: int) -> ImageFont:
-        font = font.font_variant(size=3)
-        size: int = font.size
-        increment: int = 75
-        last_font: ImageFont = None
-        while True:
-            if font.getlength(text) < width:
-                size += increment
-                last_font = font
-            else:
-                increment = increment // 2
-                size -= increment
-            font = font.font_variant(size=size)
-            if increment < 1:
-                break
-        if font.getlength(text) > width:
-            return last_font
-        else:
-            return font
+    def __respond(response: Response, content_type: str, rendered_image: bytes) -> None:
+        # return image
+        response.content_type = content_type
+        response.status = HTTP_200
+        response.data = rendered_image
 
     def on_get(self: TwitchWidget, request: Request, response: Response, channel: str) -> None:
-        if channel.startswith('favico'):
-            # do nothing
+        started: float = perf_counter()
+        parsed: tuple[str, int, str | None, str, str] | None = TwitchWidget.__parse(request=request, channel=channel)
+        if not parsed:
             response.status = HTTP_404
             return
-        if not channel:
+        channel, level, profile, content_type, image_format = parsed
+
+        # grab channel information
+        with Metrics.timer(stage='channel'):
+            information: IMCache.ChannelInformation = self.cp.channel(channel)
+        if not information:
+            # invalid channel, returning nothing
             response.status = HTTP_404
+            TwitchWidget.__record(channel=channel, outcome='not_found', image_format=image_format, started=started)
+            return
+
+        key, now, rendered_image = self.__cached(channel=channel, information=information, image_format=image_format, level=level, profile=profile)
+        etag: str = self.__etag(key)
+        WidgetHeaders.cache(request=request, response=response, expires_in=IMCache.expires_in(channel) or 0, etag=etag, now=now)
+        if WidgetHeaders.not_modified(request=request, response=response, etag=etag):
+            # client already has the current image, no need to render it
+            TwitchWidget.__record(channel=channel, outcome='not_modified', image_format=image_format, started=started)
             return
-        else:
-            params: dict[Any] = request.params
-
-            # grab channel information
-            channel = channel.lower()
-            if len(channel) > 25 or len(channel) < 3:
-                # ignore names shorter that are shorter than 3 characters or bigger than 25 characters
-                response.status = HTTP_404
+        outcome: str = 'hit' if rendered_image else 'miss'
+        if not rendered_image:
+            # get avatar and generate
+            with Metrics.timer(stage='avatar'):
+                avatar: Image = self.cp.avatar(information.avatar_uri)
+            try:
+                rendered_image = RenderPool.render(information=information, avatar=avatar, image_format=image_format, level=level, version=self.__version__, now=now, profile=profile)
+            except RenderPool.Overloaded:
+                WidgetHeaders.overloaded(response=response)
+                TwitchWidget.__record(channel=channel, outcome='overloaded', image_format=image_format, started=started)
                 return
-            information: IMCache.ChannelInformation = self.ic.get(channel)
-            if not information or (information.timestamp + timedelta(seconds=60)) < datetime.now():
-                # data doesn't exist or is older than one minute, refreshing it
-                information = self.tg.grab(channel)
-                if not information:
-                    # invalid channel, returning nothing
-                    response.status = HTTP_404
-                    return
-                self.ic.store(key=channel, value=information)
-
-            # get avatar
-            avatar: io.BytesIO = self.tg.grab_avatar(information.avatar_uri)
-
-            # generate
-            base: Image = Image.new('RGBA', (275, 221), (255, 0, 0, 0))
-            base_font: ImageFont = ImageFont.truetype(str(Utilities.get_dynamic_path(path='static/internals/monogram-extended.ttf')))
-            base_2d_draw: ImageDraw = ImageDraw.Draw(base)
-            tpl_avatar: Image = Image.open(avatar).convert('RGBA')
-            tpl_widget_bg: Image = Image.open(str(Utilities.get_dynamic_path(path='static/internals/widget_background.png'))).convert('RGBA')
-            tpl_widget_title: Image = Image.open(str(Utilities.get_dynamic_path(path='static/internals/widget_title.png'))).convert('RGBA')
-            tpl_content_bg: Image = Image.open(str(Utilities.get_dynamic_path(path='static/internals/content_background.png'))).convert('RGBA')
-            tpl_channel_avatar_border: Image = Image.open(str(Utilities.get_dynamic_path(path='static/internals/channel_avatar_border.png'))).convert('RGBA')
-            tpl_channel_partnered: Image = Image.open(str(Utilities.get_dynamic_path(path='static/internals/channel_partnered.png'))).convert('RGBA')
-
-            # title: ImageFont = base_font.font_variant(None, 40)
-            base.alpha_composite(tpl_widget_bg)
-            base.alpha_composite(tpl_widget_title)
-            base.alpha_composite(tpl_content_bg)
-            base.alpha_composite(tpl_avatar, dest=(18, 52))
-            base.alpha_composite(tpl_channel_avatar_border)
-            base_2d_draw.text(
-                xy=(235, 6),
-                text=self.__version__,
-                fill='#10002b',
-                font=base_font.font_variant(size=16)
-            )
-            base_2d_draw.text(
-                xy=(42, 188),
-                text='GENERATED ON {}'.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S')),
-                fill='#391f54',
-                font=base_font.font_variant(size=16)
-            )
-            if information:
-                if information.is_partnered:
-                    base.alpha_composite(tpl_channel_partnered)
-                base_2d_draw.text(
-                    xy=(80, 55),
-                    text=information.displayed_name[:19],
-                    fill='#FFFFFF',
-                    font=base_font.font_variant(size=25)
-                )
-                base_2d_draw.text(
-                    xy=(80, 77),
-                    text='Last stream: ' + ('LIVE' if information.live_count else TwitchWidget.__to_hr(information.latest_stream)),
-                    fill='#FFFFFF',
-                    font=base_font.font_variant(size=16)
-                )
-                base_2d_draw.text(
-                    xy=(68, 125),
-                    text='Viewers:',
-                    fill='#FFFFFF',
-                    font=base_font.font_variant(size=16)
-                )
-                base_2d_draw.text(
-                    xy=(68, 150),
-                    text='Followers:',
-                    fill='#FFFFFF',
-                    font=base_font.font_variant(size=16)
-                )
-                base_2d_draw.text(
-                    xy=(148, 125),
-                    text=str('{:,}'.format(information.live_count).replace(',', '.') if information.live_count else '-').rjust(10, ' '),
-                    fill='#FFFFFF',
-                    font=base_font.font_variant(size=16)
-                )
-                base_2d_draw.text(
-                    xy=(148, 150),
-                    text=str('{:,}'.format(information.follower_count).replace(',', '.') if information.follower_count else '-').rjust(10, ' '),
-                    fill='#FFFFFF',
-                    font=base_font.font_variant(size=16)
-                )
-
-            rendered_image: io.BytesIO = io.BytesIO()
-
-            # disable caching
-            response.append_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-            response.append_header('Pragma', 'no-cache')
-            response.append_header('Expires', '0')
-
-            content_type: str = 'text/plain'
-            level: int = 9
-            if 'level' in params:
-                level = int(params.get('level'))
-                if level > 9 or level < 0:
-                    level = 9
-            if 'mode' in params:
-                # match mode
-                chosen_mode: str = params.get('mode').upper()
-                if chosen_mode == TwitchWidget.Mode.PNG.name:
-                    content_type = TwitchWidget.Mode.PNG.value
-                    base.save(rendered_image, 'PNG', optimize=True, compress_level=level)
-                elif chosen_mode == TwitchWidget.Mode.JPEG.name or chosen_mode == TwitchWidget.Mode.JPG.name:
-                    content_type = TwitchWidget.Mode.JPEG.value
-                    base = base.convert('RGB')
-                    base.save(rendered_image, 'JPEG', optimize=True, quality=(level * 10) + 5)
-                elif chosen_mode == TwitchWidget.Mode.WEBP.name:
-                    content_type = TwitchWidget.Mode.WEBP.value
-                    base.save(rendered_image, 'WEBP', lossless=True, quality=(level * 10) + 10)
-                else:
-                    # set to automated mode
-                    content_type = None
-            else:
-                # set to automated mode
-                content_type = None
-            # check if automation needed
-            if content_type is None:
-                # automatic mode
-                headers: dict[Any] = request.headers
-                if 'USER-AGENT' in request.headers:
-                    ua: str = request.headers.get('USER-AGENT')
-                    if ua.rfind('Chrome') != -1 or ua.rfind('Chromium') != -1 or ua.rfind('Firefox') != -1 or ua.rfind('EDG') != -1 or ua.rfind('Safari') != -1 or ua.rfind('OPR') != -1:
-                        content_type = TwitchWidget.Mode.WEBP.value
-                        base.save(rendered_image, 'WEBP', lossless=True, quality=(level * 10) + 10)
-                    else:
-                        # unknown browser, serving most supported format
-                        content_type = TwitchWidget.Mode.JPEG.value
-                        base = base.convert('RGB')
-                        base.save(rendered_image, 'JPEG', optimize=True, quality=(level * 10) + 5)
-                else:
-                    # unknown browser, serving most supported format
-                    content_type = TwitchWidget.Mode.JPEG.value
-                    base = base.convert('RGB')
-                    base.save(rendered_image, 'JPEG', optimize=True, quality=(level * 10) + 5)
-
-            # return image
-            response.content_type = content_type
-            response.status = HTTP_200
-            response.data = rendered_image.getvalue()
+            self.rc.store(key=key, value=rendered_image)
+        TwitchWidget.__respond(response=response, content_type=content_type, rendered_image=rendered_image)
+        TwitchWidget.__record(channel=channel, outcome=outcome, image_format=image_format, started=started)
+
+    async def on_get_async(self: TwitchWidget, request: Request, response: Response, channel: str) -> None:
+        started: float = perf_counter()
+        parsed: tuple[str, int, str | None, str, str] | None = TwitchWidget.__parse(request=request, channel=channel)
+        if not parsed:
+            response.status = HTTP_404
+            return
+        channel, level, profile, content_type, image_format = parsed
+
+        # grab channel information without blocking the event loop
+        with Metrics.timer(stage='channel'):
+            information: IMCache.ChannelInformation = await self.cp.channel_async(channel)
+        if not information:
+            # invalid channel, returning nothing
+            response.status = HTTP_404
+            TwitchWidget.__record(channel=channel, outcome='not_found', image_format=image_format, started=started)
+            return
+
+        key, now, rendered_image = self.__cached(channel=channel, information=information, image_format=image_format, level=level, profile=profile)
+        etag: str = self.__etag(key)
+        WidgetHeaders.cache(request=request, response=response, expires_in=await IMCache.offload(IMCache.expires_in, channel) or 0, etag=etag, now=now)
+        if WidgetHeaders.not_modified(request=request, response=response, etag=etag):
+            # client already has the current image, no need to render it
+            TwitchWidget.__record(channel=channel, outcome='not_modified', image_format=image_format, started=started)
+            return
+        outcome: str = 'hit' if rendered_image else 'miss'
+        if not rendered_image:
+            # get avatar and generate, rendering and encoding is offloaded to an executor
+            with Metrics.timer(stage='avatar'):
+                avatar: Image = await self.cp.avatar_async(information.avatar_uri)
+            try:
+                rendered_image = await RenderPool.render_async(information=information, avatar=avatar, image_format=image_format, level=level, version=self.__version__, now=now, profile=profile)
+            except RenderPool.Overloaded:
+                WidgetHeaders.overloaded(response=response)
+                TwitchWidget.__record(channel=channel, outcome='overloaded', image_format=image_format, started=started)
+                return
+            self.rc.store(key=key, value=rendered_image)
+        TwitchWidget.__respond(response=response, content_type=content_type, rendered_image=rendered_image)
+        TwitchWidget.__record(channel=channel, outcome=outcome, image_format=image_format, started=started)
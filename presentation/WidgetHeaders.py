@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from datetime import datetime
+from time import time
+
+from falcon import Request, Response, HTTP_304, HTTP_503
+
+from business.Refresher import Refresher
+from business.WidgetRenderer import WidgetRenderer
+from data.IMCache import IMCache
+
+
+class WidgetHeaders:
+    # send validators and cache headers instead of disabling caching
+    http_caching: bool = False
+
+    def __init__(self: WidgetHeaders) -> None:
+        raise NotImplementedError("Instantiation of WidgetHeaders not allowed.")
+
+    @classmethod
+    def cache(cls: WidgetHeaders, request: Request, response: Response, expires_in: float, etag: str, now: datetime) -> None:
+        if not cls.http_caching:
+            # disable caching
+            response.append_header('Cache-Control', 'no-cache, no-store, must-revalidate')
+            response.append_header('Pragma', 'no-cache')
+            response.append_header('Expires', '0')
+            return
+        # the image stays valid until the channel information expires or the time-dependent texts change
+        changes_in: float = now.timestamp() + max(1, WidgetRenderer.granularity) - time()
+        directives: list[str] = ['public', 'max-age={}'.format(max(0, int(min(expires_in, changes_in))))]
+        if Refresher.is_running() and IMCache.stale_ttl > 0:
+            # outdated channel information is only served while the refresher revalidates it in the background
+            directives.append('stale-while-revalidate={}'.format(IMCache.stale_ttl))
+        response.cache_control = directives
+        response.etag = etag
+        if 'mode' not in request.params:
+            # format is negotiated by request headers
+            response.vary = ('Accept',)
+
+    @classmethod
+    def not_modified(cls: WidgetHeaders, request: Request, response: Response, etag: str) -> bool:
+        if not cls.http_caching or not request.if_none_match:
+            return False
+        if not any(tag == '*' or tag == etag for tag in request.if_none_match):
+            return False
+        response.status = HTTP_304
+        return True
+
+    @staticmethod
+    def overloaded(response: Response) -> None:
+        response.status = HTTP_503
+        response.append_header('Retry-After', '1')
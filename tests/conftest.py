@@ -0,0 +1,12 @@
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+# modules are imported by their layer, as when running StreamerInfo.py from the repository root
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from business.Logger import Logger  # noqa: E402
+
+Logger.mode = Logger.Mode.CONSOLE
+Logger.min_severity = Logger.Severity.ERROR
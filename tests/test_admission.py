@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from business.Admission import Admission
+
+
+@pytest.fixture(autouse=True)
+def admission() -> None:
+    settings: dict[str, float] = {
+        name: getattr(Admission, name)
+        for name in ('client_rate', 'client_burst', 'channel_rate', 'channel_burst', 'concurrency', 'max_queue', 'queue_target')
+    }
+    Admission.reset()
+    yield
+    for name, value in settings.items():
+        setattr(Admission, name, value)
+    Admission.reset()
+
+
+def rejection(function, **kwargs) -> Admission.Rejected | None:
+    try:
+        function(**kwargs)
+    except Admission.Rejected as rejected:
+        return rejected
+    return None
+
+
+def wait_for_queue(length: int) -> None:
+    deadline: float = time.monotonic() + 5
+    while Admission.stats()['queued'] != length:
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_client_bucket_answers_with_429_and_retry_after() -> None:
+    Admission.client_rate, Admission.client_burst = 1, 2
+    Admission.limit(client='client', channels=['first', 'second'], cold=[])
+    rejected: Admission.Rejected = rejection(Admission.limit, client='client', channels=['first'], cold=[])
+    assert rejected.reason == 'client'
+    assert rejected.limited
+    assert rejected.retry_after == 1
+    # other clients have their own bucket
+    Admission.limit(client='other', channels=['first'], cold=[])
+
+
+def test_rejected_requests_are_not_charged() -> None:
+    Admission.client_rate, Admission.client_burst = 0.01, 3
+    Admission.channel_rate, Admission.channel_burst = 0.01, 1
+    Admission.limit(client='client', channels=['cold'], cold=['cold'])
+    assert rejection(Admission.limit, client='client', channels=['cold'], cold=['cold']).reason == 'channel'
+    # the channel rejection didn't take the client's tokens
+    Admission.limit(client='client', channels=['warm'], cold=[])
+    Admission.limit(client='client', channels=['warm'], cold=[])
+
+
+def test_full_queue_sheds_cold_requests_and_cached_ones_displace_them() -> None:
+    Admission.concurrency, Admission.max_queue, Admission.queue_target = 1, 1, 5
+    Admission.acquire(cheap=True)
+    outcome: dict[str, Admission.Rejected | None] = {}
+    waiter: threading.Thread = threading.Thread(target=lambda: outcome.update(cold=rejection(Admission.acquire, cheap=False)))
+    waiter.start()
+    wait_for_queue(1)
+    # another cold request finds the queue full
+    assert rejection(Admission.acquire, cheap=False).reason == 'queue_full'
+    # a cached request takes the place of the waiting cold one
+    cached: threading.Thread = threading.Thread(target=lambda: outcome.update(cheap=rejection(Admission.acquire, cheap=True)))
+    cached.start()
+    waiter.join(timeout=5)
+    assert outcome['cold'].reason == 'queue_full'
+    assert not outcome['cold'].limited
+    Admission.release()
+    cached.join(timeout=5)
+    assert outcome['cheap'] is None
+    Admission.release()
+    assert Admission.stats() == {'active': 0, 'queued': 0}
+
+
+def test_waiting_requests_are_shed_after_the_queue_target() -> None:
+    Admission.concurrency, Admission.max_queue, Admission.queue_target = 1, 4, 0.05
+    Admission.acquire(cheap=True)
+    rejected: Admission.Rejected = rejection(Admission.acquire, cheap=True)
+    assert rejected.reason == 'queue_timeout'
+    assert Admission.stats() == {'active': 1, 'queued': 0}
+    Admission.release()
+
+
+def test_cancelled_async_waiters_leave_the_queue() -> None:
+    Admission.concurrency, Admission.max_queue, Admission.queue_target = 1, 4, 5
+
+    async def scenario() -> None:
+        Admission.acquire(cheap=True)
+        waiter: asyncio.Task = asyncio.ensure_future(Admission.acquire_async(cheap=True))
+        await asyncio.sleep(0.01)
+        assert Admission.stats()['queued'] == 1
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert Admission.stats() == {'active': 1, 'queued': 0}
+        # the next waiter is woken as soon as the slot is released
+        following: asyncio.Task = asyncio.ensure_future(Admission.acquire_async(cheap=True))
+        await asyncio.sleep(0.01)
+        Admission.release()
+        await asyncio.wait_for(following, timeout=1)
+        Admission.release()
+
+    asyncio.run(scenario())
+    assert Admission.stats() == {'active': 0, 'queued': 0}
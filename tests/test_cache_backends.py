@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import tempfile
+import uuid
+from time import time
+
+import pytest
+
+from benchmark.FakeRedis import FakeRedis
+from data.IMCache import IMCache
+from data.RedisBackend import RedisBackend
+from data.SharedMemoryBackend import SharedMemoryBackend
+
+shared_only = pytest.mark.skipif(not SharedMemoryBackend.supported, reason="requires POSIX file locks")
+
+
+def entry(expires: float) -> IMCache.Entry:
+    return IMCache.Entry(value=None, expires=expires)
+
+
+def block_exists(name: str) -> bool:
+    return os.path.exists(os.path.join(tempfile.gettempdir(), name + '.lock'))
+
+
+def rewrite(name: str, count: int) -> None:
+    # alternates between entries of different sizes, so torn reads would show up as mixed payloads
+    backend: SharedMemoryBackend = SharedMemoryBackend(name=name, slots=4)
+    try:
+        for index in range(count):
+            backend.put('key', IMCache.Entry(value=None, expires=1.0 if index % 2 else 123456789.0), max_entries=0)
+    finally:
+        backend.close()
+
+
+def hold_lock(name: str, taken: multiprocessing.Event, done: multiprocessing.Event) -> None:
+    backend: SharedMemoryBackend = SharedMemoryBackend(name=name, slots=4)
+    try:
+        token: str | None = backend.acquire('key', ttl=5)
+        taken.set()
+        done.wait(timeout=10)
+        backend.release('key', token)
+    finally:
+        backend.close()
+
+
+@pytest.fixture
+def shared_name() -> str:
+    return 'streamerinfo-test-' + uuid.uuid4().hex[:8]
+
+
+@pytest.fixture
+def redis() -> FakeRedis:
+    server: FakeRedis = FakeRedis().start()
+    yield server
+    server.stop()
+
+
+@shared_only
+def test_shared_memory_entries_are_visible_to_other_attachments(shared_name: str) -> None:
+    first: SharedMemoryBackend = SharedMemoryBackend(name=shared_name, slots=8)
+    second: SharedMemoryBackend = SharedMemoryBackend(name=shared_name, slots=8)
+    try:
+        first.put('key', entry(expires=42.0), max_entries=0)
+        assert second.get('key').expires == 42.0
+        assert second.size() == 1
+        second.clear()
+        assert first.get('key') is None
+    finally:
+        second.close()
+        first.close()
+
+
+@shared_only
+def test_shared_memory_reads_never_return_torn_entries(shared_name: str) -> None:
+    backend: SharedMemoryBackend = SharedMemoryBackend(name=shared_name, slots=4)
+    writer: multiprocessing.Process = multiprocessing.get_context('spawn').Process(target=rewrite, args=(shared_name, 20000))
+    writer.start()
+    try:
+        seen: set[float | None] = set()
+        while writer.is_alive():
+            found: IMCache.Entry | None = backend.get('key')
+            seen.add(found.expires if found else None)
+        assert seen <= {None, 1.0, 123456789.0}
+    finally:
+        writer.join(timeout=30)
+        backend.close()
+
+
+@shared_only
+def test_shared_memory_key_locks_exclude_other_processes(shared_name: str) -> None:
+    backend: SharedMemoryBackend = SharedMemoryBackend(name=shared_name, slots=4)
+    context = multiprocessing.get_context('spawn')
+    taken, done = context.Event(), context.Event()
+    holder: multiprocessing.Process = context.Process(target=hold_lock, args=(shared_name, taken, done))
+    holder.start()
+    try:
+        assert taken.wait(timeout=30)
+        assert backend.acquire('key', ttl=5) is None
+        done.set()
+        holder.join(timeout=10)
+        token: str | None = backend.acquire('key', ttl=5)
+        assert token is not None
+        backend.release('key', token)
+    finally:
+        done.set()
+        holder.join(timeout=10)
+        backend.close()
+
+
+@shared_only
+def test_shared_memory_block_is_removed_by_the_last_process_detaching(shared_name: str) -> None:
+    first: SharedMemoryBackend = SharedMemoryBackend(name=shared_name, slots=4)
+    second: SharedMemoryBackend = SharedMemoryBackend(name=shared_name, slots=4)
+    assert first.attached() == 2
+    first.put('key', entry(expires=42.0), max_entries=0)
+    # the creating process exits first, the remaining one keeps sharing the block with processes started later
+    first.close()
+    assert block_exists(shared_name)
+    third: SharedMemoryBackend = SharedMemoryBackend(name=shared_name, slots=4)
+    assert third.get('key').expires == 42.0
+    third.close()
+    second.close()
+    assert not block_exists(shared_name)
+
+
+def test_redis_lock_is_only_released_by_its_holder(redis: FakeRedis) -> None:
+    backend: RedisBackend = RedisBackend(url=redis.url)
+    try:
+        token: str | None = backend.acquire('key', ttl=5)
+        assert token not in (None, 'unavailable')
+        assert backend.acquire('key', ttl=5) is None
+        backend.release('key', 'someone else')
+        assert backend.acquire('key', ttl=5) is None
+        backend.release('key', token)
+        # released atomically by the server, the next holder gets a real lock
+        assert backend.acquire('key', ttl=5) not in (None, 'unavailable')
+    finally:
+        backend.close()
+
+
+def test_redis_size_and_clear_only_touch_cache_entries(redis: FakeRedis) -> None:
+    backend: RedisBackend = RedisBackend(url=redis.url)
+    try:
+        backend.put('first', entry(expires=time() + 60), max_entries=0)
+        backend.put('second', entry(expires=time() + 60), max_entries=0)
+        backend.acquire('first', ttl=5)
+        redis.execute(command='SET', arguments=[b'unrelated', b'value'])
+        assert backend.size() == 2
+        assert backend.get('first') is not None
+        backend.clear()
+        assert backend.size() == 0
+        assert redis.execute(command='GET', arguments=[b'unrelated']) == b'value'
+    finally:
+        backend.close()
@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+import falcon.testing
+import pytest
+
+from benchmark.FakeUpstream import FakeUpstream
+from business.Admission import Admission
+from business.Router import Router
+from business.TwitchGrabber import TwitchGrabber
+from business.WidgetRenderer import WidgetRenderer
+from presentation.WidgetHeaders import WidgetHeaders
+
+
+@pytest.fixture(scope='module')
+def client() -> falcon.testing.TestClient:
+    upstream: FakeUpstream = FakeUpstream(gql_latency=0, avatar_latency=0).start()
+    uri: str = TwitchGrabber.uri()
+    TwitchGrabber.change_uri(upstream.gql_uri)
+    http_caching: bool = WidgetHeaders.http_caching
+    WidgetHeaders.http_caching = True
+    client_rate: float = Admission.client_rate
+    Admission.client_rate = 0
+    # validators change with the rendered time, keep them stable for the duration of the tests
+    granularity: int = WidgetRenderer.granularity
+    WidgetRenderer.granularity = 3600
+    yield falcon.testing.TestClient(Router(version='test').get_resources())
+    WidgetRenderer.granularity = granularity
+    Admission.client_rate = client_rate
+    WidgetHeaders.http_caching = http_caching
+    TwitchGrabber.change_uri(uri)
+    upstream.stop()
+
+
+@pytest.mark.parametrize('accept, content_type', [
+    (None, 'image/jpeg'),
+    ('*/*', 'image/jpeg'),
+    ('image/*', 'image/jpeg'),
+    ('image/webp,*/*', 'image/webp'),
+    ('image/avif,image/webp,image/apng,image/*,*/*;q=0.8', 'image/webp'),
+    ('image/png', 'image/png'),
+    ('image/png;q=0.5, image/jpeg', 'image/jpeg'),
+    ('image/jpeg;q=0, image/*', 'image/png'),
+    ('image/webp;q=0, */*', 'image/jpeg'),
+])
+def test_widget_format_follows_accept(client: falcon.testing.TestClient, accept: str | None, content_type: str) -> None:
+    result: falcon.testing.Result = client.simulate_get('/streamer', headers={'Accept': accept} if accept else None)
+    assert result.status_code == 200
+    assert result.headers['Content-Type'] == content_type
+    assert result.headers['Vary'] == 'Accept'
+
+
+def test_mode_overrides_accept(client: falcon.testing.TestClient) -> None:
+    result: falcon.testing.Result = client.simulate_get('/streamer', params={'mode': 'png'}, headers={'Accept': 'image/webp'})
+    assert result.headers['Content-Type'] == 'image/png'
+    assert 'Vary' not in result.headers
+
+
+def test_widget_validators_are_answered_with_304_per_format(client: falcon.testing.TestClient) -> None:
+    webp: falcon.testing.Result = client.simulate_get('/streamer', headers={'Accept': 'image/webp'})
+    etag: str = webp.headers['ETag']
+    assert client.simulate_get('/streamer', headers={'Accept': 'image/webp', 'If-None-Match': etag}).status_code == 304
+    # another format is another representation, the validator doesn't match it
+    png: falcon.testing.Result = client.simulate_get('/streamer', headers={'Accept': 'image/png', 'If-None-Match': etag})
+    assert png.status_code == 200
+    assert png.headers['ETag'] != etag
+
+
+@pytest.mark.parametrize('accept_encoding, content_encoding', [
+    (None, None),
+    ('gzip', 'gzip'),
+    ('*', 'gzip'),
+    ('gzip;q=0, *', None),
+    ('*;q=0', None),
+])
+def test_static_file_encoding_follows_accept_encoding(client: falcon.testing.TestClient, accept_encoding: str | None, content_encoding: str | None) -> None:
+    result: falcon.testing.Result = client.simulate_get('/', headers={'Accept-Encoding': accept_encoding} if accept_encoding else None)
+    assert result.status_code == 200
+    assert result.headers.get('Content-Encoding') == content_encoding
+    assert client.simulate_get('/', headers={'If-None-Match': result.headers['ETag']}).status_code == 304